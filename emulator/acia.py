@@ -0,0 +1,147 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Serial character device modelled on the 6551 ACIA, attached through emulator.bus.
+#
+# Its four registers repeat through the pages it is attached to: writing the data register
+# transmits a byte, reading it returns the next byte received; the status register has TDRE
+# always set and RDRF set while bytes are waiting. Command and control registers are plain
+# registers, the baud rate is ignored and there are no interrupts.
+#
+# The device does no work per cycle and never blocks the processor. Bytes received arrive through
+# a thread-safe queue, from receive, called from any thread (as the key presses of the GUI), and
+# from a background thread reading an input stream in chunks. Reads of the status and data
+# registers take what has arrived without waiting and answer from the bytes queued, so a program
+# polling the status register sees RDRF once input is there. Bytes transmitted are appended to a
+# bytearray handed to the output callable in chunks of chunk_size bytes and on flush, which the
+# owner calls when the run ends. Without an output they stay in transmitted. A headless run on the
+# host terminal, transmitting every byte at once when stdout is a terminal:
+#
+#     python -m emulator.acia program.asm [--address $F000] [--max-cycles N]
+
+import argparse
+import queue
+import sys
+import threading
+from emulator.bus import Bus, Device, parse_address
+
+# Register numbers
+DATA, STATUS, COMMAND, CONTROL = range(4)
+
+# Status register bits
+STATUS_RDRF = 0x08
+STATUS_TDRE = 0x10
+
+DEFAULT_ADDRESS = 0xf000
+
+
+class ACIA(Device):
+    """Serial device receiving from input (a binary stream) and receive, transmitting to output."""
+
+    def __init__(self, input=None, output=None, chunk_size: int = 0x1000) -> None:
+        self.input = input
+        self.output = output
+        self.chunk_size = chunk_size
+        # Data passed to receive, taken into received by the thread running the processor
+        self.incoming = queue.SimpleQueue()
+        self.received = bytearray()
+        # Index of the next byte of received to be read
+        self.position = 0
+        self.transmitted = bytearray()
+        self.data = 0
+        self.command = 0
+        self.control = 0
+        self.reader = None
+        if input is not None:
+            self.reader = threading.Thread(target=self.read_input, daemon=True)
+            self.reader.start()
+
+    def receive(self, data: bytes) -> None:
+        """Queue data to be read by the program, from any thread."""
+        self.incoming.put(bytes(data))
+
+    def read_input(self) -> None:
+        read = getattr(self.input, 'read1', self.input.read)
+        while data := read(self.chunk_size):
+            self.receive(data)
+
+    def available(self) -> int:
+        """Return the number of bytes waiting, taking those received so far without waiting for more."""
+        if self.position == len(self.received):
+            self.received.clear()
+            self.position = 0
+        while not self.incoming.empty():
+            self.received += self.incoming.get_nowait()
+        return len(self.received) - self.position
+
+    def flush(self) -> None:
+        if self.output is not None and self.transmitted:
+            self.output(bytes(self.transmitted))
+            self.transmitted.clear()
+
+    def read(self, address: int) -> int:
+        register = address & 3
+        if register == DATA:
+            if self.available():
+                self.data = self.received[self.position]
+                self.position += 1
+            return self.data
+        if register == STATUS:
+            return STATUS_TDRE | STATUS_RDRF if self.available() else STATUS_TDRE
+        if register == COMMAND:
+            return self.command
+        return self.control
+
+    def write(self, address: int, value: int) -> None:
+        register = address & 3
+        if register == DATA:
+            self.transmitted.append(value)
+            if len(self.transmitted) >= self.chunk_size:
+                self.flush()
+        elif register == STATUS:
+            # Programmed reset
+            self.command &= 0xe0
+        elif register == COMMAND:
+            self.command = value
+        else:
+            self.control = value
+
+
+def main(arguments: list[str] = None) -> None:
+    from emulator.batch import load_image
+    from emulator.fast import FastProcessor
+    parser = argparse.ArgumentParser(prog='python -m emulator.acia',
+                                     description='Run a 6502 program with an ACIA on stdin and stdout.')
+    parser.add_argument('program', help='.asm or Intel HEX file')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, type=parse_address,
+                        help=f'address of the ACIA, by default ${DEFAULT_ADDRESS:04X}')
+    parser.add_argument('--max-cycles', type=int, help='stop after this number of cycles')
+    arguments = parser.parse_args(arguments)
+    processor = FastProcessor()
+    processor.mem[:] = load_image(arguments.program)
+    processor.reset()
+    acia = ACIA(sys.stdin.buffer, sys.stdout.buffer.write, chunk_size=1 if sys.stdout.isatty() else 0x1000)
+    Bus(processor).attach(acia, arguments.address)
+    try:
+        processor.run(max_cycles=arguments.max_cycles)
+    finally:
+        acia.flush()
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Lookup tables with the results of the ALU operations of operators.py, built once at import.
+#
+# ADC and SBC are indexed by alu_index(a, b, carry, decimal) and hold the result in bits 0-7, the
+# carry (the borrow for SBC, as returned by operators.sbb) in bit 8 and the overflow in bit 9.
+# In decimal mode result and carry are those of the BCD operations, the overflow is the binary one.
+# CMP is indexed by a << 8 | b and holds the zero, carry and negative flags in bits 0, 1 and 2.
+# SHL and SHR are indexed by bit_in << 8 | byte and hold the result and the carry in bit 8.
+# INC, DEC and ZERO_NEGATIVE are indexed by the byte; ZERO_NEGATIVE holds Z in bit 0 and N in bit 1.
+
+from array import array
+
+CARRY_SHIFT = 8
+OVERFLOW_SHIFT = 9
+
+
+def alu_index(a: int, b: int, carry: int = 0, decimal: int = 0) -> int:
+    return decimal << 17 | carry << 16 | a << 8 | b
+
+
+# Digit operations of operators.bcd_addition_with_carry and operators.bcd_subtraction_with_borrow,
+# indexed by carry << 8 | digit1 << 4 | digit2. Invalid BCD digits are handled as there.
+def digit_table(operation) -> list:
+    return [operation(digit1, digit2, carry) for carry in (0, 1) for digit1 in range(0x10) for digit2 in range(0x10)]
+
+
+def digit_addition(digit1: int, digit2: int, carry: int) -> (int, int):
+    digit = digit1 + digit2 + carry
+    return (digit - 10, 1) if digit > 9 else (digit, 0)
+
+
+def digit_subtraction(digit1: int, digit2: int, borrow: int) -> (int, int):
+    digit = digit1 - digit2 - borrow
+    return (digit + 10, 1) if digit < 0 else (digit, 0)
+
+
+# The entries of the decimal half of a table: result and carry of the digit operations, the overflow of binary
+def decimal_entries(digits: list, binary: array) -> array:
+    entries = array('H', [(low | high << 4) & 0xff | carry_out << CARRY_SHIFT
+                          for carry in (0, 1) for a in range(0x100) for b in range(0x100)
+                          for low, low_carry in (digits[carry << 8 | (a & 0xf) << 4 | (b & 0xf)],)
+                          for high, carry_out in (digits[low_carry << 8 | (a >> 4) << 4 | (b >> 4)],)])
+    overflow = 1 << OVERFLOW_SHIFT
+    return array('H', [entry | binary_entry & overflow for entry, binary_entry in zip(entries, binary)])
+
+
+# The sum t = a + b + carry is below 0x200 and thus already the result with the carry in bit 8
+def build_adc_table() -> array:
+    table = array('H', [t | ((a ^ t) & (b ^ t) & 0x80) << (OVERFLOW_SHIFT - 7)
+                        for carry in (0, 1) for a in range(0x100)
+                        for b, t in enumerate(range(a + carry, a + carry + 0x100))])
+    return table + decimal_entries(digit_table(digit_addition), table)
+
+
+# For the difference t = a - b - borrow, t & 0x1ff is the result with the borrow in bit 8.
+# The overflow is computed as by operators.signed_subtraction_overflow, from u = a + ~b + borrow.
+def build_sbc_table() -> array:
+    table = array('H', [t & 0x1ff | ((a ^ u) & (~b ^ u) & 0x80) << (OVERFLOW_SHIFT - 7)
+                        for borrow in (0, 1) for a in range(0x100)
+                        for b, t, u in zip(range(0x100), range(a - borrow, a - borrow - 0x100, -1),
+                                           range(a - 1 + borrow, a - 1 + borrow - 0x100, -1))])
+    return table + decimal_entries(digit_table(digit_subtraction), table)
+
+
+ADC = build_adc_table()
+SBC = build_sbc_table()
+
+CMP = bytes(int(a == b) | int(a >= b) << 1 | ((a - b) & 0x80) >> 5 for a in range(0x100) for b in range(0x100))
+
+SHL = array('H', [(byte << 1 | bit_in) & 0xff | (byte >> 7) << CARRY_SHIFT
+                   for bit_in in (0, 1) for byte in range(0x100)])
+SHR = array('H', [byte >> 1 | bit_in << 7 | (byte & 1) << CARRY_SHIFT for bit_in in (0, 1) for byte in range(0x100)])
+
+INC = bytes((byte + 1) & 0xff for byte in range(0x100))
+DEC = bytes((byte - 1) & 0xff for byte in range(0x100))
+
+ZERO_NEGATIVE = bytes(int(byte == 0) | (byte >> 7) << 1 for byte in range(0x100))
@@ -0,0 +1,221 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Batch runs of programs over many inputs, spread over all cores.
+#
+# A job names a program (an .asm file or an Intel HEX image), patches applied to the memory and
+# the registers after loading and resetting, a cycle budget and the memory ranges to report. The
+# memory images of all programs are built once in the calling process and handed to every worker
+# process when it starts, so a program is never assembled more than once. Results are returned in
+# job order as soon as they are available. A job may ask for the instruction mix statistics of its
+# run, see emulator.statistics, and for its code coverage, see emulator.coverage. With a serial
+# address, an ACIA (see emulator.acia) is attached there, receiving serial_input; the bytes the
+# program transmits are returned in serial_output.
+#
+#     python -m emulator.batch jobs.json [--workers N] [--chunksize N]
+#
+# reads a JSON list of jobs, e.g. {"program": "examples/mult1.asm", "memory": {"$10": "0305"},
+# "max_cycles": 1000, "memory_ranges": [["$10", "$12"]]}, and prints one JSON result per line.
+# Paths are relative to the job file; addresses may be given as numbers or as strings in $, 0x
+# or decimal notation, memory contents as hex strings. "statistics": true adds the statistics,
+# "coverage": true the coverage as lists of address ranges. "serial_address": "$F000" attaches an
+# ACIA, "serial_input" is then a string of the characters received.
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+from emulator.acia import ACIA
+from emulator.bus import Bus, parse_address
+from emulator.coverage import Coverage, CoverageData
+from emulator.fast import FastProcessor
+from emulator.recompiler import build_image
+from emulator.statistics import Statistics
+
+DEFAULT_MAX_CYCLES = 1_000_000
+
+# Registers set by Job.registers and reported in JobResult.registers, in this order
+REGISTERS = ('PC', 'A', 'X', 'Y', 'S', 'SR')
+
+
+class Job(NamedTuple):
+    program: str
+    # Data by address and values by register name, None for no patches
+    memory: dict = None
+    registers: dict = None
+    max_cycles: int = DEFAULT_MAX_CYCLES
+    memory_ranges: tuple = ()
+    statistics: bool = False
+    coverage: bool = False
+    serial_address: int = None
+    serial_input: bytes = b''
+
+
+class JobResult(NamedTuple):
+    registers: tuple
+    memory: tuple
+    cycles: int
+    instructions: int
+    reason: str
+    statistics: dict = None
+    coverage: CoverageData = None
+    serial_output: bytes = None
+
+
+def assemble(program: str) -> (dict, dict):
+    """Return the code_dict and debug_info of an .asm file."""
+    import asm.assembler_helpers  # noqa, imports asm.assembler, which cannot be imported first
+    from asm.assembler import assemble_file
+    # The assembler reports its passes on stdout, which holds the results of main
+    with contextlib.redirect_stdout(sys.stderr):
+        return assemble_file(program)
+
+
+def load_image(program: str) -> bytes:
+    """Return the 64 KiB memory image of an .asm file or an Intel HEX file."""
+    memory = bytearray(0x10000)
+    if str(program).lower().endswith('.asm'):
+        code_dict, _ = assemble(program)
+        for address, byte in build_image(code_dict).items():
+            memory[address] = byte
+    else:
+        from intelhex import IntelHex
+        for address, byte in IntelHex(str(program)).todict().items():
+            if isinstance(address, int) and address < 0x10000:
+                memory[address] = byte
+    return bytes(memory)
+
+
+def run_job(job: Job, image: bytes, processor: FastProcessor = None) -> JobResult:
+    """Run job on the memory image of its program, in processor if given."""
+    if processor is None:
+        processor = FastProcessor()
+    # A processor reused from an earlier job keeps none of its events, interrupt requests and devices
+    processor.events.clear()
+    processor.interrupt_requested = processor.non_maskable_interrupt_requested = False
+    if processor.memory.devices_attached:
+        Bus(processor).detach_all()
+    processor.mem[:] = image
+    for address, data in (job.memory or {}).items():
+        processor.mem[address:address + len(data)] = data
+    processor.reset()
+    for register, value in (job.registers or {}).items():
+        setattr(processor, register, value)
+    acia = None
+    if job.serial_address is not None:
+        acia = ACIA()
+        acia.receive(job.serial_input)
+        Bus(processor).attach(acia, job.serial_address)
+    statistics = Statistics(processor) if job.statistics else None
+    coverage = Coverage(processor) if job.coverage else None
+    collectors = [collector for collector in (statistics, coverage) if collector]
+    for collector in collectors:
+        collector.enable()
+    try:
+        result = processor.run(max_cycles=job.max_cycles)
+    finally:
+        for collector in collectors:
+            collector.disable()
+        if acia is not None:
+            Bus(processor).detach(acia)
+    return JobResult(tuple(getattr(processor, register) for register in REGISTERS),
+                     tuple(bytes(processor.mem[start:end]) for start, end in job.memory_ranges),
+                     result.cycles, result.instructions, result.reason,
+                     statistics.as_dict() if statistics else None,
+                     coverage.data() if coverage else None,
+                     bytes(acia.transmitted) if acia else None)
+
+
+# State of a worker process, set up once by initialize_worker
+worker_images = {}
+worker_processor = None
+
+
+def initialize_worker(images: dict) -> None:
+    global worker_images, worker_processor
+    worker_images = images
+    worker_processor = FastProcessor()
+
+
+def run_worker_job(job: Job) -> JobResult:
+    return run_job(job, worker_images[job.program], worker_processor)
+
+
+def run_batch(jobs: Iterable[Job], max_workers: int = None, chunksize: int = None) -> Iterator[JobResult]:
+    """Run jobs in a pool of worker processes and yield their results in job order.
+
+    By default there is one worker per core, and each worker is handed about four chunks of jobs.
+    """
+    jobs = list(jobs)
+    images = {program: load_image(program) for program in {job.program for job in jobs}}
+    max_workers = max_workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(jobs) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers, initializer=initialize_worker, initargs=(images,)) as executor:
+        yield from executor.map(run_worker_job, jobs, chunksize=chunksize)
+
+
+def parse_job(description: dict, directory: Path = Path()) -> Job:
+    """Build a Job from its JSON description, see the module comment."""
+    return Job(
+        str(directory / description['program']),
+        {parse_address(address): bytes.fromhex(data) for address, data in description.get('memory', {}).items()},
+        {register: parse_address(value) for register, value in description.get('registers', {}).items()},
+        description.get('max_cycles', DEFAULT_MAX_CYCLES),
+        tuple((parse_address(start), parse_address(end)) for start, end in description.get('memory_ranges', ())),
+        description.get('statistics', False),
+        description.get('coverage', False),
+        None if description.get('serial_address') is None else parse_address(description['serial_address']),
+        description.get('serial_input', '').encode('latin-1'),
+    )
+
+
+def format_result(result: JobResult) -> dict:
+    formatted = {
+        'registers': dict(zip(REGISTERS, result.registers)),
+        'memory': [data.hex() for data in result.memory],
+        'cycles': result.cycles,
+        'instructions': result.instructions,
+        'reason': result.reason,
+    }
+    if result.statistics is not None:
+        formatted['statistics'] = result.statistics
+    if result.coverage is not None:
+        formatted['coverage'] = result.coverage.as_dict()
+    if result.serial_output is not None:
+        formatted['serial_output'] = result.serial_output.decode('latin-1')
+    return formatted
+
+
+def main(arguments: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m emulator.batch', description='Run 6502 programs in batch.')
+    parser.add_argument('jobs', help='JSON file with the list of jobs')
+    parser.add_argument('--workers', type=int, help='number of worker processes, by default one per core')
+    parser.add_argument('--chunksize', type=int, help='number of jobs handed to a worker at once')
+    arguments = parser.parse_args(arguments)
+    path = Path(arguments.jobs)
+    jobs = [parse_job(description, path.parent) for description in json.loads(path.read_text())]
+    for result in run_batch(jobs, arguments.workers, arguments.chunksize):
+        print(json.dumps(format_result(result)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
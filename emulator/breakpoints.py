@@ -0,0 +1,187 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Breakpoints and watchpoints for Processor.
+#
+# Breakpoints holds one 64 KiB bitmap each for execute breakpoints, read watchpoints and write
+# watchpoints, so a check is a single index. While any of them is set, it wraps the micro steps
+# fetch_instruction, fetch_byte and put_byte of its processor with checking versions (see
+# emulator.hooks), chained with the wrappers of other tools and the overrides of subclasses like
+# ProcessorVisualization. With nothing set the wrappers are removed again and the processor runs
+# without any check.
+#
+# A breakpoint raises BreakpointHit before the instruction at its address is fetched. A watchpoint
+# hit is raised after the accessing instruction has completed, before the next one. Processor.run
+# returns with STOP_BREAKPOINT or STOP_WATCHPOINT; continuing skips the breakpoint stopped at once.
+#
+# Conditions are Python expressions over the registers and flags of Processor (A, X, PC, C, ...)
+# and mem, the memory; $ introduces hex numbers as in the assembler, e.g. "A == $FF and mem[$10] > 3".
+# They are compiled into functions once, when the breakpoint is set.
+
+import ast
+import re
+from emulator.hooks import unwrap_method, wrap_method
+from emulator.processor import STOP_BREAKPOINT, STOP_WATCHPOINT, BreakpointHit, Processor
+
+# Names usable in conditions, evaluated as attributes of the processor
+CONDITION_REGISTERS = frozenset(('PC', 'PCH', 'PCL', 'A', 'X', 'Y', 'S', 'SR', 'C', 'Z', 'I', 'D', 'B', 'V', 'N',
+                                 'AR', 'cycles'))
+
+HEX_PATTERN = re.compile(r'\$([0-9A-Fa-f]+)')
+
+
+class RegisterAccess(ast.NodeTransformer):
+    def visit_Name(self, node: ast.Name) -> ast.AST:  # noqa
+        if node.id in CONDITION_REGISTERS:
+            return ast.copy_location(ast.Attribute(ast.Name('cpu', ast.Load()), node.id, ast.Load()), node)
+        if node.id != 'mem':
+            raise ValueError(f'Unknown name {node.id} in condition')
+        return node
+
+
+def compile_condition(condition: str):
+    """Return a function of the processor and its memory array evaluating condition."""
+    tree = ast.parse(HEX_PATTERN.sub(r'0x\1', condition), mode='eval')
+    body = RegisterAccess().visit(tree.body)
+    function = ast.Expression(ast.Lambda(
+        ast.arguments(posonlyargs=[], args=[ast.arg('cpu'), ast.arg('mem')], kwonlyargs=[], kw_defaults=[],
+                      defaults=[]),
+        body))
+    return eval(compile(ast.fix_missing_locations(function), f'<condition {condition}>', 'eval'), {})
+
+
+class Breakpoints:
+    """Breakpoints and watchpoints of processor."""
+
+    def __init__(self, processor: Processor) -> None:
+        self.processor = processor
+        # Number of breakpoints or watchpoints per address
+        self.execute = bytearray(0x10000)
+        self.read = bytearray(0x10000)
+        self.write = bytearray(0x10000)
+        # Conditions of the conditional breakpoints by address, a breakpoint stops if any of them holds
+        self.conditions = {}
+        self.breakpoints = 0
+        self.watched_reads = 0
+        self.watched_writes = 0
+        # The last breakpoint or watchpoint hit and the watchpoint hit to be raised before the next instruction
+        self.hit = None
+        self.pending = None
+        # Address of the breakpoint stopped at, skipped when execution continues
+        self.resume_pc = None
+
+    def add_breakpoint(self, address: int, condition: str = None) -> None:
+        """Stop before the instruction at address, if given only when condition holds."""
+        if condition is not None:
+            self.conditions.setdefault(address, []).append((condition, compile_condition(condition)))
+        self.execute[address] += 1
+        self.breakpoints += 1
+        self.update()
+
+    def remove_breakpoint(self, address: int, condition: str = None) -> None:
+        if condition is not None:
+            conditions = self.conditions[address]
+            conditions.remove(next(entry for entry in conditions if entry[0] == condition))
+            if not conditions:
+                del self.conditions[address]
+        self.execute[address] -= 1
+        self.breakpoints -= 1
+        self.update()
+
+    def add_watchpoint(self, start: int, end: int = None, read: bool = False, write: bool = True) -> None:
+        """Stop after instructions reading or writing memory in start to end (exclusive, default start + 1)."""
+        self.change_watchpoint(start, end, read, write, 1)
+
+    def remove_watchpoint(self, start: int, end: int = None, read: bool = False, write: bool = True) -> None:
+        self.change_watchpoint(start, end, read, write, -1)
+
+    def change_watchpoint(self, start: int, end: int, read: bool, write: bool, count: int) -> None:
+        end = start + 1 if end is None else end
+        for bitmap, selected in ((self.read, read), (self.write, write)):
+            if selected:
+                for address in range(start, end):
+                    bitmap[address] += count
+        self.watched_reads += count * (end - start) * read
+        self.watched_writes += count * (end - start) * write
+        self.update()
+
+    def clear(self) -> None:
+        self.execute[:] = self.read[:] = self.write[:] = bytes(0x10000)
+        self.conditions.clear()
+        self.breakpoints = self.watched_reads = self.watched_writes = 0
+        self.pending = self.resume_pc = None
+        self.update()
+
+    def condition_holds(self, address: int) -> bool:
+        conditions = self.conditions.get(address)
+        # A breakpoint without condition is counted in execute but not in conditions
+        if conditions is None or self.execute[address] > len(conditions):
+            return True
+        processor = self.processor
+        return any(function(processor, processor.memory.data) for _, function in conditions)
+
+    # Install the checking micro steps needed, remove those not needed
+    def update(self) -> None:
+        needed = {
+            'fetch_instruction': self.breakpoints or self.watched_reads or self.watched_writes,
+            'fetch_byte': self.watched_reads,
+            'put_byte': self.watched_writes,
+        }
+        for name, checked in needed.items():
+            if checked:
+                wrap_method(self.processor, name, self, getattr(self, 'checked_' + name))
+            else:
+                unwrap_method(self.processor, name, self)
+
+    def checked_fetch_instruction(self, fetch_instruction):
+        processor = self.processor
+        execute = self.execute
+
+        def checked():
+            if self.pending is not None:
+                self.hit, self.pending = self.pending, None
+                raise self.hit
+            pc = processor.PC
+            if execute[pc] and pc != self.resume_pc and self.condition_holds(pc):
+                self.resume_pc = pc
+                self.hit = BreakpointHit(STOP_BREAKPOINT, pc)
+                raise self.hit
+            self.resume_pc = None
+            fetch_instruction()
+        return checked
+
+    def checked_fetch_byte(self, fetch_byte):
+        processor = self.processor
+        read = self.read
+
+        def checked():
+            address = processor.AR
+            if read[address]:
+                self.pending = BreakpointHit(STOP_WATCHPOINT, address)
+            return fetch_byte()
+        return checked
+
+    def checked_put_byte(self, put_byte):
+        processor = self.processor
+        write = self.write
+
+        def checked(byte):
+            address = processor.AR
+            if write[address]:
+                self.pending = BreakpointHit(STOP_WATCHPOINT, address)
+            put_byte(byte)
+        return checked
@@ -0,0 +1,115 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Memory mapped devices.
+#
+# The page table Memory.devices holds for each 256 byte page the device handling the data reads
+# and writes of the page, or None for RAM. A device is given the full address of every access and
+# decodes it itself, so a device with 16 registers attached to a page appears 16 times in it, as
+# with the incomplete address decoding of real boards. Opcode and operand fetches, the stack, the
+# zero page and the vectors are always RAM; devices cannot be attached to pages 0, 1 and $FF.
+#
+# Processor looks up the page table in fetch_byte and put_byte. A FastProcessor runs handlers
+# without lookups as long as no device is attached; Bus.attach switches it to handlers looking up
+# the page of every data access outside the zero page, Bus.detach of the last device back. These
+# handlers set cpu.cycles to the cycle of each device access, as counted by Processor, so devices
+# depending on time behave alike with both processors. A TranslatingProcessor gets handlers which
+# also check code writes, and translates blocks again, leaving out the instructions which may
+# access a device (see emulator.translator). A MicrocodeProcessor runs its memory micro-ops through
+# fetch_byte and put_byte while devices are attached.
+
+from emulator.fast import HANDLERS, LAZY_HANDLERS, FastProcessor, build_handlers
+from emulator.hooks import set_handlers
+from emulator.processor import Processor
+from emulator.translator import CHECKED_HANDLERS, LAZY_CHECKED_HANDLERS, TranslatingProcessor
+
+
+# Address given as int, as hexadecimal number prefixed by $ or as Python integer literal
+def parse_address(value: int | str) -> int:
+    if isinstance(value, int):
+        return value
+    value = value.strip()
+    return int(value[1:], 16) if value.startswith('$') else int(value, 0)
+
+
+class Device:
+    """Base class of memory mapped devices, reading as $FF and ignoring writes."""
+
+    def read(self, address: int) -> int:
+        return 0xff
+
+    def write(self, address: int, value: int) -> None:
+        pass
+
+
+class Bus:
+    """Attaches devices to the page table of the memory of processor."""
+
+    def __init__(self, processor: Processor | FastProcessor) -> None:
+        self.processor = processor
+
+    @property
+    def pages(self) -> list:
+        return self.processor.memory.devices
+
+    @property
+    def devices(self) -> list[Device]:
+        """The devices attached, in page order."""
+        devices = []
+        for device in self.pages:
+            if device is not None and device not in devices:
+                devices.append(device)
+        return devices
+
+    def attach(self, device: Device, start: int, end: int = None) -> None:
+        """Map the pages of addresses start to end (exclusive, by default the page of start) to device."""
+        first, last = start >> 8, ((start | 0xff) if end is None else end - 1) >> 8
+        if first < 2 or last > 0xfe or first > last:
+            raise ValueError(f'Devices cannot be attached to ${start:04X}')
+        for page in range(first, last + 1):
+            if self.pages[page] not in (None, device):
+                raise ValueError(f'Page ${page:02X} already holds a device')
+        for page in range(first, last + 1):
+            self.pages[page] = device
+        self.update_handlers()
+
+    def detach(self, device: Device) -> None:
+        for page, attached in enumerate(self.pages):
+            if attached is device:
+                self.pages[page] = None
+        self.update_handlers()
+
+    def detach_all(self) -> None:
+        self.pages[:] = [None] * len(self.pages)
+        self.update_handlers()
+
+    def update_handlers(self) -> None:
+        processor = self.processor
+        processor.memory.devices_attached = any(device is not None for device in self.pages)
+        processor.memory.update_watched_pages()
+        if isinstance(processor, TranslatingProcessor):
+            if processor.memory.devices_attached:
+                handlers = build_handlers(code_writes_checked=True, lazy_flags=processor.lazy_flags, devices=True)
+            else:
+                handlers = LAZY_CHECKED_HANDLERS if processor.lazy_flags else CHECKED_HANDLERS
+            set_handlers(processor, handlers)
+            processor.invalidate_blocks()
+        elif isinstance(processor, FastProcessor):
+            if processor.memory.devices_attached:
+                set_handlers(processor, build_handlers(lazy_flags=processor.lazy_flags, devices=True))
+            else:
+                set_handlers(processor, LAZY_HANDLERS if processor.lazy_flags else HANDLERS)
@@ -0,0 +1,268 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Code coverage of runs.
+#
+# While enabled, Coverage sets the bits of the addresses of the instructions executed by its
+# processor in a preallocated bitmap of 0x10000 bits, and those of the branches in a taken and a
+# not taken bitmap. For a Processor it wraps decode_instruction, for a FastProcessor the handlers
+# (see emulator.hooks); a TranslatingProcessor is not supported. The bitmaps are
+# returned as CoverageData, which is merged with the data of other runs by or-ing the bitmaps and
+# converted to and from lists of address ranges for JSON, as in the results of emulator.batch.
+#
+# line_coverage folds the data through the code_dict and debug_info of the assembler into
+# coverage per source line; summary and listing render it as a dict and as annotated source:
+#
+#     python -m emulator.coverage program.asm results.jsonl [--json]
+#
+# merges the coverage of the batch results in results.jsonl and prints the listing of program.
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import NamedTuple
+from emulator.fast import FastProcessor
+from emulator.hooks import HANDLERS, is_wrapped, unwrap_handlers, unwrap_method, wrap_handlers, wrap_method
+from emulator.processor import INSTRUCTION_SET, Processor, REG_IR
+from emulator.translator import TranslatingProcessor
+
+BITMAP_SIZE = 0x10000 // 8
+
+# Flag and state taken by the branch opcodes
+BRANCH_CONDITIONS = {opcode: arguments for opcode, (method, arguments) in INSTRUCTION_SET.items()
+                     if method == 'branch'}
+
+# Source tokens of the lines holding data
+DATA_DIRECTIVES = frozenset(('.DB', '.DS'))
+
+
+def bitmap_ranges(bitmap: bytes) -> list[list[int]]:
+    """Return the ranges [start, end) of the addresses set in bitmap."""
+    ranges = []
+    start = None
+    for index, byte in enumerate(bitmap):
+        if byte in (0, 0xff) and (start is None) == (byte == 0):
+            continue
+        for bit in range(8):
+            address = index * 8 + bit
+            if byte >> bit & 1:
+                if start is None:
+                    start = address
+            elif start is not None:
+                ranges.append([start, address])
+                start = None
+    if start is not None:
+        ranges.append([start, len(bitmap) * 8])
+    return ranges
+
+
+def ranges_bitmap(ranges) -> bytes:
+    """Return the bitmap with the addresses of ranges [start, end) set."""
+    bitmap = bytearray(BITMAP_SIZE)
+    for start, end in ranges:
+        for address in range(start, end):
+            bitmap[address >> 3] |= 1 << (address & 7)
+    return bytes(bitmap)
+
+
+def is_set(bitmap: bytes, address: int) -> bool:
+    return bool(bitmap[address >> 3] >> (address & 7) & 1)
+
+
+class CoverageData(NamedTuple):
+    executed: bytes = bytes(BITMAP_SIZE)
+    taken: bytes = bytes(BITMAP_SIZE)
+    not_taken: bytes = bytes(BITMAP_SIZE)
+
+    def merge(self, other: 'CoverageData') -> 'CoverageData':
+        return CoverageData(*(
+            (int.from_bytes(mine, 'little') | int.from_bytes(theirs, 'little')).to_bytes(BITMAP_SIZE, 'little')
+            for mine, theirs in zip(self, other)
+        ))
+
+    def as_dict(self) -> dict:
+        return {name: bitmap_ranges(bitmap) for name, bitmap in zip(self._fields, self)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'CoverageData':
+        return cls(*(ranges_bitmap(data.get(name, ())) for name in cls._fields))
+
+
+class Coverage:
+    """Bitmaps of the instructions executed and the branch outcomes of processor."""
+
+    def __init__(self, processor: Processor | FastProcessor) -> None:
+        if isinstance(processor, TranslatingProcessor):
+            raise TypeError('A TranslatingProcessor runs translated blocks, which are not covered')
+        self.processor = processor
+        self.executed = bytearray(BITMAP_SIZE)
+        self.taken = bytearray(BITMAP_SIZE)
+        self.not_taken = bytearray(BITMAP_SIZE)
+
+    @property
+    def enabled(self) -> bool:
+        if isinstance(self.processor, FastProcessor):
+            return is_wrapped(self.processor, HANDLERS, self)
+        return is_wrapped(self.processor, 'decode_instruction', self)
+
+    def enable(self) -> None:
+        if isinstance(self.processor, FastProcessor):
+            wrap_handlers(self.processor, self, self.covering_handler)
+        else:
+            wrap_method(self.processor, 'decode_instruction', self, self.covering_decode_instruction)
+
+    def disable(self) -> None:
+        if isinstance(self.processor, FastProcessor):
+            unwrap_handlers(self.processor, self)
+        else:
+            unwrap_method(self.processor, 'decode_instruction', self)
+
+    def clear(self) -> None:
+        for bitmap in (self.executed, self.taken, self.not_taken):
+            bitmap[:] = bytes(BITMAP_SIZE)
+
+    def data(self) -> CoverageData:
+        return CoverageData(bytes(self.executed), bytes(self.taken), bytes(self.not_taken))
+
+    def merge(self, data: CoverageData) -> None:
+        """Add the coverage of data, as of another run."""
+        merged = self.data().merge(data)
+        self.executed[:], self.taken[:], self.not_taken[:] = merged
+
+    def covering_decode_instruction(self, decode_instruction):
+        processor = self.processor
+        registers = processor.registers
+        executed, taken, not_taken = self.executed, self.taken, self.not_taken
+
+        def covered_decode_instruction():
+            # PC is past the opcode
+            address = (processor.PC - 1) & 0xffff
+            executed[address >> 3] |= 1 << (address & 7)
+            condition = BRANCH_CONDITIONS.get(registers[REG_IR])
+            if condition is not None:
+                flag, state = condition
+                outcome = taken if getattr(processor, flag) == state else not_taken
+                outcome[address >> 3] |= 1 << (address & 7)
+            decode_instruction()
+        return covered_decode_instruction
+
+    def covering_handler(self, opcode: int, handler):
+        executed, taken, not_taken = self.executed, self.taken, self.not_taken
+
+        if opcode not in BRANCH_CONDITIONS:
+            def covered_handler(cpu, mem):
+                address = cpu.pc
+                executed[address >> 3] |= 1 << (address & 7)
+                handler(cpu, mem)
+            return covered_handler
+
+        def covered_branch(cpu, mem):
+            address = cpu.pc
+            start = cpu.cycles
+            handler(cpu, mem)
+            executed[address >> 3] |= 1 << (address & 7)
+            # A branch taken uses at least one cycle more than its two cycles
+            outcome = taken if cpu.cycles - start > 2 else not_taken
+            outcome[address >> 3] |= 1 << (address & 7)
+        return covered_branch
+
+
+class LineCoverage(NamedTuple):
+    line: int
+    executed: bool
+    # None for lines without a branch
+    taken: bool | None
+    not_taken: bool | None
+
+
+def line_coverage(data: CoverageData, code_dict: dict, debug_info: dict, source_lines: list[str]) -> list[LineCoverage]:
+    """Return the coverage of the source lines (numbered from 1) with instructions, in line order.
+
+    code_dict and debug_info are those returned by the assembler, lines with .DB or .DS are skipped.
+    """
+    lines = {}
+    for address, line in debug_info.items():
+        if address not in code_dict or not 0 < line <= len(source_lines):
+            continue
+        if any(token.upper() in DATA_DIRECTIVES for token in source_lines[line - 1].split()):
+            continue
+        executed, taken, not_taken = lines.get(line, (False, None, None))
+        executed = executed or is_set(data.executed, address)
+        if int(code_dict[address][:2], 16) in BRANCH_CONDITIONS:
+            taken = bool(taken) or is_set(data.taken, address)
+            not_taken = bool(not_taken) or is_set(data.not_taken, address)
+        lines[line] = (executed, taken, not_taken)
+    return [LineCoverage(line, *lines[line]) for line in sorted(lines)]
+
+
+def summary(coverage: list[LineCoverage]) -> dict:
+    """Return the counts of lines and branch outcomes covered, and the lines missed."""
+    branches = [line for line in coverage if line.taken is not None]
+    return {
+        'lines': len(coverage),
+        'lines_executed': sum(line.executed for line in coverage),
+        'branches': len(branches),
+        'branches_taken': sum(line.taken for line in branches),
+        'branches_not_taken': sum(line.not_taken for line in branches),
+        'missed_lines': [line.line for line in coverage if not line.executed],
+        'partial_branches': [line.line for line in branches if not (line.taken and line.not_taken)],
+    }
+
+
+def listing(coverage: list[LineCoverage], source_lines: list[str]) -> str:
+    """Format source_lines with the coverage of their instructions.
+
+    Lines executed are marked with >, lines missed with !, and branches with T and N for the
+    outcomes taken and not taken, or - for an outcome missed.
+    """
+    lines = {line.line: line for line in coverage}
+    rows = []
+    for number, source in enumerate(source_lines, 1):
+        line = lines.get(number)
+        if line is None:
+            mark = '    '
+        else:
+            mark = '> ' if line.executed else '! '
+            if line.taken is not None:
+                mark += ('T' if line.taken else '-') + ('N' if line.not_taken else '-')
+            else:
+                mark += '  '
+        rows.append(f'{number:>6} {mark}  {source.rstrip()}')
+    return '\n'.join(rows)
+
+
+def main(arguments: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m emulator.coverage',
+                                     description='Print the merged coverage of batch results.')
+    parser.add_argument('program', help='.asm file run by the jobs')
+    parser.add_argument('results', help='output of emulator.batch for jobs with "coverage": true')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON instead of the listing')
+    arguments = parser.parse_args(arguments)
+    from emulator.batch import assemble
+    code_dict, debug_info = assemble(arguments.program)
+    data = CoverageData()
+    for line in Path(arguments.results).read_text().splitlines():
+        if line.strip():
+            data = data.merge(CoverageData.from_dict(json.loads(line).get('coverage', {})))
+    source_lines = Path(arguments.program).read_text().splitlines()
+    coverage = line_coverage(data, code_dict, debug_info, source_lines)
+    print(json.dumps(summary(coverage)) if arguments.json else listing(coverage, source_lines))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
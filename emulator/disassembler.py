@@ -0,0 +1,74 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Disassembly of single instructions, from the opcode constants of emulator.opcodes: the name of
+# each constant is the mnemonic followed by the address mode, as in LDA_INDIRECT_Y.
+
+import emulator.opcodes
+
+BRANCH_MNEMONICS = frozenset(('BCC', 'BCS', 'BEQ', 'BMI', 'BNE', 'BPL', 'BVC', 'BVS'))
+
+# Operand format and instruction length by address mode
+ADDRESS_MODES = {
+    '': ('', 1),
+    'ACCUMULATOR': ('A', 1),
+    'IMMEDIATE': ('#${lo:02X}', 2),
+    'ZERO_PAGE': ('${lo:02X}', 2),
+    'ZERO_PAGE_X': ('${lo:02X},X', 2),
+    'ZERO_PAGE_Y': ('${lo:02X},Y', 2),
+    'ABSOLUTE': ('${word:04X}', 3),
+    'ABSOLUTE_X': ('${word:04X},X', 3),
+    'ABSOLUTE_Y': ('${word:04X},Y', 3),
+    'INDIRECT': ('(${word:04X})', 3),
+    'INDIRECT_X': ('(${lo:02X},X)', 2),
+    'INDIRECT_Y': ('(${lo:02X}),Y', 2),
+    'RELATIVE': ('${target:04X}', 2),
+}
+
+
+def build_instruction_table() -> dict[int, tuple[str, str]]:
+    table = {}
+    for name, opcode in vars(emulator.opcodes).items():
+        if name.isupper() and isinstance(opcode, int):
+            mnemonic, _, mode = name.partition('_')
+            if mnemonic in BRANCH_MNEMONICS:
+                mode = 'RELATIVE'
+            elif mnemonic == 'JSR':
+                mode = 'ABSOLUTE'
+            table[opcode] = (mnemonic, mode)
+    return table
+
+
+# Mnemonic and address mode by opcode
+INSTRUCTIONS = build_instruction_table()
+
+
+def instruction_size(opcode: int) -> int:
+    """Return the length of the instruction in bytes, 1 for unknown opcodes."""
+    instruction = INSTRUCTIONS.get(opcode)
+    return 1 if instruction is None else ADDRESS_MODES[instruction[1]][1]
+
+
+def disassemble(opcode: int, lo: int = 0, hi: int = 0, address: int = 0) -> str:
+    """Return the instruction opcode with operand bytes lo and hi at address in assembler syntax."""
+    instruction = INSTRUCTIONS.get(opcode)
+    if instruction is None:
+        return f'.DB ${opcode:02X}'
+    mnemonic, mode = instruction
+    target = (address + 2 + (lo ^ 0x80) - 0x80) & 0xffff
+    operand = ADDRESS_MODES[mode][0].format(lo=lo, word=lo | hi << 8, target=target)
+    return f'{mnemonic} {operand}' if operand else mnemonic
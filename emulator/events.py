@@ -0,0 +1,109 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Events scheduled by devices at processor cycles.
+#
+# Every processor has an EventQueue in events, a heap of callbacks keyed on the cycle they are due
+# at. Before each instruction the processors compare their cycle count with next_cycle, the cycle
+# of the earliest event, and call the callbacks due; nothing else about devices is checked per
+# instruction. An event is thus handled before the first instruction starting at or after its
+# cycle. Callbacks are given the cycle they were scheduled for, so periodic events are rescheduled
+# without drift, and may schedule further events.
+#
+# Interrupts requested by setting interrupt_requested or non_maskable_interrupt_requested are seen
+# by run_instruction and at the start of run. Devices request them through schedule_interrupt,
+# which sets the flag from an event, so that runs notice it while only watching next_cycle. A
+# maskable request made while I is set stays pending, as a held IRQ line; CLI, PLP and RTI call
+# recheck when a request is pending, so that runs look at it again before the next instruction.
+
+import heapq
+import itertools
+
+NEVER = float('inf')
+
+
+class Event:
+    """Callback scheduled at cycle, see EventQueue.schedule."""
+    __slots__ = ('cycle', 'sequence', 'callback')
+
+    def __init__(self, cycle: int, sequence: int, callback) -> None:
+        self.cycle = cycle
+        self.sequence = sequence
+        self.callback = callback
+
+    def __lt__(self, other: 'Event') -> bool:
+        return (self.cycle, self.sequence) < (other.cycle, other.sequence)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.callback is None
+
+
+class EventQueue:
+    """Heap of the events pending, next_cycle is the cycle of the earliest one."""
+
+    def __init__(self) -> None:
+        self.heap = []
+        self.sequence = itertools.count()
+        self.next_cycle = NEVER
+
+    def __len__(self) -> int:
+        return sum(not event.cancelled for event in self.heap)
+
+    def schedule(self, cycle: int, callback) -> Event:
+        """Call callback(cycle) before the first instruction starting at cycle or later.
+
+        Events due at the same cycle are called in the order they were scheduled.
+        """
+        event = Event(cycle, next(self.sequence), callback)
+        heapq.heappush(self.heap, event)
+        if cycle < self.next_cycle:
+            self.next_cycle = cycle
+        return event
+
+    def schedule_interrupt(self, processor, cycle: int, non_maskable: bool = False) -> Event:
+        """Request an interrupt of processor at cycle."""
+        name = 'non_maskable_interrupt_requested' if non_maskable else 'interrupt_requested'
+        return self.schedule(cycle, lambda _: setattr(processor, name, True))
+
+    def recheck(self) -> None:
+        """Have runs call run_due, and serve the interrupts requested, before the next instruction."""
+        self.next_cycle = 0
+
+    def cancel(self, event: Event) -> None:
+        event.callback = None
+        self.drop_cancelled()
+
+    def clear(self) -> None:
+        self.heap.clear()
+        self.next_cycle = NEVER
+
+    def drop_cancelled(self) -> None:
+        heap = self.heap
+        while heap and heap[0].callback is None:
+            heapq.heappop(heap)
+        self.next_cycle = heap[0].cycle if heap else NEVER
+
+    def run_due(self, cycles: int) -> None:
+        """Call the callbacks of the events due at cycles, in cycle order."""
+        heap = self.heap
+        while heap and heap[0].cycle <= cycles:
+            event = heapq.heappop(heap)
+            callback, event.callback = event.callback, None
+            if callback is not None:
+                callback(event.cycle)
+        self.drop_cancelled()
@@ -0,0 +1,705 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Headless engine executing whole instructions instead of micro steps.
+#
+# The semantics of every instruction are generated as Python source from the same INSTRUCTION_SET
+# used by Processor: for each handler method of Processor there is a generator function of the
+# same name below, emitting the statements the micro steps of that method amount to. The generated
+# statements work on the processor state held in plain local variables (see STATE) and the memory
+# array mem. FastProcessor compiles one function per opcode from them; the results (registers,
+# flags, memory, cycle counts) are identical to those of Processor.
+#
+# With lazy flags, Z and N are not kept in z and n but derived from nz, which most instructions
+# set to their result: Z is set if nz & 0xff is 0, N if nz & 0x280 is not 0. Bit 9 carries N for
+# flag combinations not stemming from a result byte (see zero_negative). The packed status is only
+# built when an instruction or a reader of Z, N or SR needs it.
+
+import ast
+import functools
+import re
+from emulator.alu_tables import ADC, SBC
+from emulator.events import EventQueue
+from emulator.opcodes import BRK
+from emulator.processor import INSTRUCTION_SET, STOP_BRK, STOP_MAX_CYCLES, STOP_MAX_INSTRUCTIONS, STOP_UNTIL_PC, \
+    Memory, RunResult
+
+IRQ_VECTOR = 0xfffe
+RESET_VECTOR = 0xfffc
+NMI_VECTOR = 0xfffa
+
+# Names of the local variables holding the processor state in generated code
+STATE = ('pc', 'a', 'x', 'y', 's', 'c', 'z', 'i', 'd', 'b', 'v', 'n', 'nz', 'cycles')
+
+REGISTERS = {'A': 'a', 'X': 'x', 'Y': 'y', 'S': 's', 'C': 'c', 'Z': 'z', 'I': 'i', 'D': 'd', 'V': 'v', 'N': 'n'}
+
+# Instruction length in bytes by address mode
+INSTRUCTION_LENGTHS = {
+    'immediate': 2,
+    'zero_page': 2,
+    'zero_page_indexed': 2,
+    'absolute': 3,
+    'absolute_indexed': 3,
+    'indexed_indirect_x': 2,
+    'indirect_indexed_y': 2,
+    'indirect': 3,
+}
+
+PACK_STATUS = 'c | z << 1 | i << 2 | d << 3 | b << 4 | v << 6 | n << 7'
+LAZY_PACK_STATUS = 'c | (0 if nz & 0xff else 2) | i << 2 | d << 3 | b << 4 | v << 6 | (0x80 if nz & 0x280 else 0)'
+
+WRITE_PATTERN = re.compile(r'( *)mem\[(.+)\] = (.+)$')
+
+# Globals of the generated functions
+TABLES = {'ADC': ADC, 'SBC': SBC}
+
+
+class Operands:
+    """Source expressions for the operand bytes of an instruction.
+
+    Without a memory image the operands are read at run time relative to the local pc.
+    Given the memory and address of the instruction they are folded into constants.
+    lazy_flags selects the statements keeping Z and N in nz, devices the data accesses looking up
+    the page table of the bus.
+    """
+    def __init__(self, length: int, memory=None, address: int = None, lazy_flags: bool = False,
+                 devices: bool = False) -> None:
+        self.lazy_flags = lazy_flags
+        self.devices = devices
+        if memory is None:
+            self.known = False
+            self.lo = 'mem[pc + 1]'
+            self.hi = 'mem[pc + 2]'
+            self.word = '(mem[pc + 1] | mem[pc + 2] << 8)'
+            self.next = f'pc + {length}'
+        else:
+            self.known = True
+            self.lo_value = memory[(address + 1) & 0xffff]
+            self.hi_value = memory[(address + 2) & 0xffff]
+            self.next_value = (address + length) & 0xffff
+            self.lo = f'0x{self.lo_value:02x}'
+            self.hi = f'0x{self.hi_value:02x}'
+            self.word = f'0x{self.lo_value | self.hi_value << 8:04x}'
+            self.next = f'0x{self.next_value:04x}'
+
+
+# Building blocks
+def write(address: str, value: str) -> list[str]:
+    return [f'mem[{address}] = {value}']
+
+
+# Data reads and writes, which go to the device of the page if there is one. Devices are never
+# mapped into the zero page and the stack page. They see cpu.cycles including the cycle of the
+# access, the cycle-th of the instruction.
+def load(ops: Operands, location: str, mode: str, cycle: int) -> (list[str], str):
+    if not ops.devices or mode.startswith('zero_page'):
+        return [], f'mem[{location}]'
+    page = f'dev[{location} >> 8]'
+    return [f'if {page} is None:', f'    io = mem[{location}]', 'else:', f'    cpu.cycles = cycles + {cycle}',
+            f'    io = {page}.read({location})'], 'io'
+
+
+def store(ops: Operands, location: str, value: str, mode: str, cycle: int) -> list[str]:
+    if not ops.devices or mode.startswith('zero_page'):
+        return write(location, value)
+    page = f'dev[{location} >> 8]'
+    return [f'if {page} is None:', f'    mem[{location}] = {value}', 'else:', f'    cpu.cycles = cycles + {cycle}',
+            f'    {page}.write({location}, {value})']
+
+
+def constant(expression: str):
+    try:
+        return int(expression, 0)
+    except ValueError:
+        return None
+
+
+def check_code_writes(lines: list[str]) -> list[str]:
+    """Follow every store outside the stack page with a lookup in the code page bitmap.
+
+    A store into a page holding translated code calls cpu.invalidate_code with the address written.
+    """
+    checked = []
+    for line in lines:
+        match = WRITE_PATTERN.match(line)
+        if match is None or match.group(2) == '0x100 + s':
+            checked.append(line)
+            continue
+        indent, location, value = match.groups()
+        if constant(location) is not None:
+            page = f'0x{constant(location) >> 8:02x}'
+        else:
+            if location != 'addr':
+                checked.append(f'{indent}loc = {location}')
+                location = 'loc'
+            page = f'{location} >> 8'
+        checked += [f'{indent}mem[{location}] = {value}', f'{indent}if code[{page}]:',
+                    f'{indent}    cpu.invalidate_code({location})']
+    return checked
+
+
+def zero_negative(z: int, n: int) -> int:
+    """Return the value of nz standing for the flags z and n."""
+    return (0 if z else 1) | n << 9
+
+
+def set_zero_and_negative(ops: Operands, register: str) -> list[str]:
+    if ops.lazy_flags:
+        return [f'nz = {register}']
+    return [f'z = 0 if {register} else 1', f'n = {register} >> 7']
+
+
+def pack_status(ops: Operands) -> str:
+    return LAZY_PACK_STATUS if ops.lazy_flags else PACK_STATUS
+
+
+def push(value: str) -> list[str]:
+    return write('0x100 + s', value) + ['s = (s - 1) & 0xff']
+
+
+def pull(register: str) -> list[str]:
+    return ['s = (s + 1) & 0xff', f'{register} = mem[0x100 + s]']
+
+
+def unpack_status(ops: Operands, value: str) -> list[str]:
+    if ops.lazy_flags:
+        zero_negative_lines = ['nz = (0 if p & 2 else 1) | (p & 0x80) << 2']
+    else:
+        zero_negative_lines = ['z = p >> 1 & 1', 'n = p >> 7']
+    return [f'p = {value}', 'c = p & 1', 'i = p >> 2 & 1', 'd = p >> 3 & 1', 'b = p >> 4 & 1',
+            'v = p >> 6 & 1'] + zero_negative_lines
+
+
+# Address modes: return the statements computing the effective address, an expression for the
+# address and the number of cycles used including the opcode fetch
+def address(ops: Operands, mode: str, index_register: str = None, penalty_cycle=False) -> (list[str], str, int):
+    if mode == 'zero_page':
+        return [], ops.lo, 2
+    if mode == 'zero_page_indexed':
+        return [f'addr = ({ops.lo} + {REGISTERS[index_register]}) & 0xff'], 'addr', 3
+    if mode == 'absolute':
+        return [], ops.word, 3
+    if mode == 'absolute_indexed':
+        index = REGISTERS[index_register]
+        if penalty_cycle:
+            return [f'addr = ({ops.word} + {index}) & 0xffff'], 'addr', 4
+        return [f't = {ops.lo} + {index}', f'addr = (({ops.hi} << 8) + t) & 0xffff',
+                'if t > 0xff:', '    cycles += 1'], 'addr', 3
+    if mode == 'indexed_indirect_x':
+        return [f'p = ({ops.lo} + x) & 0xff', 'addr = mem[p] | mem[p + 1] << 8'], 'addr', 5
+    if mode == 'indirect_indexed_y':
+        return [f't = mem[{ops.lo}] + y', f'addr = ((mem[{ops.lo} + 1] << 8) + t) & 0xffff',
+                'if t > 0xff:', '    cycles += 1'], 'addr', 4
+    raise ValueError(f'Invalid address mode {mode}')
+
+
+# Read operand: return the statements, an expression for the operand value and the cycles used
+def read(ops: Operands, mode: str, index_register: str = None) -> (list[str], str, int):
+    if mode == 'immediate':
+        return [], ops.lo, 2
+    lines, location, cycles = address(ops, mode, index_register)
+    load_lines, value = load(ops, location, mode, cycles + 1)
+    return lines + load_lines, value, cycles + 1
+
+
+# Generators named after the Processor methods executing the instructions. Each returns the list of
+# statements and the number of cycles of the instruction (penalty cycles are added by the statements).
+# Changes to the generated code must increase RECOMPILER_VERSION of emulator.recompiler.
+def load_register(ops, register, mode, index_register=None):
+    lines, value, cycles = read(ops, mode, index_register)
+    register = REGISTERS[register]
+    return lines + [f'{register} = {value}'] + set_zero_and_negative(ops, register), cycles
+
+
+def store_register(ops, register, mode, index_register=None):
+    lines, location, cycles = address(ops, mode, index_register, penalty_cycle=True)
+    return lines + store(ops, location, REGISTERS[register], mode, cycles + 1), cycles + 1
+
+
+def transfer_register(ops, source, destination):
+    destination = REGISTERS[destination]
+    return [f'{destination} = {REGISTERS[source]}'] + set_zero_and_negative(ops, destination), 2
+
+
+def arithmetic_operation(ops, operator, mode, index_register=None):
+    lines, value, cycles = read(ops, mode, index_register)
+    if operator == 'adc':
+        lines += [f't = ADC[d << 17 | c << 16 | a << 8 | {value}]', 'a = t & 0xff', 'c = (t >> 8) & 1', 'v = t >> 9']
+    elif operator == 'sbc':
+        # Carry holds the borrow of the subtraction, as in Processor.alu_operation
+        lines += [f't = SBC[d << 17 | (1 - c) << 16 | a << 8 | {value}]', 'a = t & 0xff', 'c = (t >> 8) & 1',
+                  'v = t >> 9']
+    else:
+        symbol = {'and_': '&', 'or_': '|', 'xor': '^'}[operator]
+        lines += [f'a = a {symbol} {value}']
+    return lines + set_zero_and_negative(ops, 'a'), cycles
+
+
+def compare(ops, register, mode, index_register=None):
+    lines, value, cycles = read(ops, mode, index_register)
+    lines += [f't = {REGISTERS[register]} - {value}', 'c = 0 if t < 0 else 1']
+    if ops.lazy_flags:
+        return lines + ['nz = t & 0xff'], cycles
+    return lines + ['z = 0 if t else 1', 'n = (t >> 7) & 1'], cycles
+
+
+def bit_test(ops, mode, index_register=None):
+    lines, value, cycles = read(ops, mode, index_register)
+    lines += [f'm = {value}', 'v = (m >> 6) & 1']
+    if ops.lazy_flags:
+        return lines + ['nz = (m & 0x80) << 2 | a & m'], cycles
+    return lines + ['z = 0 if a & m else 1', 'n = m >> 7'], cycles
+
+
+def shift_accumulator(ops, left=True):
+    if left:
+        lines = ['c = a >> 7', 'a = (a << 1) & 0xff']
+    else:
+        lines = ['c = a & 1', 'a = a >> 1']
+    return lines + set_zero_and_negative(ops, 'a'), 2
+
+
+def shift_memory(ops, mode, index_register=None, left=True):
+    lines, location, cycles = address(ops, mode, index_register, penalty_cycle=True)
+    load_lines, value = load(ops, location, mode, cycles + 1)
+    lines += load_lines + [f'm = {value}']
+    if left:
+        lines += ['c = m >> 7', 'r = (m << 1) & 0xff']
+    else:
+        lines += ['c = m & 1', 'r = m >> 1']
+    return lines + store(ops, location, 'r', mode, cycles + 2) + set_zero_and_negative(ops, 'r'), cycles + 3
+
+
+def rotate_accumulator(ops, left=True):
+    if left:
+        lines = ['t = ((a << 1) | c) & 0xff', 'c = a >> 7', 'a = t']
+    else:
+        lines = ['t = (a >> 1) | (c << 7)', 'c = a & 1', 'a = t']
+    return lines + set_zero_and_negative(ops, 'a'), 2
+
+
+def rotate_memory(ops, mode, index_register=None, left=True):
+    lines, location, cycles = address(ops, mode, index_register, penalty_cycle=True)
+    load_lines, value = load(ops, location, mode, cycles + 1)
+    lines += load_lines + [f'm = {value}']
+    if left:
+        lines += ['r = ((m << 1) | c) & 0xff', 'c = m >> 7']
+    else:
+        lines += ['r = (m >> 1) | (c << 7)', 'c = m & 1']
+    return lines + store(ops, location, 'r', mode, cycles + 2) + set_zero_and_negative(ops, 'r'), cycles + 3
+
+
+def increment_register(ops, increment, register):
+    register = REGISTERS[register]
+    return [f'{register} = ({register} {"+" if increment == 1 else "-"} 1) & 0xff'] + \
+        set_zero_and_negative(ops, register), 2
+
+
+def increment(ops, increment, mode, index_register=None):
+    lines, location, cycles = address(ops, mode, index_register, penalty_cycle=True)
+    load_lines, value = load(ops, location, mode, cycles + 1)
+    lines += load_lines + [f'r = ({value} {"+" if increment == 1 else "-"} 1) & 0xff']
+    return lines + store(ops, location, 'r', mode, cycles + 2) + set_zero_and_negative(ops, 'r'), cycles + 3
+
+
+def flag_condition(ops, flag, state):
+    if ops.lazy_flags and flag == 'Z':
+        return 'not nz & 0xff' if state else 'nz & 0xff'
+    if ops.lazy_flags and flag == 'N':
+        return 'nz & 0x280' if state else 'not nz & 0x280'
+    return REGISTERS[flag] if state else f'not {REGISTERS[flag]}'
+
+
+def branch(ops, flag, state):
+    condition = flag_condition(ops, flag, state)
+    if ops.known:
+        offset = ops.lo_value - 0x100 if ops.lo_value & 0x80 else ops.lo_value
+        target = (ops.next_value + offset) & 0xffff
+        penalty = 2 if (target ^ ops.next_value) & 0xff00 else 1
+        return [f'if {condition}:', f'    cycles += {penalty}', f'    pc = 0x{target:04x}',
+                'else:', f'    pc = {ops.next}'], 2
+    return [f'nx = {ops.next}',
+            f'if {condition}:',
+            f'    t = (nx + ({ops.lo} ^ 0x80) - 0x80) & 0xffff',
+            '    cycles += 2 if (t ^ nx) & 0xff00 else 1',
+            '    pc = t',
+            'else:',
+            '    pc = nx'], 2
+
+
+# Have the runs serve an interrupt request left pending while I was set, see emulator.events
+def recheck_interrupts() -> list[str]:
+    return ['if cpu.interrupt_requested and not i:', '    cpu.events.recheck()']
+
+
+def set_flag(ops, flag, state):
+    if flag == 'I' and not state:
+        return ['i = 0'] + recheck_interrupts(), 2
+    return [f'{REGISTERS[flag]} = {int(state)}'], 2
+
+
+def push_register_to_stack(ops, register):
+    return push(pack_status(ops) if register == 'SR' else REGISTERS[register]), 3
+
+
+def pull_register_from_stack(ops, register):
+    if register == 'SR':
+        return ['s = (s + 1) & 0xff'] + unpack_status(ops, 'mem[0x100 + s]') + recheck_interrupts(), 4
+    return pull(REGISTERS[register]), 4
+
+
+def jump(ops, mode):
+    if mode == 'absolute':
+        return [f'pc = {ops.word}'], 3
+    return [f'w = {ops.word}', 'pc = mem[w] | mem[(w + 1) & 0xffff] << 8'], 5
+
+
+def jump_to_subroutine(ops):
+    # The target address is read after pushing the return address, as Processor does
+    return [f't = {ops.next} - 1'] + push('t >> 8') + push('t & 0xff') + [f'pc = {ops.word}'], 6
+
+
+def return_from_subroutine(ops):
+    return pull('lo') + ['s = (s + 1) & 0xff', 'pc = ((mem[0x100 + s] << 8 | lo) + 1) & 0xffff'], 6
+
+
+def brk(ops):
+    return [f't = {ops.next} + 1'] + push('t >> 8') + push('t & 0xff') + ['b = 1'] + push(pack_status(ops)) + \
+        [f'pc = mem[0x{IRQ_VECTOR:04x}] | mem[0x{IRQ_VECTOR + 1:04x}] << 8'], 7
+
+
+def return_from_interrupt(ops):
+    return ['s = (s + 1) & 0xff'] + unpack_status(ops, 'mem[0x100 + s]') + pull('lo') + \
+        ['s = (s + 1) & 0xff', 'pc = mem[0x100 + s] << 8 | lo', 'b = 0'] + recheck_interrupts(), 6
+
+
+def no_operation(ops):
+    return [], 1
+
+
+GENERATORS = {
+    generator.__name__: generator for generator in (
+        load_register, store_register, transfer_register, arithmetic_operation, compare, bit_test,
+        shift_accumulator, shift_memory, rotate_accumulator, rotate_memory, increment_register, increment,
+        branch, set_flag, push_register_to_stack, pull_register_from_stack, jump, jump_to_subroutine,
+        return_from_subroutine, brk, return_from_interrupt, no_operation,
+    )
+}
+
+
+def instruction_length(opcode: int) -> int:
+    method, arguments = INSTRUCTION_SET.get(opcode, ('no_operation', ()))
+    if method == 'branch':
+        return 2
+    if method == 'jump_to_subroutine':
+        return 3
+    for argument in arguments:
+        if argument in INSTRUCTION_LENGTHS:
+            return INSTRUCTION_LENGTHS[argument]
+    return 1
+
+
+def generate_instruction(opcode: int, ops: Operands) -> (list[str], int):
+    """Return the statements executing opcode with operands ops, and its number of cycles."""
+    method, arguments = INSTRUCTION_SET.get(opcode, ('no_operation', ()))
+    return GENERATORS[method](ops, *arguments)
+
+
+def state_names(lines: list[str]) -> (set, set):
+    """Return the state variables read and assigned by the statements."""
+    tree = ast.parse('\n'.join(lines) or 'pass')
+    read, assigned = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            read.add(node.target.id)
+        elif isinstance(node, ast.Name) and node.id in STATE:
+            (assigned if isinstance(node.ctx, ast.Store) else read).add(node.id)
+    return read & set(STATE), assigned
+
+
+def build_handler_source(opcode: int, code_writes_checked: bool = False, lazy_flags: bool = False,
+                         devices: bool = False) -> str:
+    length = instruction_length(opcode)
+    body, cycles = generate_instruction(opcode, Operands(length, lazy_flags=lazy_flags, devices=devices))
+    read, assigned = state_names(body)
+    lines = [f'def _op_{opcode:02x}(cpu, mem):', '    pc = cpu.pc']
+    if code_writes_checked and check_code_writes(body) != body:
+        body = check_code_writes(body)
+        lines.append('    code = cpu.code_pages')
+    if any('dev[' in line for line in body):
+        lines.append('    dev = cpu.memory.devices')
+    lines += [f'    {name} = cpu.{name}' for name in STATE[1:] if name in read]
+    lines += ['    ' + line for line in body]
+    lines += [f'    cpu.{name} = {name}' for name in STATE[1:-1] if name in assigned]
+    lines.append('    cpu.pc = pc' if 'pc' in assigned else f'    cpu.pc = (pc + {length}) & 0xffff')
+    lines.append(f'    cpu.cycles = cycles + {cycles}' if 'cycles' in read else f'    cpu.cycles += {cycles}')
+    return '\n'.join(lines) + '\n'
+
+
+@functools.cache
+def build_handlers(code_writes_checked: bool = False, lazy_flags: bool = False, devices: bool = False) -> tuple:
+    namespace = dict(TABLES)
+    for opcode in range(0x100):
+        source = build_handler_source(opcode, code_writes_checked, lazy_flags, devices)
+        exec(compile(source, f'<6502 opcode ${opcode:02X}>', 'exec'), namespace)
+    return tuple(namespace[f'_op_{opcode:02x}'] for opcode in range(0x100))
+
+
+HANDLERS = build_handlers()
+LAZY_HANDLERS = build_handlers(lazy_flags=True)
+
+
+class FastProcessor:
+    """Headless processor with the public interface of Processor, executing one instruction per call.
+
+    Registers and flags are plain integers, each flag a separate 0/1 value.
+    With lazy_flags, Z and N are derived from nz only when read.
+    """
+    __slots__ = (
+        'memory_size', 'memory', 'mem', 'pc', 'a', 'x', 'y', 's', 'c', 'z', 'i', 'd', 'b', 'v', 'n', 'nz', 'cycles',
+        'interrupt_vector_address', 'reset_vector_address', 'nmi_vector_address',
+        'interrupt_requested', 'non_maskable_interrupt_requested', 'lazy_flags', 'handlers', 'base_handlers',
+        'hooks', 'events',
+    )
+
+    def __init__(self, memory_size=2 ** 16, lazy_flags: bool = False) -> None:
+        self.lazy_flags = lazy_flags
+        # The handlers run, base_handlers wrapped by the tools installed in hooks, see emulator.hooks
+        self.handlers = self.base_handlers = LAZY_HANDLERS if lazy_flags else HANDLERS
+        self.hooks = {}
+        self.memory_size = memory_size
+        self.memory = Memory(memory_size)
+        self.mem = self.memory.data
+        self.pc = self.a = self.x = self.y = 0
+        self.s = 0xff
+        self.c = self.z = self.i = self.d = self.b = self.v = self.n = 0
+        self.nz = zero_negative(0, 0)
+        self.cycles = 0
+        self.interrupt_vector_address = IRQ_VECTOR
+        self.reset_vector_address = RESET_VECTOR
+        self.nmi_vector_address = NMI_VECTOR
+        self.interrupt_requested = False
+        self.non_maskable_interrupt_requested = False
+        self.events = EventQueue()
+
+    @property
+    def PC(self):  # noqa
+        return self.pc
+
+    @PC.setter
+    def PC(self, value):
+        assert 0 <= value < 0x10000
+        self.pc = value
+
+    @property
+    def A(self):
+        return self.a
+
+    @A.setter
+    def A(self, value):
+        self.a = value
+
+    @property
+    def X(self):
+        return self.x
+
+    @X.setter
+    def X(self, value):
+        self.x = value
+
+    @property
+    def Y(self):
+        return self.y
+
+    @Y.setter
+    def Y(self, value):
+        self.y = value
+
+    @property
+    def S(self):
+        return self.s
+
+    @S.setter
+    def S(self, value):
+        self.s = value
+
+    @property
+    def SR(self):
+        return self.c | self.Z << 1 | self.i << 2 | self.d << 3 | self.b << 4 | self.v << 6 | self.N << 7
+
+    @SR.setter
+    def SR(self, value):
+        self.c = value & 1
+        self.z = (value >> 1) & 1
+        self.i = (value >> 2) & 1
+        self.d = (value >> 3) & 1
+        self.b = (value >> 4) & 1
+        self.v = (value >> 6) & 1
+        self.n = (value >> 7) & 1
+        self.nz = zero_negative(self.z, self.n)
+
+    @property
+    def C(self):
+        return self.c
+
+    @C.setter
+    def C(self, value):
+        self.c = int(bool(value))
+
+    @property
+    def Z(self):
+        if self.lazy_flags:
+            return 0 if self.nz & 0xff else 1
+        return self.z
+
+    @Z.setter
+    def Z(self, value):
+        n = self.N
+        self.z = int(bool(value))
+        self.nz = zero_negative(self.z, n)
+
+    @property
+    def I(self):  # noqa e741
+        return self.i
+
+    @I.setter
+    def I(self, value):  # noqa e741
+        self.i = int(bool(value))
+
+    @property
+    def D(self):
+        return self.d
+
+    @D.setter
+    def D(self, value):
+        self.d = int(bool(value))
+
+    @property
+    def B(self):
+        return self.b
+
+    @B.setter
+    def B(self, value):
+        self.b = int(bool(value))
+
+    @property
+    def V(self):
+        return self.v
+
+    @V.setter
+    def V(self, value):
+        self.v = int(bool(value))
+
+    @property
+    def N(self):
+        if self.lazy_flags:
+            return 1 if self.nz & 0x280 else 0
+        return self.n
+
+    @N.setter
+    def N(self, value):
+        z = self.Z
+        self.n = int(bool(value))
+        self.nz = zero_negative(z, self.n)
+
+    def word(self, address: int) -> int:
+        return self.mem[address] + (self.mem[address + 1] << 8)
+
+    def reset(self) -> None:
+        self.pc = self.word(self.reset_vector_address)
+        self.s = 0xff
+        self.a = self.x = self.y = 0
+        self.c = self.z = self.i = self.d = self.b = self.v = self.n = 0
+        self.nz = zero_negative(0, 0)
+        self.cycles = 0
+
+    def clear_memory(self) -> None:
+        self.memory.initialise()
+        self.mem = self.memory.data
+
+    def push(self, value: int) -> None:
+        self.mem[0x100 + self.s] = value
+        self.s = (self.s - 1) & 0xff
+
+    def interrupt(self, vector_address: int = None) -> None:
+        self.push(self.pc >> 8)
+        self.push(self.pc & 0xff)
+        self.push(self.SR)
+        self.i = 1
+        self.pc = self.word(self.interrupt_vector_address if vector_address is None else vector_address)
+        self.cycles += 5
+
+    def non_maskable_interrupt(self) -> None:
+        self.interrupt(self.nmi_vector_address)
+
+    def serve_interrupt_requests(self) -> None:
+        # A maskable request stays pending while I is set
+        if self.interrupt_requested and not self.i:
+            self.interrupt()
+            self.interrupt_requested = False
+        if self.non_maskable_interrupt_requested:
+            self.non_maskable_interrupt()
+            self.non_maskable_interrupt_requested = False
+
+    # Call the events due and serve the interrupts requested
+    def serve_events(self) -> None:
+        if self.cycles >= self.events.next_cycle:
+            self.events.run_due(self.cycles)
+        if self.interrupt_requested or self.non_maskable_interrupt_requested:
+            self.serve_interrupt_requests()
+
+    # Run instruction at PC
+    def run_instruction(self) -> None:
+        self.serve_events()
+        mem = self.mem
+        self.handlers[mem[self.pc]](self, mem)
+
+    def run(self, max_cycles: int = None, max_instructions: int = None, until_pc: int = None,
+            stop_on_brk: bool = True) -> RunResult:
+        """Run instructions until a stop condition holds, see Processor.run.
+
+        Interrupts requested before the run are served first, later ones are seen after the events
+        setting them (see emulator.events).
+        """
+        start_cycles = self.cycles
+        cycle_limit = float('inf') if max_cycles is None else start_cycles + max_cycles
+        instruction_limit = float('inf') if max_instructions is None else max_instructions
+        until_pc = -1 if until_pc is None else until_pc
+        brk = BRK if stop_on_brk else -1
+        mem = self.mem
+        handlers = self.handlers
+        events = self.events
+        pending = self.interrupt_requested or self.non_maskable_interrupt_requested
+        executed = 0
+        while True:
+            pc = self.pc
+            if pc == until_pc:
+                reason = STOP_UNTIL_PC
+            elif mem[pc] == brk:
+                reason = STOP_BRK
+            elif executed >= instruction_limit:
+                reason = STOP_MAX_INSTRUCTIONS
+            elif self.cycles >= cycle_limit:
+                reason = STOP_MAX_CYCLES
+            else:
+                if pending or self.cycles >= events.next_cycle:
+                    pending = False
+                    self.serve_events()
+                handlers[mem[self.pc]](self, mem)
+                executed += 1
+                continue
+            return RunResult(reason, self.cycles - start_cycles, executed)
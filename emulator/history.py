@@ -0,0 +1,130 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Reverse execution for Processor.
+#
+# ExecutionHistory executes instructions on a processor while keeping a bounded list of snapshots
+# (see Processor.snapshot), one every interval instructions, and a log of the addresses of all
+# memory writes. Going back restores the nearest earlier snapshot and replays the instructions up
+# to the target, so registers need no log of their own. The log holds two bytes per write and four
+# per instruction and only reaches back to the oldest snapshot: with at most max_snapshots
+# snapshots the history covers the last interval * max_snapshots instructions at most and its
+# size stays bounded however long a session runs.
+#
+# Replaying assumes that the instructions behave the same as when they were recorded. Changes to
+# the processor state made between steps (e.g. edits in the GUI, interrupt requests) must be
+# followed by record_snapshot.
+
+from array import array
+from bisect import bisect_right
+from emulator.processor import Processor
+
+
+class ExecutionHistory:
+    """Step forward and back through the instructions executed by processor."""
+
+    def __init__(self, processor: Processor, interval: int = 1000, max_snapshots: int = 100) -> None:
+        assert interval > 0 and max_snapshots > 0
+        self.processor = processor
+        self.interval = interval
+        self.max_snapshots = max_snapshots
+        # Number of instructions executed since recording started
+        self.instruction = 0
+        # Snapshots and the instruction numbers they were taken at, in ascending order
+        self.snapshots = []
+        self.snapshot_instructions = []
+        # Addresses written, and for each instruction since the oldest snapshot the index of its first write
+        self.writes = array('H')
+        self.write_starts = array('L')
+        self.record_snapshot()
+
+    @property
+    def first_instruction(self) -> int:
+        """The number of the oldest instruction that can be stepped back to."""
+        return self.snapshot_instructions[0]
+
+    def record_snapshot(self) -> None:
+        """Take a snapshot of the current state, needed after changes made without step."""
+        if self.snapshot_instructions and self.snapshot_instructions[-1] == self.instruction:
+            self.snapshots[-1] = self.processor.snapshot()
+            return
+        self.snapshots.append(self.processor.snapshot())
+        self.snapshot_instructions.append(self.instruction)
+        if len(self.snapshots) > self.max_snapshots:
+            self.drop_oldest_snapshot()
+
+    def drop_oldest_snapshot(self) -> None:
+        del self.snapshots[0]
+        del self.snapshot_instructions[0]
+        dropped = self.first_instruction - (self.instruction - len(self.write_starts))
+        offset = self.write_starts[dropped] if dropped < len(self.write_starts) else len(self.writes)
+        del self.writes[:offset]
+        self.write_starts = array('L', (start - offset for start in self.write_starts[dropped:]))
+
+    def step(self, count: int = 1) -> None:
+        """Execute count instructions, recording them."""
+        processor = self.processor
+        processor.memory.set_write_log(self.writes)
+        try:
+            for _ in range(count):
+                if self.instruction - self.snapshot_instructions[-1] >= self.interval:
+                    self.record_snapshot()
+                self.write_starts.append(len(self.writes))
+                processor.run_instruction()
+                self.instruction += 1
+        finally:
+            processor.memory.set_write_log(None)
+
+    def go_to(self, instruction: int) -> None:
+        """Restore the state before instruction was executed, which must be in the history.
+
+        The instructions after it are dropped from the history.
+        """
+        assert self.first_instruction <= instruction <= self.instruction
+        index = bisect_right(self.snapshot_instructions, instruction) - 1
+        self.processor.restore(self.snapshots[index])
+        for _ in range(instruction - self.snapshot_instructions[index]):
+            self.processor.run_instruction()
+        del self.snapshots[index + 1:]
+        del self.snapshot_instructions[index + 1:]
+        kept = len(self.write_starts) - (self.instruction - instruction)
+        if kept < len(self.write_starts):
+            del self.writes[self.write_starts[kept]:]
+            del self.write_starts[kept:]
+        self.instruction = instruction
+
+    def step_back(self, count: int = 1) -> int:
+        """Go back count instructions, or as far as the history reaches; return the number gone back."""
+        target = max(self.instruction - count, self.first_instruction)
+        steps = self.instruction - target
+        self.go_to(target)
+        return steps
+
+    def run_back_to_write(self, address: int) -> bool:
+        """Go back to the last instruction writing address, stopping before it executes.
+
+        Return False and stay if no instruction in the history wrote address.
+        """
+        writes = self.writes
+        for index in range(len(writes) - 1, -1, -1):
+            if writes[index] == address:
+                break
+        else:
+            return False
+        first_logged = self.instruction - len(self.write_starts)
+        self.go_to(first_logged + bisect_right(self.write_starts, index) - 1)
+        return True
@@ -0,0 +1,107 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Wrappers installed by tools around the methods of a processor.
+#
+# The profilers, the tracer, the breakpoints, the statistics and the coverage watch a processor by
+# wrapping some of its methods, several of them possibly the same method at the same time. They
+# install a wrapper with wrap_method, given the tool owning it and a function that takes the
+# method to be wrapped and returns the wrapping function. processor.hooks keeps the wrappers of
+# each method in the order they were installed; the instance attribute is the method of the class
+# wrapped by all of them, the one installed last being called first. unwrap_method removes the
+# wrapper of one tool and builds the chain again from the others, in whatever order the tools are
+# disabled. Without wrappers left the instance attribute is removed, so the processor runs the
+# methods of its class without any indirection. The dispatch table is bound again whenever an
+# instruction method is wrapped or unwrapped.
+#
+# The handlers of a FastProcessor are wrapped alike with wrap_handlers, the wrapper taking the
+# opcode and the handler. They wrap processor.base_handlers, which set_handlers replaces, as the
+# bus does when devices are attached.
+
+from emulator.processor import INSTRUCTION_SET
+
+# Methods bound in the dispatch table of Processor
+DISPATCHED_METHODS = frozenset(method for method, _ in INSTRUCTION_SET.values()) | {'no_operation'}
+
+# Key of the handler wrappers in the hooks of a FastProcessor
+HANDLERS = 'handlers'
+
+
+def add_wrapper(processor, name: str, owner, wrapper) -> None:
+    chain = [(installed, function) for installed, function in processor.hooks.get(name, ()) if installed is not owner]
+    processor.hooks[name] = chain + [(owner, wrapper)]
+
+
+def remove_wrapper(processor, name: str, owner) -> None:
+    chain = [(installed, function) for installed, function in processor.hooks.get(name, ()) if installed is not owner]
+    if chain:
+        processor.hooks[name] = chain
+    else:
+        processor.hooks.pop(name, None)
+
+
+def is_wrapped(processor, name: str, owner) -> bool:
+    """Return whether owner wraps method name (or HANDLERS) of processor."""
+    return any(installed is owner for installed, _ in processor.hooks.get(name, ()))
+
+
+def wrap_method(processor, name: str, owner, wrapper) -> None:
+    """Wrap method name of processor with wrapper(method), replacing the wrapper owner installed before."""
+    add_wrapper(processor, name, owner, wrapper)
+    build_method(processor, name)
+
+
+def unwrap_method(processor, name: str, owner) -> None:
+    """Remove the wrapper of method name installed by owner, if any."""
+    remove_wrapper(processor, name, owner)
+    build_method(processor, name)
+
+
+def build_method(processor, name: str) -> None:
+    processor.__dict__.pop(name, None)
+    chain = processor.hooks.get(name)
+    if chain:
+        method = getattr(processor, name)
+        for _, wrapper in chain:
+            method = wrapper(method)
+        setattr(processor, name, method)
+    if name in DISPATCHED_METHODS:
+        processor.dispatch_table = processor.build_dispatch_table()
+
+
+def wrap_handlers(processor, owner, wrapper) -> None:
+    """Wrap every handler of a FastProcessor with wrapper(opcode, handler)."""
+    add_wrapper(processor, HANDLERS, owner, wrapper)
+    build_handlers(processor)
+
+
+def unwrap_handlers(processor, owner) -> None:
+    remove_wrapper(processor, HANDLERS, owner)
+    build_handlers(processor)
+
+
+def set_handlers(processor, handlers: tuple) -> None:
+    """Replace the handlers of a FastProcessor, keeping the wrappers installed."""
+    processor.base_handlers = handlers
+    build_handlers(processor)
+
+
+def build_handlers(processor) -> None:
+    handlers = processor.base_handlers
+    for _, wrapper in processor.hooks.get(HANDLERS, ()):
+        handlers = tuple(wrapper(opcode, handler) for opcode, handler in enumerate(handlers))
+    processor.handlers = handlers
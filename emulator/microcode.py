@@ -0,0 +1,390 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Microcode ROM: the micro steps of every opcode as a flat tuple of micro-ops.
+#
+# The micro-op sequences are compiled once at import from INSTRUCTION_SET, by functions named after
+# the Processor methods they mirror. A micro-op is a tuple of its code and operands; registers are
+# given by their index in the register file of Processor. MicrocodeProcessor executes the sequences
+# with a single interpreter loop and ends up in the same state as Processor, including the ALU
+# registers, address register and cycle count. Data accesses index the memory directly unless a
+# device is attached (see emulator.bus) or fetch_byte or put_byte are wrapped by a tool, like the
+# watchpoints of emulator.breakpoints; then they are made through these methods, as by Processor.
+
+from emulator.alu_tables import ZERO_NEGATIVE
+from emulator.processor import INSTRUCTION_SET, REGISTER_IDS, REGISTER_NAMES, REG_PCH, REG_PCL, REG_ARH, REG_ARL, \
+    REG_S, REG_A, REG_X, REG_Y, REG_SR, REG_OP1, REG_OP2, REG_RES, REG_IR, Processor
+
+# Micro-op codes
+CYCLE = 0             # Use one cycle
+COPY = 1              # COPY source destination: copy register
+CONST = 2             # CONST value destination: set register to value
+FETCH_PC = 3          # FETCH_PC destination: fetch byte at PC to register, increment PC
+FETCH = 4             # FETCH destination: fetch byte at AR to register
+PUT = 5               # PUT source: write register to AR
+NZ = 6                # NZ register: set Z and N according to register
+ALU = 7               # ALU operator: Processor.alu_operation(operator)
+AR_FROM_PC = 8        # AR = PC, increment PC (immediate operand)
+INDEX_ZERO_PAGE = 9   # INDEX_ZERO_PAGE index: add index register to AR within the zero page
+INDEX_LOW = 10        # INDEX_LOW index penalty: add index register to ARL, use a cycle on carry or if penalty
+ADD_CARRY_HIGH = 11   # Add the carry of the last INDEX_LOW to ARH
+POINTER = 12          # AR = word at AR, uses two cycles
+INDEX_WORD = 13       # INDEX_WORD index: add index register to AR, use a cycle on a page crossing
+STACK_AR = 14         # AR = 0x100 + S
+BRANCH = 15           # BRANCH mask state: add signed OP1 to PC if the flag in mask has the given state
+SET_FLAG = 16         # SET_FLAG mask state: set or clear flag
+COPY_CARRY = 17       # COPY_CARRY destination: copy C to register
+FETCH_STATUS = 18     # Fetch byte at AR to SR, bit 5 stays clear
+BIT = 19              # Set N and V from OP2, Z from RES
+JUMP = 20             # PC = AR
+ADD_PC = 21           # ADD_PC increment: add increment to PC
+VECTOR_AR = 22        # VECTOR_AR offset: AR = interrupt vector address + offset
+
+MICRO_OP_NAMES = (
+    'CYCLE', 'COPY', 'CONST', 'FETCH_PC', 'FETCH', 'PUT', 'NZ', 'ALU', 'AR_FROM_PC', 'INDEX_ZERO_PAGE', 'INDEX_LOW',
+    'ADD_CARRY_HIGH', 'POINTER', 'INDEX_WORD', 'STACK_AR', 'BRANCH', 'SET_FLAG', 'COPY_CARRY', 'FETCH_STATUS',
+    'BIT', 'JUMP', 'ADD_PC', 'VECTOR_AR',
+)
+
+# Positions of the operands holding register indices, by micro-op code
+REGISTER_OPERANDS = {
+    COPY: (1, 2), CONST: (2,), FETCH_PC: (1,), FETCH: (1,), PUT: (1,), NZ: (1,), INDEX_ZERO_PAGE: (1,),
+    INDEX_LOW: (1,), INDEX_WORD: (1,), COPY_CARRY: (1,),
+}
+
+# Bit masks of the flags in SR
+FLAG_MASKS = {'C': 0x01, 'Z': 0x02, 'I': 0x04, 'D': 0x08, 'B': 0x10, 'V': 0x40, 'N': 0x80}
+
+
+def register(name: str) -> int:
+    return REGISTER_IDS[name]
+
+
+# Address modes
+def immediate() -> list:
+    return [(AR_FROM_PC,)]
+
+
+def zero_page() -> list:
+    return [(FETCH_PC, REG_ARL), (CONST, 0, REG_ARH)]
+
+
+def zero_page_indexed(index_register: str, penalty_cycle=False) -> list:  # noqa
+    return [(CYCLE,)] + zero_page() + [(INDEX_ZERO_PAGE, register(index_register))]
+
+
+def absolute() -> list:
+    return [(FETCH_PC, REG_ARL), (FETCH_PC, REG_ARH)]
+
+
+def absolute_indexed(index_register: str, penalty_cycle=False) -> list:
+    return [(FETCH_PC, REG_ARL), (INDEX_LOW, register(index_register), penalty_cycle), (FETCH_PC, REG_ARH),
+            (ADD_CARRY_HIGH,)]
+
+
+def indexed_indirect_x() -> list:
+    return zero_page() + [(INDEX_ZERO_PAGE, REG_X), (CYCLE,), (POINTER,)]
+
+
+def indirect_indexed_y() -> list:
+    return zero_page() + [(POINTER,), (INDEX_WORD, REG_Y)]
+
+
+def indirect() -> list:
+    return absolute() + [(POINTER,)]
+
+
+ADDRESS_MODES = {
+    mode.__name__: mode for mode in (
+        immediate, zero_page, zero_page_indexed, absolute, absolute_indexed, indexed_indirect_x, indirect_indexed_y,
+        indirect,
+    )
+}
+
+
+def get_address(mode: str, index_register: str = None, penalty_cycle=False) -> list:
+    if index_register is None:
+        return ADDRESS_MODES[mode]()
+    return ADDRESS_MODES[mode](index_register, penalty_cycle)
+
+
+# Stack
+def add_to_stack_pointer(increment: int) -> list:
+    return [(COPY, REG_S, REG_OP1), (ALU, 'inc' if increment == 1 else 'dec'), (COPY, REG_RES, REG_S)]
+
+
+def push_register(name: str) -> list:
+    return [(STACK_AR,), (PUT, register(name))] + add_to_stack_pointer(-1)
+
+
+def pull_register(name: str) -> list:
+    fetch = (FETCH_STATUS,) if name == 'SR' else (FETCH, register(name))
+    return add_to_stack_pointer(1) + [(STACK_AR,), fetch]
+
+
+def load_vector() -> list:
+    return [(VECTOR_AR, 0), (FETCH, REG_PCL), (VECTOR_AR, 1), (FETCH, REG_PCH)]
+
+
+# Instructions, named after the Processor methods executing them
+def load_register(name, mode, index_register=None):
+    return get_address(mode, index_register) + [(FETCH, register(name)), (NZ, register(name))]
+
+
+def store_register(name, mode, index_register=None):
+    return get_address(mode, index_register, penalty_cycle=True) + [(PUT, register(name))]
+
+
+def transfer_register(source, destination):
+    return [(COPY, register(source), register(destination)), (CYCLE,), (NZ, register(destination))]
+
+
+def arithmetic_operation(operator, mode, index_register=None):
+    return [(COPY, REG_A, REG_OP1)] + get_address(mode, index_register) + \
+        [(FETCH, REG_OP2), (ALU, operator), (COPY, REG_RES, REG_A), (NZ, REG_RES)]
+
+
+def compare(name, mode, index_register=None):
+    return [(COPY, register(name), REG_OP1)] + get_address(mode, index_register) + [(FETCH, REG_OP2), (ALU, 'cmp')]
+
+
+def bit_test(mode, index_register=None):
+    return [(COPY, REG_A, REG_OP1)] + get_address(mode, index_register) + [(FETCH, REG_OP2), (ALU, 'and_'), (BIT,)]
+
+
+def shift_accumulator(left=True):
+    return [(COPY, REG_A, REG_OP1), (CONST, 0, REG_OP2), (ALU, 'shl' if left else 'shr'), (COPY, REG_RES, REG_A),
+            (CYCLE,), (NZ, REG_RES)]
+
+
+def shift_memory(mode, index_register=None, left=True):
+    return get_address(mode, index_register, penalty_cycle=True) + \
+        [(FETCH, REG_OP1), (CONST, 0, REG_OP2), (ALU, 'shl' if left else 'shr'), (PUT, REG_RES), (CYCLE,),
+         (NZ, REG_RES)]
+
+
+def rotate_accumulator(left=True):
+    return [(COPY, REG_A, REG_OP1), (COPY_CARRY, REG_OP2), (ALU, 'rol' if left else 'ror'), (COPY, REG_RES, REG_A),
+            (CYCLE,), (NZ, REG_RES)]
+
+
+def rotate_memory(mode, index_register=None, left=True):
+    return get_address(mode, index_register, penalty_cycle=True) + \
+        [(FETCH, REG_OP1), (COPY_CARRY, REG_OP2), (ALU, 'rol' if left else 'ror'), (PUT, REG_RES), (CYCLE,),
+         (NZ, REG_RES)]
+
+
+def increment_register(increment, name):
+    return [(COPY, register(name), REG_OP1), (ALU, 'inc' if increment == 1 else 'dec'),
+            (COPY, REG_RES, register(name)), (CYCLE,), (NZ, REG_RES)]
+
+
+def increment(increment, mode, index_register=None):  # noqa
+    return get_address(mode, index_register, penalty_cycle=True) + \
+        [(FETCH, REG_OP1), (ALU, 'inc' if increment == 1 else 'dec'), (PUT, REG_RES), (CYCLE,), (NZ, REG_RES)]
+
+
+def branch(flag, state):
+    return [(FETCH_PC, REG_OP1), (BRANCH, FLAG_MASKS[flag], bool(state))]
+
+
+def set_flag(flag, state):
+    return [(SET_FLAG, FLAG_MASKS[flag], bool(state)), (CYCLE,)]
+
+
+def push_register_to_stack(name):
+    return push_register(name) + [(CYCLE,)]
+
+
+def pull_register_from_stack(name):
+    return pull_register(name) + [(CYCLE,), (CYCLE,)]
+
+
+def jump(mode):
+    return get_address(mode) + [(JUMP,)]
+
+
+def jump_to_subroutine():
+    return [(ADD_PC, 1)] + push_register('PCH') + push_register('PCL') + [(ADD_PC, -1), (CYCLE,)] + jump('absolute')
+
+
+def return_from_subroutine():
+    return pull_register('PCL') + [(CYCLE,)] + pull_register('PCH') + [(CYCLE,), (ADD_PC, 1), (CYCLE,)]
+
+
+def brk():
+    return [(CYCLE,), (ADD_PC, 1)] + push_register('PCH') + push_register('PCL') + \
+        [(SET_FLAG, FLAG_MASKS['B'], True)] + push_register('SR') + load_vector()
+
+
+def return_from_interrupt():
+    return pull_register('SR') + pull_register('PCL') + pull_register('PCH') + \
+        [(SET_FLAG, FLAG_MASKS['B'], False), (CYCLE,), (CYCLE,)]
+
+
+def no_operation():
+    return []
+
+
+COMPILERS = {
+    compiler.__name__: compiler for compiler in (
+        load_register, store_register, transfer_register, arithmetic_operation, compare, bit_test,
+        shift_accumulator, shift_memory, rotate_accumulator, rotate_memory, increment_register, increment,
+        branch, set_flag, push_register_to_stack, pull_register_from_stack, jump, jump_to_subroutine,
+        return_from_subroutine, brk, return_from_interrupt, no_operation,
+    )
+}
+
+
+def compile_opcode(opcode: int) -> tuple:
+    method, arguments = INSTRUCTION_SET.get(opcode, ('no_operation', ()))
+    return tuple(COMPILERS[method](*arguments))
+
+
+# Micro-op sequence by opcode
+MICROCODE = tuple(compile_opcode(opcode) for opcode in range(0x100))
+
+
+def disassemble_microcode(opcode: int) -> list[str]:
+    """Return the micro-ops of opcode in readable form, e.g. 'FETCH OP2'."""
+    lines = []
+    for micro_op in MICROCODE[opcode]:
+        register_positions = REGISTER_OPERANDS.get(micro_op[0], ())
+        operands = [REGISTER_NAMES[operand] if position in register_positions else str(operand)
+                    for position, operand in enumerate(micro_op[1:], 1)]
+        lines.append(' '.join([MICRO_OP_NAMES[micro_op[0]]] + operands))
+    return lines
+
+
+class MicrocodeProcessor(Processor):
+    """Processor executing the micro-op sequences of MICROCODE instead of calling its instruction methods."""
+
+    def decode_instruction(self) -> None:
+        registers = self.registers
+        memory = self.memory
+        mem = memory.data
+        watched = memory.watched_pages
+        # Memory micro-ops go through fetch_byte and put_byte while these are overridden or wrapped
+        cls = type(self)
+        direct = (not memory.devices_attached
+                  and cls.fetch_byte is Processor.fetch_byte and cls.put_byte is Processor.put_byte
+                  and 'fetch_byte' not in self.__dict__ and 'put_byte' not in self.__dict__)
+        cycles = self.cycles
+        carry = 0
+        for micro_op in MICROCODE[registers[REG_IR]]:
+            code = micro_op[0]
+            if code == FETCH_PC:
+                cycles += 1
+                pc = (registers[REG_PCH] << 8) + registers[REG_PCL]
+                registers[micro_op[1]] = mem[pc]
+                pc += 1
+                registers[REG_PCH] = pc >> 8
+                registers[REG_PCL] = pc & 0xff
+            elif code == CYCLE:
+                cycles += 1
+            elif code == COPY:
+                registers[micro_op[2]] = registers[micro_op[1]]
+            elif code == FETCH:
+                if direct:
+                    cycles += 1
+                    registers[micro_op[1]] = mem[(registers[REG_ARH] << 8) + registers[REG_ARL]]
+                else:
+                    self.cycles = cycles
+                    registers[micro_op[1]] = self.fetch_byte()
+                    cycles = self.cycles
+            elif code == NZ:
+                flags = ZERO_NEGATIVE[registers[micro_op[1]]]
+                registers[REG_SR] = registers[REG_SR] & 0x7d | (flags & 1) << 1 | (flags & 2) << 6
+            elif code == ALU:
+                self.alu_operation(micro_op[1])
+            elif code == PUT:
+                if direct and not watched[registers[REG_ARH]]:
+                    cycles += 1
+                    mem[(registers[REG_ARH] << 8) + registers[REG_ARL]] = registers[micro_op[1]]
+                else:
+                    self.cycles = cycles
+                    self.put_byte(registers[micro_op[1]])
+                    cycles = self.cycles
+            elif code == CONST:
+                registers[micro_op[2]] = micro_op[1]
+            elif code == STACK_AR:
+                registers[REG_ARH] = 1
+                registers[REG_ARL] = registers[REG_S]
+            elif code == AR_FROM_PC:
+                registers[REG_ARH] = registers[REG_PCH]
+                registers[REG_ARL] = registers[REG_PCL]
+                self.PC += 1
+            elif code == INDEX_ZERO_PAGE:
+                registers[REG_ARL] = (registers[REG_ARL] + registers[micro_op[1]]) & 0xff
+            elif code == INDEX_LOW:
+                address = registers[REG_ARL] + registers[micro_op[1]]
+                registers[REG_ARL] = address & 0xff
+                carry = address >> 8
+                if micro_op[2] or carry:
+                    cycles += 1
+            elif code == ADD_CARRY_HIGH:
+                registers[REG_ARH] = (registers[REG_ARH] + carry) & 0xff
+            elif code == POINTER:
+                address = (registers[REG_ARH] << 8) + registers[REG_ARL]
+                if direct:
+                    cycles += 2
+                    registers[REG_ARL] = mem[address]
+                    registers[REG_ARH] = mem[(address + 1) % 0x10000]
+                else:
+                    self.cycles = cycles
+                    low_byte = self.fetch_byte()
+                    self.AR = (address + 1) % 0x10000
+                    registers[REG_ARH] = self.fetch_byte()
+                    registers[REG_ARL] = low_byte
+                    cycles = self.cycles
+            elif code == INDEX_WORD:
+                low_byte = registers[REG_ARL]
+                self.AR = (((registers[REG_ARH] << 8) + low_byte) + registers[micro_op[1]]) % 0x10000
+                if low_byte + registers[micro_op[1]] > 0xff:
+                    cycles += 1
+            elif code == BRANCH:
+                if bool(registers[REG_SR] & micro_op[1]) == micro_op[2]:
+                    self.cycles = cycles
+                    self.relative()
+                    cycles = self.cycles
+            elif code == SET_FLAG:
+                if micro_op[2]:
+                    registers[REG_SR] |= micro_op[1]
+                else:
+                    registers[REG_SR] &= ~micro_op[1] & 0xff
+            elif code == COPY_CARRY:
+                registers[micro_op[1]] = registers[REG_SR] & 1
+            elif code == FETCH_STATUS:
+                if direct:
+                    cycles += 1
+                    status = mem[(registers[REG_ARH] << 8) + registers[REG_ARL]]
+                else:
+                    self.cycles = cycles
+                    status = self.fetch_byte()
+                    cycles = self.cycles
+                registers[REG_SR] = status & 0xdf | registers[REG_SR] & 0x20
+            elif code == BIT:
+                operand = registers[REG_OP2]
+                registers[REG_SR] = registers[REG_SR] & 0x3d | operand & 0xc0 | (0 if registers[REG_RES] else 2)
+            elif code == JUMP:
+                registers[REG_PCH] = registers[REG_ARH]
+                registers[REG_PCL] = registers[REG_ARL]
+            elif code == ADD_PC:
+                self.PC += micro_op[1]
+            elif code == VECTOR_AR:
+                self.AR = self.interrupt_vector_address + micro_op[1]
+        self.cycles = cycles
@@ -163,7 +163,6 @@ def bcd_addition_with_carry(byte1, byte2, carry_in):
 
 
 def bcd_subtraction_with_borrow(byte1, byte2, borrow_in):
-    print(byte1, byte2, borrow_in)
     result = 0
     borrow = borrow_in
 
@@ -15,12 +15,12 @@
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-import array as ar
 from operator import inv, or_, xor, and_  # noqa
+from typing import MutableSequence, NamedTuple, Optional
 from emulator.opcodes import *
-from emulator.operators import (
-    unsigned_byte_addition, shl, shr, set_bit, cmp, sbb, adc, inc, bcd_addition_with_carry, bcd_subtraction_with_borrow
-)
+from emulator.operators import unsigned_byte_addition, set_bit
+from emulator.alu_tables import ADC, SBC, CMP, SHL, SHR, INC, DEC, ZERO_NEGATIVE
+from emulator.events import EventQueue
 
 
 class UndefinedInstructionError(Exception):
@@ -32,47 +32,358 @@ class Memory:
     def __init__(self, size: int) -> None:
         assert size > 2 ** 12, size <= 2 ** 16
         self.size = size
-        self.data = ar.array('B', [0] * self.size)
+        self.data = bytearray(self.size)
+        # One byte per 256 byte page, set while the page holds code cached in translated form
+        self.code_pages = bytearray(0x100)
+        # One byte per page, set when the page was written since the last snapshot or restore
+        self.written_pages = bytearray(b'\x01' * self.pages)
+        # Page table of the bus: the device handling the accesses to each page, None for RAM
+        self.devices = [None] * 0x100
+        # Set while any page holds a device
+        self.devices_attached = False
+        # Sequence receiving the address of every memory write while not None, see emulator.history
+        self.write_log = None
+        # One byte per page, set while writes to the page take the slow path of Processor.put_byte: pages holding
+        # a device, pages not written since the last snapshot or restore and, while writes are logged, all pages
+        self.watched_pages = bytearray(0x100)
+
+    @property
+    def pages(self) -> int:
+        return (self.size + 0xff) >> 8
 
     def initialise(self) -> None:
-        self.data = ar.array('B', [0] * self.size)
+        self.data = bytearray(self.size)
+        self.code_pages = bytearray(0x100)
+        self.written_pages = bytearray(b'\x01' * self.pages)
+        self.update_watched_pages()
+
+    def update_watched_pages(self) -> None:
+        written = self.written_pages
+        for page in range(0x100):
+            self.watched_pages[page] = (self.write_log is not None or self.devices[page] is not None
+                                        or page < len(written) and not written[page])
+
+    def set_write_log(self, write_log: Optional[MutableSequence[int]]) -> None:
+        self.write_log = write_log
+        self.update_watched_pages()
+
+    def mark_code(self, start: int, end: int) -> None:
+        for page in range(start >> 8, ((end - 1) >> 8) + 1):
+            self.code_pages[page] = 1
+
+    # Report a change of data[start:end] made without the processor, for snapshots
+    def mark_written(self, start: int, end: int) -> None:
+        for page in range(start >> 8, ((end - 1) >> 8) + 1):
+            self.written_pages[page] = 1
+            if self.write_log is None and self.devices[page] is None:
+                self.watched_pages[page] = 0
+
+
+# Byte registers of Processor, in the order of the register file
+REGISTER_NAMES = ('PCH', 'PCL', 'ARH', 'ARL', 'S', 'A', 'X', 'Y', 'SR', 'OP1', 'OP2', 'RES', 'IR')
+(REG_PCH, REG_PCL, REG_ARH, REG_ARL, REG_S, REG_A, REG_X, REG_Y, REG_SR, REG_OP1, REG_OP2, REG_RES,
+ REG_IR) = range(len(REGISTER_NAMES))
+# Ids of the registers the micro steps address: the byte registers by their index in the register
+# file, PC, AR and the carry flag, which have no byte of their own, by the ids following it
+REGISTER_ID_NAMES = REGISTER_NAMES + ('PC', 'AR', 'C')
+REG_PC, REG_AR, REG_C = range(len(REGISTER_NAMES), len(REGISTER_ID_NAMES))
+REGISTER_IDS = {name: register for register, name in enumerate(REGISTER_ID_NAMES)}
 
 
 class Register:
-    def __init__(self, init=0) -> None:
-        self.value = init
+    """View of one byte in a register file."""
+    __slots__ = ('registers', 'index')
+
+    def __init__(self, registers: bytearray, index: int, init=0) -> None:
+        self.registers = registers
+        self.index = index
+        registers[index] = init
+
+    @property
+    def value(self) -> int:
+        return self.registers[self.index]
+
+    @value.setter
+    def value(self, value) -> None:
+        self.registers[self.index] = value
 
     def get_value(self) -> int:
-        return self.value
+        return self.registers[self.index]
 
     def set_value(self, value) -> None:
-        self.value = value
+        self.registers[self.index] = value
+
+
+# Reasons for run to stop
+STOP_MAX_CYCLES = 'max_cycles'
+STOP_MAX_INSTRUCTIONS = 'max_instructions'
+STOP_UNTIL_PC = 'until_pc'
+STOP_BRK = 'brk'
+STOP_BREAKPOINT = 'breakpoint'
+STOP_WATCHPOINT = 'watchpoint'
+
+
+class RunResult(NamedTuple):
+    reason: str
+    cycles: int
+    instructions: int
+
+
+class BreakpointHit(Exception):
+    """Raised before executing an instruction at a breakpoint or after one accessing a watchpoint.
+
+    reason is STOP_BREAKPOINT or STOP_WATCHPOINT, address the breakpoint or the address accessed.
+    """
+    def __init__(self, reason: str, address: int) -> None:
+        super().__init__(f'{reason} at ${address:04X}')
+        self.reason = reason
+        self.address = address
+
+
+class Snapshot(NamedTuple):
+    """Saved processor state, see Processor.snapshot.
+
+    pages holds the memory as one bytes object per 256 byte page; unchanged pages are the same
+    objects in consecutive snapshots.
+    """
+    registers: bytes
+    cycles: int
+    interrupt_requested: bool
+    non_maskable_interrupt_requested: bool
+    pages: tuple
+
+
+# Instruction set: maps each opcode to the name of the Processor method executing it together
+# with the positional arguments (operator, register, address mode, ...) it is called with.
+# Opcodes not listed here are executed as no_operation.
+INSTRUCTION_SET = {
+    # ADC: Add with Carry
+    ADC_IMMEDIATE: ('arithmetic_operation', ('adc', 'immediate')),
+    ADC_ZERO_PAGE: ('arithmetic_operation', ('adc', 'zero_page')),
+    ADC_ZERO_PAGE_X: ('arithmetic_operation', ('adc', 'zero_page_indexed', 'X')),
+    ADC_ABSOLUTE: ('arithmetic_operation', ('adc', 'absolute')),
+    ADC_ABSOLUTE_X: ('arithmetic_operation', ('adc', 'absolute_indexed', 'X')),
+    ADC_ABSOLUTE_Y: ('arithmetic_operation', ('adc', 'absolute_indexed', 'Y')),
+    ADC_INDIRECT_X: ('arithmetic_operation', ('adc', 'indexed_indirect_x')),
+    ADC_INDIRECT_Y: ('arithmetic_operation', ('adc', 'indirect_indexed_y')),
+    # AND instructions
+    AND_IMMEDIATE: ('arithmetic_operation', ('and_', 'immediate')),
+    AND_ZERO_PAGE: ('arithmetic_operation', ('and_', 'zero_page')),
+    AND_ZERO_PAGE_X: ('arithmetic_operation', ('and_', 'zero_page_indexed', 'X')),
+    AND_ABSOLUTE: ('arithmetic_operation', ('and_', 'absolute')),
+    AND_ABSOLUTE_X: ('arithmetic_operation', ('and_', 'absolute_indexed', 'X')),
+    AND_ABSOLUTE_Y: ('arithmetic_operation', ('and_', 'absolute_indexed', 'Y')),
+    AND_INDIRECT_X: ('arithmetic_operation', ('and_', 'indexed_indirect_x')),
+    AND_INDIRECT_Y: ('arithmetic_operation', ('and_', 'indirect_indexed_y')),
+    # Arithmetic shift left
+    ASL_ACCUMULATOR: ('shift_accumulator', (True,)),
+    ASL_ZERO_PAGE: ('shift_memory', ('zero_page', None, True)),
+    ASL_ZERO_PAGE_X: ('shift_memory', ('zero_page_indexed', 'X', True)),
+    ASL_ABSOLUTE: ('shift_memory', ('absolute', None, True)),
+    ASL_ABSOLUTE_X: ('shift_memory', ('absolute_indexed', 'X', True)),
+    # Branch instructions
+    BCC: ('branch', ('C', False)),
+    BCS: ('branch', ('C', True)),
+    BEQ: ('branch', ('Z', True)),
+    BMI: ('branch', ('N', True)),
+    BNE: ('branch', ('Z', False)),
+    BPL: ('branch', ('N', False)),
+    BVC: ('branch', ('V', False)),
+    BVS: ('branch', ('V', True)),
+    BIT_ZERO_PAGE: ('bit_test', ('zero_page',)),
+    BIT_ABSOLUTE: ('bit_test', ('absolute',)),
+    # Break
+    BRK: ('brk', ()),
+    # Clear flag instructions
+    CLC: ('set_flag', ('C', False)),
+    CLD: ('set_flag', ('D', False)),
+    CLI: ('set_flag', ('I', False)),
+    CLV: ('set_flag', ('V', False)),
+    # Compare instructions
+    CMP_IMMEDIATE: ('compare', ('A', 'immediate')),
+    CMP_ZERO_PAGE: ('compare', ('A', 'zero_page')),
+    CMP_ZERO_PAGE_X: ('compare', ('A', 'zero_page_indexed', 'X')),
+    CMP_ABSOLUTE: ('compare', ('A', 'absolute')),
+    CMP_ABSOLUTE_X: ('compare', ('A', 'absolute_indexed', 'X')),
+    CMP_ABSOLUTE_Y: ('compare', ('A', 'absolute_indexed', 'Y')),
+    CMP_INDIRECT_X: ('compare', ('A', 'indexed_indirect_x')),
+    CMP_INDIRECT_Y: ('compare', ('A', 'indirect_indexed_y')),
+    CPX_IMMEDIATE: ('compare', ('X', 'immediate')),
+    CPX_ZERO_PAGE: ('compare', ('X', 'zero_page')),
+    CPX_ABSOLUTE: ('compare', ('X', 'absolute')),
+    CPY_IMMEDIATE: ('compare', ('Y', 'immediate')),
+    CPY_ZERO_PAGE: ('compare', ('Y', 'zero_page')),
+    CPY_ABSOLUTE: ('compare', ('Y', 'absolute')),
+    # DEC instructions
+    DEC_ZERO_PAGE: ('increment', (-1, 'zero_page')),
+    DEC_ZERO_PAGE_X: ('increment', (-1, 'zero_page_indexed', 'X')),
+    DEC_ABSOLUTE: ('increment', (-1, 'absolute')),
+    DEC_ABSOLUTE_X: ('increment', (-1, 'absolute_indexed', 'X')),
+    # Decrement registers X and Y
+    DEX: ('increment_register', (-1, 'X')),
+    DEY: ('increment_register', (-1, 'Y')),
+    # EOR instructions
+    EOR_IMMEDIATE: ('arithmetic_operation', ('xor', 'immediate')),
+    EOR_ZERO_PAGE: ('arithmetic_operation', ('xor', 'zero_page')),
+    EOR_ZERO_PAGE_X: ('arithmetic_operation', ('xor', 'zero_page_indexed', 'X')),
+    EOR_ABSOLUTE: ('arithmetic_operation', ('xor', 'absolute')),
+    EOR_ABSOLUTE_X: ('arithmetic_operation', ('xor', 'absolute_indexed', 'X')),
+    EOR_ABSOLUTE_Y: ('arithmetic_operation', ('xor', 'absolute_indexed', 'Y')),
+    EOR_INDIRECT_X: ('arithmetic_operation', ('xor', 'indexed_indirect_x')),
+    EOR_INDIRECT_Y: ('arithmetic_operation', ('xor', 'indirect_indexed_y')),
+    # INC instructions
+    INC_ZERO_PAGE: ('increment', (1, 'zero_page')),
+    INC_ZERO_PAGE_X: ('increment', (1, 'zero_page_indexed', 'X')),
+    INC_ABSOLUTE: ('increment', (1, 'absolute')),
+    INC_ABSOLUTE_X: ('increment', (1, 'absolute_indexed', 'X')),
+    # Increment registers X and Y
+    INX: ('increment_register', (1, 'X')),
+    INY: ('increment_register', (1, 'Y')),
+    # JMP instructions
+    JMP_ABSOLUTE: ('jump', ('absolute',)),
+    JMP_INDIRECT: ('jump', ('indirect',)),
+    # JSR instruction
+    JSR: ('jump_to_subroutine', ()),
+    # LDA instructions
+    LDA_IMMEDIATE: ('load_register', ('A', 'immediate')),
+    LDA_ZERO_PAGE: ('load_register', ('A', 'zero_page')),
+    LDA_ZERO_PAGE_X: ('load_register', ('A', 'zero_page_indexed', 'X')),
+    LDA_ABSOLUTE: ('load_register', ('A', 'absolute')),
+    LDA_ABSOLUTE_X: ('load_register', ('A', 'absolute_indexed', 'X')),
+    LDA_ABSOLUTE_Y: ('load_register', ('A', 'absolute_indexed', 'Y')),
+    LDA_INDIRECT_X: ('load_register', ('A', 'indexed_indirect_x')),
+    LDA_INDIRECT_Y: ('load_register', ('A', 'indirect_indexed_y')),
+    # LDX instructions
+    LDX_IMMEDIATE: ('load_register', ('X', 'immediate')),
+    LDX_ZERO_PAGE: ('load_register', ('X', 'zero_page')),
+    LDX_ZERO_PAGE_Y: ('load_register', ('X', 'zero_page_indexed', 'Y')),
+    LDX_ABSOLUTE: ('load_register', ('X', 'absolute')),
+    LDX_ABSOLUTE_Y: ('load_register', ('X', 'absolute_indexed', 'Y')),
+    # LDY instructions
+    LDY_IMMEDIATE: ('load_register', ('Y', 'immediate')),
+    LDY_ZERO_PAGE: ('load_register', ('Y', 'zero_page')),
+    LDY_ZERO_PAGE_X: ('load_register', ('Y', 'zero_page_indexed', 'X')),
+    LDY_ABSOLUTE: ('load_register', ('Y', 'absolute')),
+    LDY_ABSOLUTE_X: ('load_register', ('Y', 'absolute_indexed', 'X')),
+    # Logical shift right
+    LSR_ACCUMULATOR: ('shift_accumulator', (False,)),
+    LSR_ZERO_PAGE: ('shift_memory', ('zero_page', None, False)),
+    LSR_ZERO_PAGE_X: ('shift_memory', ('zero_page_indexed', 'X', False)),
+    LSR_ABSOLUTE: ('shift_memory', ('absolute', None, False)),
+    LSR_ABSOLUTE_X: ('shift_memory', ('absolute_indexed', 'X', False)),
+    # NOP instruction
+    NOP: ('no_operation', ()),
+    # ORA instructions
+    ORA_IMMEDIATE: ('arithmetic_operation', ('or_', 'immediate')),
+    ORA_ZERO_PAGE: ('arithmetic_operation', ('or_', 'zero_page')),
+    ORA_ZERO_PAGE_X: ('arithmetic_operation', ('or_', 'zero_page_indexed', 'X')),
+    ORA_ABSOLUTE: ('arithmetic_operation', ('or_', 'absolute')),
+    ORA_ABSOLUTE_X: ('arithmetic_operation', ('or_', 'absolute_indexed', 'X')),
+    ORA_ABSOLUTE_Y: ('arithmetic_operation', ('or_', 'absolute_indexed', 'Y')),
+    ORA_INDIRECT_X: ('arithmetic_operation', ('or_', 'indexed_indirect_x')),
+    ORA_INDIRECT_Y: ('arithmetic_operation', ('or_', 'indirect_indexed_y')),
+    # Push to stack instructions
+    PHA: ('push_register_to_stack', ('A',)),
+    PHP: ('push_register_to_stack', ('SR',)),
+    # Pull from stack instruction
+    PLA: ('pull_register_from_stack', ('A',)),
+    PLP: ('pull_register_from_stack', ('SR',)),
+    # Rotate instructions
+    ROL_ACCUMULATOR: ('rotate_accumulator', (True,)),
+    ROL_ZERO_PAGE: ('rotate_memory', ('zero_page', None, True)),
+    ROL_ZERO_PAGE_X: ('rotate_memory', ('zero_page_indexed', 'X', True)),
+    ROL_ABSOLUTE: ('rotate_memory', ('absolute', None, True)),
+    ROL_ABSOLUTE_X: ('rotate_memory', ('absolute_indexed', 'X', True)),
+    ROR_ACCUMULATOR: ('rotate_accumulator', (False,)),
+    ROR_ZERO_PAGE: ('rotate_memory', ('zero_page', None, False)),
+    ROR_ZERO_PAGE_X: ('rotate_memory', ('zero_page_indexed', 'X', False)),
+    ROR_ABSOLUTE: ('rotate_memory', ('absolute', None, False)),
+    ROR_ABSOLUTE_X: ('rotate_memory', ('absolute_indexed', 'X', False)),
+    # RTI instruction
+    RTI: ('return_from_interrupt', ()),
+    # RTS instruction
+    RTS: ('return_from_subroutine', ()),
+    # SBC instructions
+    SBC_IMMEDIATE: ('arithmetic_operation', ('sbc', 'immediate')),
+    SBC_ZERO_PAGE: ('arithmetic_operation', ('sbc', 'zero_page')),
+    SBC_ZERO_PAGE_X: ('arithmetic_operation', ('sbc', 'zero_page_indexed', 'X')),
+    SBC_ABSOLUTE: ('arithmetic_operation', ('sbc', 'absolute')),
+    SBC_ABSOLUTE_X: ('arithmetic_operation', ('sbc', 'absolute_indexed', 'X')),
+    SBC_ABSOLUTE_Y: ('arithmetic_operation', ('sbc', 'absolute_indexed', 'Y')),
+    SBC_INDIRECT_X: ('arithmetic_operation', ('sbc', 'indexed_indirect_x')),
+    SBC_INDIRECT_Y: ('arithmetic_operation', ('sbc', 'indirect_indexed_y')),
+    # Set flag instructions
+    SEC: ('set_flag', ('C', True)),
+    SED: ('set_flag', ('D', True)),
+    SEI: ('set_flag', ('I', True)),
+    # STA instructions
+    STA_ZERO_PAGE: ('store_register', ('A', 'zero_page')),
+    STA_ZERO_PAGE_X: ('store_register', ('A', 'zero_page_indexed', 'X')),
+    STA_ABSOLUTE: ('store_register', ('A', 'absolute')),
+    STA_ABSOLUTE_X: ('store_register', ('A', 'absolute_indexed', 'X')),
+    STA_ABSOLUTE_Y: ('store_register', ('A', 'absolute_indexed', 'Y')),
+    STA_INDIRECT_X: ('store_register', ('A', 'indexed_indirect_x')),
+    STA_INDIRECT_Y: ('store_register', ('A', 'indirect_indexed_y')),
+    # STX instructions
+    STX_ZERO_PAGE: ('store_register', ('X', 'zero_page')),
+    STX_ZERO_PAGE_Y: ('store_register', ('X', 'zero_page_indexed', 'Y')),
+    STX_ABSOLUTE: ('store_register', ('X', 'absolute')),
+    # STY instructions
+    STY_ZERO_PAGE: ('store_register', ('Y', 'zero_page')),
+    STY_ZERO_PAGE_X: ('store_register', ('Y', 'zero_page_indexed', 'X')),
+    STY_ABSOLUTE: ('store_register', ('Y', 'absolute')),
+    # Transfer register to register instructions
+    TAX: ('transfer_register', ('A', 'X')),
+    TAY: ('transfer_register', ('A', 'Y')),
+    TSX: ('transfer_register', ('S', 'X')),
+    TXA: ('transfer_register', ('X', 'A')),
+    TXS: ('transfer_register', ('X', 'S')),
+    TYA: ('transfer_register', ('Y', 'A')),
+}
+
+# Methods of INSTRUCTION_SET taking the names of flags
+FLAG_METHODS = frozenset(('branch', 'set_flag'))
+
+
+# Return the arguments of method with the register names replaced by their ids, as in the dispatch table
+def dispatch_arguments(method: str, arguments: tuple) -> tuple:
+    if method in FLAG_METHODS:
+        return arguments
+    return tuple(REGISTER_IDS.get(argument, argument) if isinstance(argument, str) else argument
+                 for argument in arguments)
+
+
+DISPATCH_ARGUMENTS = {opcode: dispatch_arguments(method, arguments)
+                      for opcode, (method, arguments) in INSTRUCTION_SET.items()}
 
 
 class Processor:
     def __init__(self, memory_size=2 ** 16) -> None:
         self.memory_size = memory_size
         self.memory = Memory(memory_size)
+        # Register file holding all byte registers, indexed as in REGISTER_NAMES.
+        # A copy of it is a snapshot of the registers.
+        self.registers = bytearray(len(REGISTER_NAMES))
         # Two byte registers containing memory addresses
         # Program counter
-        self.program_counter_high = Register()        # Program counter high byte
-        self.program_counter_low = Register()         # Program counter low byte
+        self.program_counter_high = Register(self.registers, REG_PCH)     # Program counter high byte
+        self.program_counter_low = Register(self.registers, REG_PCL)      # Program counter low byte
         # Virtual address register holding address for next operand
-        self.address_register_high = Register()
-        self.address_register_low = Register()
+        self.address_register_high = Register(self.registers, REG_ARH)
+        self.address_register_low = Register(self.registers, REG_ARL)
         # Registers
         # Stack pointer; stack is top down, starts at 0x01ff
-        self.stack_pointer = Register(init=0xff)
-        self.accumulator = Register()
-        self.index_x = Register()
-        self.index_y = Register()
-        self.status = Register()
+        self.stack_pointer = Register(self.registers, REG_S, init=0xff)
+        self.accumulator = Register(self.registers, REG_A)
+        self.index_x = Register(self.registers, REG_X)
+        self.index_y = Register(self.registers, REG_Y)
+        self.status = Register(self.registers, REG_SR)
         # ALU with two virtual registers holding the operands and one holding the result
-        self.alu_op_1 = Register()
-        self.alu_op_2 = Register()
-        self.alu_res = Register()
+        self.alu_op_1 = Register(self.registers, REG_OP1)
+        self.alu_op_2 = Register(self.registers, REG_OP2)
+        self.alu_res = Register(self.registers, REG_RES)
         # Virtual instruction register
-        self.instruction_register = Register()
+        self.instruction_register = Register(self.registers, REG_IR)
         # Cycle counter
         self.cycles = 0
         self.byte_format = '02X'
@@ -85,36 +396,44 @@ class Processor:
         #
         self.interrupt_requested = False
         self.non_maskable_interrupt_requested = False
+        # Events scheduled by devices, see emulator.events
+        self.events = EventQueue()
+        # Dispatch table indexed by opcode
+        self.dispatch_table = self.build_dispatch_table()
+        # Memory pages of the last snapshot taken or restored, memory differs from them in the written pages
+        self.snapshot_pages = None
+        # Wrappers of methods installed by tools, see emulator.hooks
+        self.hooks = {}
 
     @property
     def PC(self):  # noqa
-        return (self.program_counter_high.value << 8) + self.program_counter_low.value
+        return (self.registers[REG_PCH] << 8) + self.registers[REG_PCL]
 
     @PC.setter
     def PC(self, value):
         assert 0 <= value < 0x10000
-        self.program_counter_high.set_value(value >> 8)
-        self.program_counter_low.set_value(value & 0xff)
+        self.registers[REG_PCH] = value >> 8
+        self.registers[REG_PCL] = value & 0xff
 
     @property
     def PCH(self):
-        return self.program_counter_high.value
+        return self.registers[REG_PCH]
 
     @PCH.setter
     def PCH(self, value):
-        self.program_counter_high.set_value(value)
+        self.registers[REG_PCH] = value
 
     @property
     def PCL(self):
-        return self.program_counter_low.value
+        return self.registers[REG_PCL]
 
     @PCL.setter
     def PCL(self, value):
-        self.program_counter_low.set_value(value)
+        self.registers[REG_PCL] = value
 
     @property
     def AR(self):  # noqa
-        return (self.address_register_high.value << 8) + self.address_register_low.value
+        return (self.registers[REG_ARH] << 8) + self.registers[REG_ARL]
 
     @AR.setter
     def AR(self, value):
@@ -124,63 +443,63 @@ class Processor:
 
     @property
     def ARH(self):
-        return self.address_register_high.value
+        return self.registers[REG_ARH]
 
     @ARH.setter
     def ARH(self, value):
-        self.address_register_high.set_value(value)
+        self.registers[REG_ARH] = value
 
     @property
     def ARL(self):
-        return self.address_register_low.value
+        return self.registers[REG_ARL]
 
     @ARL.setter
     def ARL(self, value):
-        self.address_register_low.set_value(value)
+        self.registers[REG_ARL] = value
 
     @property
     def IR(self):
-        return self.instruction_register.value
+        return self.registers[REG_IR]
 
     @IR.setter
     def IR(self, value):
-        self.instruction_register.set_value(value)
+        self.registers[REG_IR] = value
 
     @property
     def S(self):
-        return self.stack_pointer.value
+        return self.registers[REG_S]
 
     @S.setter
     def S(self, value):
-        self.stack_pointer.set_value(value)
+        self.registers[REG_S] = value
 
     @property
     def A(self):
-        return self.accumulator.value
+        return self.registers[REG_A]
 
     @A.setter
     def A(self, value):
-        self.accumulator.set_value(value)
+        self.registers[REG_A] = value
 
     @property
     def X(self):
-        return self.index_x.value
+        return self.registers[REG_X]
 
     @X.setter
     def X(self, value):
-        self.index_x.set_value(value)
+        self.registers[REG_X] = value
 
     @property
     def Y(self):
-        return self.index_y.value
+        return self.registers[REG_Y]
 
     @Y.setter
     def Y(self, value):
-        self.index_y.set_value(value)
+        self.registers[REG_Y] = value
 
     @property
     def SR(self):
-        return self.status.value
+        return self.registers[REG_SR]
 
     @SR.setter
     def SR(self, value):
@@ -194,83 +513,93 @@ class Processor:
 
     @property
     def C(self):
-        return self.status.value & 1
+        return self.registers[REG_SR] & 1
 
     @C.setter
     def C(self, value):
-        self.status.value = set_bit(self.status.value, 0, value)
+        self.registers[REG_SR] = set_bit(self.registers[REG_SR], 0, value)
 
     @property
     def Z(self):
-        return (self.status.value >> 1) & 1
+        return (self.registers[REG_SR] >> 1) & 1
 
     @Z.setter
     def Z(self, value):
-        self.status.value = set_bit(self.status.value, 1, value)
+        self.registers[REG_SR] = set_bit(self.registers[REG_SR], 1, value)
 
     @property
     def I(self): # noqa e741
-        return (self.status.value >> 2) & 1
+        return (self.registers[REG_SR] >> 2) & 1
 
     @I.setter
     def I(self, value): # noqa 8
-        self.status.value = set_bit(self.status.value, 2, value)
+        self.registers[REG_SR] = set_bit(self.registers[REG_SR], 2, value)
 
     @property
     def D(self):
-        return (self.status.value >> 3) & 1
+        return (self.registers[REG_SR] >> 3) & 1
 
     @D.setter
     def D(self, value):
-        self.status.value = set_bit(self.status.value, 3, value)
+        self.registers[REG_SR] = set_bit(self.registers[REG_SR], 3, value)
 
     @property
     def B(self):
-        return (self.status.value >> 4) & 1
+        return (self.registers[REG_SR] >> 4) & 1
 
     @B.setter
     def B(self, value):
-        self.status.value = set_bit(self.status.value, 4, value)
+        self.registers[REG_SR] = set_bit(self.registers[REG_SR], 4, value)
 
     @property
     def V(self):
-        return (self.status.value >> 6) & 1
+        return (self.registers[REG_SR] >> 6) & 1
 
     @V.setter
     def V(self, value):
-        self.status.value = set_bit(self.status.value, 6, value)
+        self.registers[REG_SR] = set_bit(self.registers[REG_SR], 6, value)
 
     @property
     def N(self):
-        return (self.status.value >> 7) & 1
+        return (self.registers[REG_SR] >> 7) & 1
 
     @N.setter
     def N(self, value):
-        self.status.value = set_bit(self.status.value, 7, value)
+        self.registers[REG_SR] = set_bit(self.registers[REG_SR], 7, value)
 
     @property
     def OP1(self):
-        return self.alu_op_1.value
+        return self.registers[REG_OP1]
 
     @OP1.setter
     def OP1(self, value):
-        self.alu_op_1.set_value(value)
+        self.registers[REG_OP1] = value
 
     @property
     def OP2(self):
-        return self.alu_op_2.value
+        return self.registers[REG_OP2]
 
     @OP2.setter
     def OP2(self, value):
-        self.alu_op_2.set_value(value)
+        self.registers[REG_OP2] = value
 
     @property
     def RES(self):
-        return self.alu_res.value
+        return self.registers[REG_RES]
 
     @RES.setter
     def RES(self, value):
-        self.alu_res.set_value(value)
+        self.registers[REG_RES] = value
+
+    # Bind the handlers of INSTRUCTION_SET to this instance. Methods are looked up on the instance,
+    # so handlers overridden in subclasses (e.g. ProcessorVisualization) end up in the table.
+    # Registers are passed to the handlers by id.
+    def build_dispatch_table(self) -> list:
+        no_operation = (self.no_operation, ())
+        table = [no_operation] * 0x100
+        for opcode, (method, _) in INSTRUCTION_SET.items():
+            table[opcode] = (getattr(self, method), DISPATCH_ARGUMENTS[opcode])
+        return table
 
     def word(self, address: int) -> int:
         return self.memory.data[address] + (self.memory.data[address + 1] << 8)
@@ -287,24 +616,85 @@ class Processor:
     def clear_memory(self) -> None:
         self.memory.initialise()
 
+    # Snapshots are copy-on-write on page level: only the pages written since the last snapshot or
+    # restore are copied, all others are shared with it. Memory changed from outside the processor
+    # must be reported with Memory.mark_written.
+    def snapshot(self) -> Snapshot:
+        memory = self.memory
+        written = memory.written_pages
+        page = written.find(1)
+        if page >= 0 or self.snapshot_pages is None:
+            pages = [None] * memory.pages if self.snapshot_pages is None else list(self.snapshot_pages)
+            data = memory.data
+            while page >= 0:
+                pages[page] = bytes(data[page << 8:(page + 1) << 8])
+                page = written.find(1, page + 1)
+            self.snapshot_pages = tuple(pages)
+            written[:] = bytes(len(written))
+            memory.update_watched_pages()
+        return Snapshot(bytes(self.registers), self.cycles, self.interrupt_requested,
+                        self.non_maskable_interrupt_requested, self.snapshot_pages)
+
+    # Copy back the pages written since the last snapshot or restore, and those differing between it and snapshot
+    def restore(self, snapshot: Snapshot) -> None:
+        memory = self.memory
+        written = memory.written_pages
+        data = memory.data
+        pages = snapshot.pages
+        if self.snapshot_pages is None:
+            written[:] = b'\x01' * len(written)
+        elif self.snapshot_pages is not pages:
+            for page, (current, restored) in enumerate(zip(self.snapshot_pages, pages)):
+                if current is not restored:
+                    written[page] = 1
+        page = written.find(1)
+        while page >= 0:
+            data[page << 8:(page + 1) << 8] = pages[page]
+            page = written.find(1, page + 1)
+        written[:] = bytes(len(written))
+        memory.update_watched_pages()
+        self.snapshot_pages = pages
+        self.registers[:] = snapshot.registers
+        self.cycles = snapshot.cycles
+        self.interrupt_requested = snapshot.interrupt_requested
+        self.non_maskable_interrupt_requested = snapshot.non_maskable_interrupt_requested
+
     def cycle(self) -> None:
         self.cycles += 1
 
     # Atomic operations
-    def copy_byte(self, from_register: str, to_register: str) -> None:
-        setattr(self, to_register, getattr(self, from_register))
+    # Registers are given by id (see REGISTER_IDS). Byte registers are read and written in the
+    # register file, except that SR is written through its property, which keeps bit 5 clear, as
+    # are PC, AR and C.
+    def copy_byte(self, source: int, destination: int) -> None:
+        registers = self.registers
+        if source < REG_PC and destination < REG_PC and destination != REG_SR:
+            registers[destination] = registers[source]
+        else:
+            value = registers[source] if source < REG_PC else getattr(self, REGISTER_ID_NAMES[source])
+            setattr(self, REGISTER_ID_NAMES[destination], value)
 
-    def copy_constant(self, value: int, register: str):
-        setattr(self, register, value)
+    def copy_constant(self, value: int, register: int):
+        if register < REG_PC and register != REG_SR:
+            self.registers[register] = value
+        else:
+            setattr(self, REGISTER_ID_NAMES[register], value)
 
     # Fetch byte from address register, consumes one cycle
     def fetch_byte(self) -> int:
         self.cycle()
-        return self.memory.data[self.AR]
+        address = self.AR
+        device = self.memory.devices[address >> 8]
+        if device is None:
+            return self.memory.data[address]
+        return device.read(address)
 
-    def fetch_byte_to_register(self, register: str) -> None:
+    def fetch_byte_to_register(self, register: int) -> None:
         byte = self.fetch_byte()
-        setattr(self, register, byte)
+        if register < REG_PC and register != REG_SR:
+            self.registers[register] = byte
+        else:
+            setattr(self, REGISTER_ID_NAMES[register], byte)
 
     # Fetches byte in memory location PC, consumes one cycle, increments PC
     def fetch_byte_at_pc(self) -> int:
@@ -313,60 +703,84 @@ class Processor:
         self.PC += 1
         return byte
 
-    def fetch_byte_at_pc_to_register(self, register: str) -> None:
+    def fetch_byte_at_pc_to_register(self, register: int) -> None:
         byte = self.fetch_byte_at_pc()
-        setattr(self, register, byte)
+        if register < REG_PC and register != REG_SR:
+            self.registers[register] = byte
+        else:
+            setattr(self, REGISTER_ID_NAMES[register], byte)
 
     # Write value to address, consumes one cycle
     def put_byte(self, byte: int) -> None:
         self.cycle()
-        self.memory.data[self.AR] = byte
+        address = self.AR
+        if self.memory.watched_pages[address >> 8]:
+            self.put_watched_byte(address, byte)
+        else:
+            self.memory.data[address] = byte
+
+    # Write to a page of Memory.watched_pages: to a device, or marking the page written and logging the write
+    def put_watched_byte(self, address: int, byte: int) -> None:
+        memory = self.memory
+        page = address >> 8
+        device = memory.devices[page]
+        if device is not None:
+            device.write(address, byte)
+            return
+        memory.data[address] = byte
+        memory.written_pages[page] = 1
+        if memory.write_log is None:
+            memory.watched_pages[page] = 0
+        else:
+            memory.write_log.append(address)
 
-    def put_byte_from_register(self, register: str) -> None:
-        self.put_byte(self.__getattribute__(register))
+    def put_byte_from_register(self, register: int) -> None:
+        self.put_byte(self.registers[register] if register < REG_PC else getattr(self, REGISTER_ID_NAMES[register]))
 
     # Set Z and N flags according to value in register (default: RES, i.e. result of ALU)
-    def set_zero_and_negative_status_flags(self, register: str = 'RES') -> None:
-        value = self.__getattribute__(register)
-        self.Z = int(value == 0)
-        self.N = int(value >= 128)
+    def set_zero_and_negative_status_flags(self, register: int = REG_RES) -> None:
+        flags = ZERO_NEGATIVE[self.registers[register]]
+        self.Z = flags & 1
+        self.N = flags >> 1
 
-    # ALU
+    # ALU, every operation is a lookup in the tables of alu_tables
     def alu_operation(self, operator):
         if operator == 'adc':
-            if self.D:
-                self.RES, self.C = bcd_addition_with_carry(self.OP1, self.OP2, self.C)
-            self.RES, self.C, self.V = adc(self.OP1, self.OP2, self.C)
+            result = ADC[self.D << 17 | self.C << 16 | self.OP1 << 8 | self.OP2]
+            self.RES, self.C, self.V = result & 0xff, (result >> 8) & 1, result >> 9
         elif operator == 'sbc':
-            if self.D:
-                print(self.OP1, self.OP2, self.C)
-                self.RES, self.C = bcd_subtraction_with_borrow(self.OP1, self.OP2, 1-self.C)
-            self.RES, self.C, self.V = sbb(self.OP1, self.OP2, 1 - self.C)
+            result = SBC[self.D << 17 | (1 - self.C) << 16 | self.OP1 << 8 | self.OP2]
+            self.RES, self.C, self.V = result & 0xff, (result >> 8) & 1, result >> 9
         elif operator == 'cmp':
-            self.Z, self.C, self.N = cmp(self.OP1, self.OP2)
+            flags = CMP[self.OP1 << 8 | self.OP2]
+            self.Z, self.C, self.N = flags & 1, (flags >> 1) & 1, flags >> 2
         elif operator == 'shl':
-            self.RES, self.C = shl(self.OP1, 0)
+            result = SHL[self.OP1]
+            self.RES, self.C = result & 0xff, result >> 8
         elif operator == 'shr':
-            self.RES, self.C = shr(self.OP1, 0)
+            result = SHR[self.OP1]
+            self.RES, self.C = result & 0xff, result >> 8
         elif operator == 'rol':
-            self.RES, self.C = shl(self.OP1, self.OP2)
+            result = SHL[self.OP2 << 8 | self.OP1]
+            self.RES, self.C = result & 0xff, result >> 8
         elif operator == 'ror':
-            self.RES, self.C = shr(self.OP1, self.OP2)
+            result = SHR[self.OP2 << 8 | self.OP1]
+            self.RES, self.C = result & 0xff, result >> 8
         elif operator == 'inc':
-            self.RES = inc(self.OP1, 1)
+            self.RES = INC[self.OP1]
         elif operator == 'dec':
-            self.RES = inc(self.OP1, -1)
+            self.RES = DEC[self.OP1]
         else:
             self.RES = globals()[operator](self.OP1, self.OP2)
 
     # Stack operations
     def add_to_stack_pointer(self, increment: int) -> None:
-        self.copy_byte('S', 'OP1')
+        self.copy_byte(REG_S, REG_OP1)
         if increment == 1:
             self.alu_operation('inc')
         elif increment == -1:
             self.alu_operation('dec')
-        self.copy_byte('RES', 'S')
+        self.copy_byte(REG_RES, REG_S)
         # self.S = (self.S + increment) % 0x100
         # self.cycle()
 
@@ -374,91 +788,91 @@ class Processor:
         self.AR = 0x100 + self.S
 
     # Push register to stack
-    def push_register(self, register: str) -> None:
+    def push_register(self, register: int) -> None:
         self.set_address_register_from_stack_pointer()
         self.put_byte_from_register(register)
         self.add_to_stack_pointer(-1)
 
-    def pull_register(self, register: str) -> None:
+    def pull_register(self, register: int) -> None:
         self.add_to_stack_pointer(1)
         self.set_address_register_from_stack_pointer()
         self.fetch_byte_to_register(register)
 
     # Address modes to be called by name
     def immediate(self):
-        self.copy_byte('PC', 'AR')
+        self.copy_byte(REG_PC, REG_AR)
         self.PC += 1
 
     def zero_page(self):
-        self.fetch_byte_at_pc_to_register('AR')
+        self.fetch_byte_at_pc_to_register(REG_AR)
 
     def zero_page_indexed(self, register, penalty_cycle=False):  # noqa
         self.cycle()
-        self.fetch_byte_at_pc_to_register('AR')
-        self.AR = unsigned_byte_addition(self.AR, self.__getattribute__(register))
+        self.fetch_byte_at_pc_to_register(REG_AR)
+        self.AR = unsigned_byte_addition(self.AR, self.registers[register])
 
     def absolute(self):
-        self.fetch_byte_at_pc_to_register('ARL')
-        self.fetch_byte_at_pc_to_register('ARH')
+        self.fetch_byte_at_pc_to_register(REG_ARL)
+        self.fetch_byte_at_pc_to_register(REG_ARH)
 
     def absolute_indexed(self, register, penalty_cycle=False) -> None:
-        self.fetch_byte_at_pc_to_register('ARL')
-        address = self.ARL + self.__getattribute__(register)
+        self.fetch_byte_at_pc_to_register(REG_ARL)
+        address = self.ARL + self.registers[register]
         self.ARL = address % 0x100
         if penalty_cycle or address > 0xff:
             self.cycle()
-        self.fetch_byte_at_pc_to_register('ARH')
-        self.ARH = (self.ARH + address // 0x100) % 0x10000
+        self.fetch_byte_at_pc_to_register(REG_ARH)
+        self.ARH = (self.ARH + address // 0x100) % 0x100
 
     def indexed_indirect_x(self) -> None:
-        self.fetch_byte_at_pc_to_register('AR')
+        self.fetch_byte_at_pc_to_register(REG_AR)
         index = (self.AR + self.X) % 0x100
         self.cycle()
         self.AR = index
-        self.fetch_byte_to_register('AR')
+        self.fetch_byte_to_register(REG_AR)
         low_byte = self.AR
         self.AR = index+1
-        self.fetch_byte_to_register('AR')
+        self.fetch_byte_to_register(REG_AR)
         self.AR = (self.AR << 8) + low_byte
 
     def indirect_indexed_y(self) -> None:
-        self.fetch_byte_at_pc_to_register('AR')
+        self.fetch_byte_at_pc_to_register(REG_AR)
         index = self.AR
-        self.fetch_byte_to_register('AR')
+        self.fetch_byte_to_register(REG_AR)
         low_byte = self.AR
         self.AR = index + 1
-        self.fetch_byte_to_register('AR')
+        self.fetch_byte_to_register(REG_AR)
         self.AR = ((self.AR << 8) + low_byte + self.Y) % 0x10000
         if (low_byte+self.Y) > 0xff:
             self.cycle()
 
     def indirect(self) -> None:
-        self.fetch_byte_at_pc_to_register('ARL')
-        self.fetch_byte_at_pc_to_register('ARH')
+        self.fetch_byte_at_pc_to_register(REG_ARL)
+        self.fetch_byte_at_pc_to_register(REG_ARH)
         index = (self.ARH << 8) + self.ARL
-        self.fetch_byte_to_register('AR')
+        self.fetch_byte_to_register(REG_AR)
         low_byte = self.AR
         self.AR = (index + 1) % 0x10000
-        self.fetch_byte_to_register('AR')
+        self.fetch_byte_to_register(REG_AR)
         self.AR = (self.AR << 8) + low_byte
 
     def relative(self) -> None:
-        self.copy_byte('PCL', 'OP2')
-        # Save flags c and v and prepare for addition
-        c, v = self.C, self.V
-        self.C = self.V = 0
+        self.copy_byte(REG_PCL, REG_OP2)
+        # Save flags c, v and d and prepare for binary addition
+        c, v, d = self.C, self.V, self.D
+        self.C = self.V = self.D = 0
         self.alu_operation('adc')
-        self.copy_byte('RES', 'PCL')
+        self.copy_byte(REG_RES, REG_PCL)
         self.cycle()
         if self.C and self.OP1 < 0x80:
-            self.PCH += 1
+            self.PCH = (self.PCH + 1) % 0x100
             self.cycle()
         if not self.C and self.OP1 >= 0x80:
-            self.PCH -= 1
+            self.PCH = (self.PCH - 1) % 0x100
             self.cycle()
-        self.C, self.V = c, v
+        self.C, self.V, self.D = c, v, d
 
-    def get_address(self, mode: str, index_register: str = None, penalty_cycle=False) -> None:
+    def get_address(self, mode: str, index_register: int = None, penalty_cycle=False) -> None:
         if index_register is None:
             getattr(self, mode)()
         else:
@@ -466,43 +880,43 @@ class Processor:
 
     # Processor instruction by type
     # Load value from memory to register, using mode with index_register
-    def load_register(self, register: str, mode: str, index_register: str = None) -> None:
+    def load_register(self, register: int, mode: str, index_register: int = None) -> None:
         self.get_address(mode, index_register)
         self.fetch_byte_to_register(register)
         self.set_zero_and_negative_status_flags(register)
 
     # Store value from register to memory, using mode with index_register
-    def store_register(self, register: str, mode: str, index_register: str = None) -> None:
+    def store_register(self, register: int, mode: str, index_register: int = None) -> None:
         self.get_address(mode, index_register, penalty_cycle=True)
         self.put_byte_from_register(register)
 
     # Transfer value from register source to register destination
-    def transfer_register(self, source: str, destination: str) -> None:
+    def transfer_register(self, source: int, destination: int) -> None:
         self.copy_byte(source, destination)
         self.cycle()
         self.set_zero_and_negative_status_flags(destination)
 
     # Bitwise arithmetic or logical operation with accumulator and memory location:
     # ADC, SBC, AND, EOR, XOR
-    def arithmetic_operation(self, operator: str, mode: str, index_register: str = None) -> None:
-        self.copy_byte('A', 'OP1')
+    def arithmetic_operation(self, operator: str, mode: str, index_register: int = None) -> None:
+        self.copy_byte(REG_A, REG_OP1)
         self.get_address(mode, index_register)
-        self.fetch_byte_to_register('OP2')
+        self.fetch_byte_to_register(REG_OP2)
         self.alu_operation(operator)
-        self.copy_byte('RES', 'A')
+        self.copy_byte(REG_RES, REG_A)
         self.set_zero_and_negative_status_flags()
 
     # Compare register with memory location
-    def compare(self, register: str, mode: str, index_register: str = None) -> None:
-        self.copy_byte(register, 'OP1')
+    def compare(self, register: int, mode: str, index_register: int = None) -> None:
+        self.copy_byte(register, REG_OP1)
         self.get_address(mode, index_register)
-        self.fetch_byte_to_register('OP2')
+        self.fetch_byte_to_register(REG_OP2)
         self.alu_operation('cmp')
 
-    def bit_test(self, mode: str, index_register: str=None) -> None:  # noqa
-        self.copy_byte('A', 'OP1')
+    def bit_test(self, mode: str, index_register: int=None) -> None:  # noqa
+        self.copy_byte(REG_A, REG_OP1)
         self.get_address(mode, index_register)
-        self.fetch_byte_to_register('OP2')
+        self.fetch_byte_to_register(REG_OP2)
         self.alu_operation('and_')
         self.N = (self.OP2 & 0b10000000) >> 7
         self.V = (self.OP2 & 0b01000000) >> 6
@@ -510,64 +924,64 @@ class Processor:
 
     # Shift and rotate
     def shift_accumulator(self, left: bool = True) -> None:
-        self.copy_byte('A', 'OP1')
-        self.copy_constant(0, 'OP2')
+        self.copy_byte(REG_A, REG_OP1)
+        self.copy_constant(0, REG_OP2)
         self.alu_operation('shl' if left else 'shr')
-        self.copy_byte('RES', 'A')
+        self.copy_byte(REG_RES, REG_A)
         self.cycle()
         self.set_zero_and_negative_status_flags()
 
     def shift_memory(self, mode: str, index_register=None, left: bool = True) -> None:
         self.get_address(mode, index_register, penalty_cycle=True)
-        self.fetch_byte_to_register('OP1')
-        self.copy_constant(0, 'OP2')
+        self.fetch_byte_to_register(REG_OP1)
+        self.copy_constant(0, REG_OP2)
         self.alu_operation('shl' if left else 'shr')
-        self.put_byte_from_register('RES')
+        self.put_byte_from_register(REG_RES)
         self.cycle()
         self.set_zero_and_negative_status_flags()
 
     def rotate_accumulator(self, left: bool = True) -> None:
-        self.copy_byte('A', 'OP1')
-        self.copy_byte('C', 'OP2')
+        self.copy_byte(REG_A, REG_OP1)
+        self.copy_byte(REG_C, REG_OP2)
         self.alu_operation('rol' if left else 'ror')
-        self.copy_byte('RES', 'A')
+        self.copy_byte(REG_RES, REG_A)
         self.cycle()
         self.set_zero_and_negative_status_flags()
 
     def rotate_memory(self, mode: str, index_register=None, left: bool = True) -> None:
         self.get_address(mode, index_register, penalty_cycle=True)
-        self.fetch_byte_to_register('OP1')
-        self.copy_byte('C', 'OP2')
+        self.fetch_byte_to_register(REG_OP1)
+        self.copy_byte(REG_C, REG_OP2)
         self.alu_operation('rol' if left else 'ror')
-        self.put_byte_from_register('RES')
+        self.put_byte_from_register(REG_RES)
         self.cycle()
         self.set_zero_and_negative_status_flags()
 
-    def increment_register(self, increment: int, register: str) -> None:
-        self.copy_byte(register, 'OP1')
+    def increment_register(self, increment: int, register: int) -> None:
+        self.copy_byte(register, REG_OP1)
         if increment == 1:
             self.alu_operation('inc')
         elif increment == -1:
             self.alu_operation('dec')
-        self.copy_byte('RES', register)
+        self.copy_byte(REG_RES, register)
         self.cycle()
         self.set_zero_and_negative_status_flags()
 
     # Increment and decrement memory
-    def increment(self, increment: int, mode: str, index_register: str = None) -> None:
+    def increment(self, increment: int, mode: str, index_register: int = None) -> None:
         self.get_address(mode, index_register, penalty_cycle=True)
-        self.fetch_byte_to_register('OP1')
+        self.fetch_byte_to_register(REG_OP1)
         if increment == 1:
             self.alu_operation('inc')
         elif increment == -1:
             self.alu_operation('dec')
-        self.put_byte_from_register('RES')
+        self.put_byte_from_register(REG_RES)
         self.cycle()
         self.set_zero_and_negative_status_flags()
 
     # Branch if flag has given state
     def branch(self, flag: str, state: bool) -> None:
-        self.fetch_byte_at_pc_to_register('OP1')
+        self.fetch_byte_at_pc_to_register(REG_OP1)
         if getattr(self, flag) == state:
             self.get_address('relative')
 
@@ -579,11 +993,11 @@ class Processor:
     # Stack operations
     # Push register to stack
 
-    def push_register_to_stack(self, register: str) -> None:
+    def push_register_to_stack(self, register: int) -> None:
         self.push_register(register)
         self.cycle()
 
-    def pull_register_from_stack(self, register: str) -> None:
+    def pull_register_from_stack(self, register: int) -> None:
         self.pull_register(register)
         self.cycle()
         self.cycle()
@@ -596,16 +1010,16 @@ class Processor:
 
     def jump_to_subroutine(self):
         self.PC += 1
-        self.push_register('PCH')
-        self.push_register('PCL')
+        self.push_register(REG_PCH)
+        self.push_register(REG_PCL)
         self.PC -= 1
         self.cycle()
         self.jump('absolute')
 
     def return_from_subroutine(self):
-        self.pull_register('PCL')
+        self.pull_register(REG_PCL)
         self.cycle()
-        self.pull_register('PCH')
+        self.pull_register(REG_PCH)
         self.cycle()
         self.PC += 1
         self.cycle()
@@ -615,19 +1029,19 @@ class Processor:
         # Break instruction has one extra cycle (actually reading the following byte and ignoring it)
         self.cycle()
         self.PC = self.PC + 1
-        self.push_register('PCH')
-        self.push_register('PCL')
+        self.push_register(REG_PCH)
+        self.push_register(REG_PCL)
         self.B = 1
-        self.push_register('SR')
+        self.push_register(REG_SR)
         self.AR = self.interrupt_vector_address
-        self.fetch_byte_to_register('PCL')
+        self.fetch_byte_to_register(REG_PCL)
         self.AR = self.interrupt_vector_address + 1
-        self.fetch_byte_to_register('PCH')
+        self.fetch_byte_to_register(REG_PCH)
 
     def return_from_interrupt(self):
-        self.pull_register('SR')
-        self.pull_register('PCL')
-        self.pull_register('PCH')
+        self.pull_register(REG_SR)
+        self.pull_register(REG_PCL)
+        self.pull_register(REG_PCH)
         self.B = 0
         self.cycle()
         self.cycle()
@@ -638,375 +1052,83 @@ class Processor:
     def interrupt(self):
         if self.I:
             return
-        self.push_register('PCH')
-        self.push_register('PCL')
-        self.push_register('SR')
+        self.push_register(REG_PCH)
+        self.push_register(REG_PCL)
+        self.push_register(REG_SR)
+        # Masked until the handler returns or clears I, as the IRQ line may still be held
+        self.I = 1
         self.AR = self.interrupt_vector_address
-        self.fetch_byte_to_register('PCL')
+        self.fetch_byte_to_register(REG_PCL)
         self.AR = self.interrupt_vector_address + 1
-        self.fetch_byte_to_register('PCH')
+        self.fetch_byte_to_register(REG_PCH)
 
     def non_maskable_interrupt(self):
-        self.push_register('PCH')
-        self.push_register('PCL')
-        self.push_register('SR')
+        self.push_register(REG_PCH)
+        self.push_register(REG_PCL)
+        self.push_register(REG_SR)
+        self.I = 1
         self.AR = self.nmi_vector_address
-        self.fetch_byte_to_register('PCL')
+        self.fetch_byte_to_register(REG_PCL)
         self.AR = self.nmi_vector_address + 1
-        self.fetch_byte_to_register('PCH')
+        self.fetch_byte_to_register(REG_PCH)
 
     def fetch_instruction(self) -> None:
-        self.fetch_byte_at_pc_to_register('IR')
+        self.fetch_byte_at_pc_to_register(REG_IR)
 
     # Run instruction at PC
     def run_instruction(self) -> None:
+        if self.cycles >= self.events.next_cycle:
+            self.events.run_due(self.cycles)
+        # A maskable request stays pending while I is set
         if self.interrupt_requested and not self.I:
             self.interrupt()
+            self.interrupt_requested = False
         if self.non_maskable_interrupt_requested:
             self.non_maskable_interrupt()
-        self.interrupt_requested = False
-        self.non_maskable_interrupt_requested = False
+            self.non_maskable_interrupt_requested = False
         self.fetch_instruction()
         self.decode_instruction()
 
     def decode_instruction(self) -> None:
-        # ADC: Add with Carry
-        if self.IR == ADC_IMMEDIATE:
-            self.arithmetic_operation('adc', 'immediate')
-        elif self.IR == ADC_ZERO_PAGE:
-            self.arithmetic_operation('adc', 'zero_page')
-        elif self.IR == ADC_ZERO_PAGE_X:
-            self.arithmetic_operation('adc', 'zero_page_indexed', 'X')
-        elif self.IR == ADC_ABSOLUTE:
-            self.arithmetic_operation('adc', 'absolute')
-        elif self.IR == ADC_ABSOLUTE_X:
-            self.arithmetic_operation('adc', 'absolute_indexed', 'X')
-        elif self.IR == ADC_ABSOLUTE_Y:
-            self.arithmetic_operation('adc', 'absolute_indexed', 'Y')
-        elif self.IR == ADC_INDIRECT_X:
-            self.arithmetic_operation('adc', 'indexed_indirect_x')
-        elif self.IR == ADC_INDIRECT_Y:
-            self.arithmetic_operation('adc', 'indirect_indexed_y')
-        # AND instructions
-        elif self.IR == AND_IMMEDIATE:
-            self.arithmetic_operation('and_', 'immediate')
-        elif self.IR == AND_ZERO_PAGE:
-            self.arithmetic_operation('and_', 'zero_page')
-        elif self.IR == AND_ZERO_PAGE_X:
-            self.arithmetic_operation('and_', 'zero_page_indexed', 'X')
-        elif self.IR == AND_ABSOLUTE:
-            self.arithmetic_operation('and_', 'absolute')
-        elif self.IR == AND_ABSOLUTE_X:
-            self.arithmetic_operation('and_', 'absolute_indexed', 'X')
-        elif self.IR == AND_ABSOLUTE_Y:
-            self.arithmetic_operation('and_', 'absolute_indexed', 'Y')
-        elif self.IR == AND_INDIRECT_X:
-            self.arithmetic_operation('and_', 'indexed_indirect_x')
-        elif self.IR == AND_INDIRECT_Y:
-            self.arithmetic_operation('and_', 'indirect_indexed_y')
-        # Arithmetic shift left
-        elif self.IR == ASL_ACCUMULATOR:
-            self.shift_accumulator(left=True)
-        elif self.IR == ASL_ZERO_PAGE:
-            self.shift_memory(left=True, mode='zero_page')
-        elif self.IR == ASL_ZERO_PAGE_X:
-            self.shift_memory(left=True, mode='zero_page_indexed', index_register='X')
-        elif self.IR == ASL_ABSOLUTE:
-            self.shift_memory(left=True, mode='absolute')
-        elif self.IR == ASL_ABSOLUTE_X:
-            self.shift_memory(left=True, mode='absolute_indexed', index_register='X')
-        # Branch instructions
-        elif self.IR == BCC:
-            self.branch('C', False)
-        elif self.IR == BCS:
-            self.branch('C', True)
-        elif self.IR == BEQ:
-            self.branch('Z', True)
-        elif self.IR == BMI:
-            self.branch('N', True)
-        elif self.IR == BNE:
-            self.branch('Z', False)
-        elif self.IR == BPL:
-            self.branch('N', False)
-        elif self.IR == BVC:
-            self.branch('V', False)
-        elif self.IR == BVS:
-            self.branch('V', True)
-        elif self.IR == BIT_ZERO_PAGE:
-            self.bit_test(mode='zero_page')
-        elif self.IR == BIT_ABSOLUTE:
-            self.bit_test(mode='absolute')
-        # Break
-        elif self.IR == BRK:
-            self.brk()
-        # Clear flag instructions
-        elif self.IR == CLC:
-            self.set_flag(flag='C', state=False)
-        elif self.IR == CLD:
-            self.set_flag(flag='D', state=False)
-        elif self.IR == CLI:
-            self.set_flag(flag='I', state=False)
-        elif self.IR == CLV:
-            self.set_flag(flag='V', state=False)
-        # Compare instructions
-        elif self.IR == CMP_IMMEDIATE:
-            self.compare('A', 'immediate')
-        elif self.IR == CMP_ZERO_PAGE:
-            self.compare('A', 'zero_page')
-        elif self.IR == CMP_ZERO_PAGE_X:
-            self.compare('A', 'zero_page_indexed', 'X')
-        elif self.IR == CMP_ABSOLUTE:
-            self.compare('A', 'absolute')
-        elif self.IR == CMP_ABSOLUTE_X:
-            self.compare('A', 'absolute_indexed', 'X')
-        elif self.IR == CMP_ABSOLUTE_Y:
-            self.compare('A', 'absolute_indexed', 'Y')
-        elif self.IR == CMP_INDIRECT_X:
-            self.compare('A', 'indexed_indirect_x')
-        elif self.IR == CMP_INDIRECT_Y:
-            self.compare('A', 'indirect_indexed_y')
-        elif self.IR == CPX_IMMEDIATE:
-            self.compare('X', 'immediate')
-        elif self.IR == CPX_ZERO_PAGE:
-            self.compare('X', 'zero_page')
-        elif self.IR == CPX_ABSOLUTE:
-            self.compare('X', 'absolute')
-        elif self.IR == CPY_IMMEDIATE:
-            self.compare('Y', 'immediate')
-        elif self.IR == CPY_ZERO_PAGE:
-            self.compare('Y', 'zero_page')
-        elif self.IR == CPY_ABSOLUTE:
-            self.compare('Y', 'absolute')
-        # DEC instructions
-        elif self.IR == DEC_ZERO_PAGE:
-            self.increment(-1, 'zero_page')
-        elif self.IR == DEC_ZERO_PAGE_X:
-            self.increment(-1, 'zero_page_indexed', 'X')
-        elif self.IR == DEC_ABSOLUTE:
-            self.increment(-1, 'absolute')
-        elif self.IR == DEC_ABSOLUTE_X:
-            self.increment(-1, 'absolute_indexed', 'X')
-        # Decrement registers X and Y
-        elif self.IR == DEX:
-            self.increment_register(-1, 'X')
-        elif self.IR == DEY:
-            self.increment_register(-1, 'Y')
-        # EOR instructions
-        elif self.IR == EOR_IMMEDIATE:
-            self.arithmetic_operation('xor', 'immediate')
-        elif self.IR == EOR_ZERO_PAGE:
-            self.arithmetic_operation('xor', 'zero_page')
-        elif self.IR == EOR_ZERO_PAGE_X:
-            self.arithmetic_operation('xor', 'zero_page_indexed', 'X')
-        elif self.IR == EOR_ABSOLUTE:
-            self.arithmetic_operation('xor', 'absolute')
-        elif self.IR == EOR_ABSOLUTE_X:
-            self.arithmetic_operation('xor', 'absolute_indexed', 'X')
-        elif self.IR == EOR_ABSOLUTE_Y:
-            self.arithmetic_operation('xor', 'absolute_indexed', 'Y')
-        elif self.IR == EOR_INDIRECT_X:
-            self.arithmetic_operation('xor', 'indexed_indirect_x')
-        elif self.IR == EOR_INDIRECT_Y:
-            self.arithmetic_operation('xor', 'indirect_indexed_y')
-        # INC instructions
-        elif self.IR == INC_ZERO_PAGE:
-            self.increment(1, 'zero_page')
-        elif self.IR == INC_ZERO_PAGE_X:
-            self.increment(1, 'zero_page_indexed', 'X')
-        elif self.IR == INC_ABSOLUTE:
-            self.increment(1, 'absolute')
-        elif self.IR == INC_ABSOLUTE_X:
-            self.increment(1, 'absolute_indexed', 'X')
-        # Decrement registers X and Y
-        elif self.IR == INX:
-            self.increment_register(1, 'X')
-        elif self.IR == INY:
-            self.increment_register(1, 'Y')
-        # JMP instructions
-        elif self.IR == JMP_ABSOLUTE:
-            self.jump('absolute')
-        elif self.IR == JMP_INDIRECT:
-            self.jump('indirect')
-        # JSR instruction
-        elif self.IR == JSR:
-            self.jump_to_subroutine()
-            # LDA instructions
-        elif self.IR == LDA_IMMEDIATE:
-            self.load_register('A', 'immediate')
-        elif self.IR == LDA_ZERO_PAGE:
-            self.load_register('A', 'zero_page')
-        elif self.IR == LDA_ZERO_PAGE_X:
-            self.load_register('A', 'zero_page_indexed', 'X')
-        elif self.IR == LDA_ABSOLUTE:
-            self.load_register('A', 'absolute')
-        elif self.IR == LDA_ABSOLUTE_X:
-            self.load_register('A', 'absolute_indexed', 'X')
-        elif self.IR == LDA_ABSOLUTE_Y:
-            self.load_register('A', 'absolute_indexed', 'Y')
-        elif self.IR == LDA_INDIRECT_X:
-            self.load_register('A', 'indexed_indirect_x')
-        elif self.IR == LDA_INDIRECT_Y:
-            self.load_register('A', 'indirect_indexed_y')
-            # LDX instructions
-        elif self.IR == LDX_IMMEDIATE:
-            self.load_register('X', 'immediate')
-        elif self.IR == LDX_ZERO_PAGE:
-            self.load_register('X', 'zero_page')
-        elif self.IR == LDX_ZERO_PAGE_Y:
-            self.load_register('X', 'zero_page_indexed', 'Y')
-        elif self.IR == LDX_ABSOLUTE:
-            self.load_register('X', 'absolute')
-        elif self.IR == LDX_ABSOLUTE_Y:
-            self.load_register('X', 'absolute_indexed', 'Y')
-        # LDY instructions
-        elif self.IR == LDY_IMMEDIATE:
-            self.load_register('Y', 'immediate')
-        elif self.IR == LDY_ZERO_PAGE:
-            self.load_register('Y', 'zero_page')
-        elif self.IR == LDY_ZERO_PAGE_X:
-            self.load_register('Y', 'zero_page_indexed', 'X')
-        elif self.IR == LDY_ABSOLUTE:
-            self.load_register('Y', 'absolute')
-        elif self.IR == LDY_ABSOLUTE_X:
-            self.load_register('Y', 'absolute_indexed', 'X')
-        # Logical shift right
-        elif self.IR == LSR_ACCUMULATOR:
-            self.shift_accumulator(left=False)
-        elif self.IR == LSR_ZERO_PAGE:
-            self.shift_memory(left=False, mode='zero_page')
-        elif self.IR == LSR_ZERO_PAGE_X:
-            self.shift_memory(left=False, mode='zero_page_indexed', index_register='X')
-        elif self.IR == LSR_ABSOLUTE:
-            self.shift_memory(left=False, mode='absolute')
-        elif self.IR == LSR_ABSOLUTE_X:
-            self.shift_memory(left=False, mode='absolute_indexed', index_register='X')
-            # NOP instruction
-        elif self.IR == NOP:
-            self.no_operation()
-        # ORA instructions
-        elif self.IR == ORA_IMMEDIATE:
-            self.arithmetic_operation('or_', 'immediate')
-        elif self.IR == ORA_ZERO_PAGE:
-            self.arithmetic_operation('or_', 'zero_page')
-        elif self.IR == ORA_ZERO_PAGE_X:
-            self.arithmetic_operation('or_', 'zero_page_indexed', 'X')
-        elif self.IR == ORA_ABSOLUTE:
-            self.arithmetic_operation('or_', 'absolute')
-        elif self.IR == ORA_ABSOLUTE_X:
-            self.arithmetic_operation('or_', 'absolute_indexed', 'X')
-        elif self.IR == ORA_ABSOLUTE_Y:
-            self.arithmetic_operation('or_', 'absolute_indexed', 'Y')
-        elif self.IR == ORA_INDIRECT_X:
-            self.arithmetic_operation('or_', 'indexed_indirect_x')
-        elif self.IR == ORA_INDIRECT_Y:
-            self.arithmetic_operation('or_', 'indirect_indexed_y')
-        # Push to stack instructions
-        elif self.IR == PHA:
-            self.push_register_to_stack('A')
-        elif self.IR == PHP:
-            self.push_register_to_stack('SR')
-        # Pull from stack instruction
-        elif self.IR == PLA:
-            self.pull_register_from_stack('A')
-        elif self.IR == PLP:
-            self.pull_register_from_stack('SR')
-        # Rotate instructions
-        elif self.IR == ROL_ACCUMULATOR:
-            self.rotate_accumulator(left=True)
-        elif self.IR == ROL_ZERO_PAGE:
-            self.rotate_memory(mode='zero_page', left=True)
-        elif self.IR == ROL_ZERO_PAGE_X:
-            self.rotate_memory(mode='zero_page_indexed', index_register='X', left=True)
-        elif self.IR == ROL_ABSOLUTE:
-            self.rotate_memory(mode='absolute', left=True)
-        elif self.IR == ROL_ABSOLUTE_X:
-            self.rotate_memory(mode='absolute_indexed', index_register='X', left=True)
-        elif self.IR == ROR_ACCUMULATOR:
-            self.rotate_accumulator(left=False)
-        elif self.IR == ROR_ZERO_PAGE:
-            self.rotate_memory(mode='zero_page', left=False)
-        elif self.IR == ROR_ZERO_PAGE_X:
-            self.rotate_memory(mode='zero_page_indexed', index_register='X', left=False)
-        elif self.IR == ROR_ABSOLUTE:
-            self.rotate_memory(mode='absolute', left=False)
-        elif self.IR == ROR_ABSOLUTE_X:
-            self.rotate_memory(mode='absolute_indexed', index_register='X', left=False)
-        # RTI instruction
-        elif self.IR == RTI:
-            print('RTI')
-            self.return_from_interrupt()
-        # RTS instruction
-        elif self.IR == RTS:
-            self.return_from_subroutine()
-        # SBC instructions
-        elif self.IR == SBC_IMMEDIATE:
-            self.arithmetic_operation('sbc', 'immediate')
-        elif self.IR == SBC_ZERO_PAGE:
-            self.arithmetic_operation('sbc', 'zero_page')
-        elif self.IR == SBC_ZERO_PAGE_X:
-            self.arithmetic_operation('sbc', 'zero_page_indexed', 'X')
-        elif self.IR == SBC_ABSOLUTE:
-            self.arithmetic_operation('sbc', 'absolute')
-        elif self.IR == SBC_ABSOLUTE_X:
-            self.arithmetic_operation('sbc', 'absolute_indexed', 'X')
-        elif self.IR == SBC_ABSOLUTE_Y:
-            self.arithmetic_operation('sbc', 'absolute_indexed', 'Y')
-        elif self.IR == SBC_INDIRECT_X:
-            self.arithmetic_operation('sbc', 'indexed_indirect_x')
-        elif self.IR == SBC_INDIRECT_Y:
-            self.arithmetic_operation('sbc', 'indirect_indexed_y')
-        # Set flag instructions
-        elif self.IR == SEC:
-            self.set_flag('C', True)
-        elif self.IR == SED:
-            self.set_flag('D', True)
-        elif self.IR == SEI:
-            self.set_flag('I', True)
-        # STA instructions
-        elif self.IR == STA_ZERO_PAGE:
-            self.store_register('A', 'zero_page')
-        elif self.IR == STA_ZERO_PAGE_X:
-            self.store_register('A', 'zero_page_indexed', 'X')
-        elif self.IR == STA_ABSOLUTE:
-            self.store_register('A', 'absolute')
-        elif self.IR == STA_ABSOLUTE_X:
-            self.store_register('A', 'absolute_indexed', 'X')
-        elif self.IR == STA_ABSOLUTE_Y:
-            self.store_register('A', 'absolute_indexed', 'Y')
-        elif self.IR == STA_INDIRECT_X:
-            self.store_register('A', 'indexed_indirect_x')
-        elif self.IR == STA_INDIRECT_Y:
-            self.store_register('A', 'indirect_indexed_y')
-        # STX instructions
-        elif self.IR == STX_ZERO_PAGE:
-            self.store_register('X', 'zero_page')
-        elif self.IR == STX_ZERO_PAGE_Y:
-            self.store_register('X', 'zero_page_indexed', 'Y')
-        elif self.IR == STX_ABSOLUTE:
-            self.store_register('X', 'absolute')
-        # STY instructions
-        elif self.IR == STY_ZERO_PAGE:
-            self.store_register('Y', 'zero_page')
-        elif self.IR == STY_ZERO_PAGE_X:
-            self.store_register('Y', 'zero_page_indexed', 'X')
-        elif self.IR == STY_ABSOLUTE:
-            self.store_register('Y', 'absolute')
-        # Transfer register to register instructions
-        elif self.IR == TAX:
-            self.transfer_register('A', 'X')
-        elif self.IR == TAY:
-            self.transfer_register('A', 'Y')
-        elif self.IR == TSX:
-            self.transfer_register('S', 'X')
-        elif self.IR == TXA:
-            self.transfer_register('X', 'A')
-        elif self.IR == TXS:
-            self.transfer_register('X', 'S')
-        elif self.IR == TYA:
-            self.transfer_register('Y', 'A')
-        else:
-            self.no_operation()
-            # raise UndefinedInstructionError(self.IR)
+        handler, arguments = self.dispatch_table[self.IR]
+        handler(*arguments)
+
+    def run(self, max_cycles: int = None, max_instructions: int = None, until_pc: int = None,
+            stop_on_brk: bool = True) -> RunResult:
+        """Run instructions until a stop condition holds and return why, with the cycles and instructions used.
+
+        The conditions are checked before each instruction: PC equals until_pc, a BRK is to be executed
+        (unless stop_on_brk is False), max_instructions have been executed or max_cycles have been used.
+        The last instruction may exceed max_cycles. Without any condition met, run does not return.
+        Breakpoints and watchpoints (see emulator.breakpoints) stop it as well.
+        """
+        start_cycles = self.cycles
+        cycle_limit = float('inf') if max_cycles is None else start_cycles + max_cycles
+        instruction_limit = float('inf') if max_instructions is None else max_instructions
+        until_pc = -1 if until_pc is None else until_pc
+        brk = BRK if stop_on_brk else -1
+        data = self.memory.data
+        run_instruction = self.run_instruction
+        executed = 0
+        while True:
+            pc = self.PC
+            if pc == until_pc:
+                reason = STOP_UNTIL_PC
+            elif data[pc] == brk:
+                reason = STOP_BRK
+            elif executed >= instruction_limit:
+                reason = STOP_MAX_INSTRUCTIONS
+            elif self.cycles >= cycle_limit:
+                reason = STOP_MAX_CYCLES
+            else:
+                try:
+                    run_instruction()
+                except BreakpointHit as hit:
+                    reason = hit.reason
+                else:
+                    executed += 1
+                    continue
+            return RunResult(reason, self.cycles - start_cycles, executed)
 
 
 def setup_processor(instruction: list[int], data: dict = None, registers: dict = None, flags: dict = None) -> Processor:
@@ -0,0 +1,232 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Execution profiler for Processor.
+#
+# While enabled, Profiler wraps run_instruction of its processor (see emulator.hooks) with a
+# version counting the instructions executed and the cycles used per address of the instruction, in two preallocated
+# tables of 0x10000 entries. Cycles used to serve an interrupt are counted for the instruction
+# executed after it. hotspots folds the tables through the debug_info of the assembler (address
+# to source line) into cycles per source line, report formats them with the source code.
+#
+# CallGraphProfiler keeps a shadow call stack, updated by wrappers of jump_to_subroutine,
+# return_from_subroutine, brk, return_from_interrupt and the interrupt entries of its processor.
+# The cycles between two changes of the stack are added to the current stack path, giving the
+# exclusive cycles per path from which the inclusive and exclusive cycles per subroutine follow.
+# Subroutines are named by the labels of the assembler's label_dict.
+#
+# Each frame remembers the stack pointer below the return address pushed by its call. A return
+# pops the frame whose return address it pulls, and all frames below it, which code left without
+# returning. A return not pulling the return address of any frame, as an RTS dispatching to an
+# address pushed with PHA, is a jump and leaves the stack alone. A call drops the frames whose
+# return addresses it overwrites. The shadow stack is thus never deeper than the 6502 stack.
+
+from array import array
+from typing import NamedTuple
+from emulator.hooks import is_wrapped, unwrap_method, wrap_method
+from emulator.processor import Processor
+
+
+class Hotspot(NamedTuple):
+    line: int
+    instructions: int
+    cycles: int
+
+
+class Profiler:
+    """Instruction and cycle counts per address of the instructions executed by processor."""
+
+    def __init__(self, processor: Processor) -> None:
+        self.processor = processor
+        self.instructions = array('L', bytes(0x10000 * array('L').itemsize))
+        self.cycles = array('L', bytes(0x10000 * array('L').itemsize))
+
+    @property
+    def enabled(self) -> bool:
+        return is_wrapped(self.processor, 'run_instruction', self)
+
+    def enable(self) -> None:
+        wrap_method(self.processor, 'run_instruction', self, self.profiled_run_instruction)
+
+    def disable(self) -> None:
+        unwrap_method(self.processor, 'run_instruction', self)
+
+    def profiled_run_instruction(self, run_instruction):
+        processor = self.processor
+        instructions = self.instructions
+        cycles = self.cycles
+
+        def profiled():
+            pc = processor.PC
+            start = processor.cycles
+            run_instruction()
+            instructions[pc] += 1
+            cycles[pc] += processor.cycles - start
+        return profiled
+
+    def clear(self) -> None:
+        self.instructions[:] = array('L', bytes(len(self.instructions) * self.instructions.itemsize))
+        self.cycles[:] = array('L', bytes(len(self.cycles) * self.cycles.itemsize))
+
+    def hotspots(self, debug_info: dict) -> list[Hotspot]:
+        """Return the instructions and cycles per source line, sorted by cycles in descending order.
+
+        Addresses missing in debug_info are summed up under line 0.
+        """
+        lines = {}
+        for address, cycles in enumerate(self.cycles):
+            if cycles:
+                line = debug_info.get(address, 0)
+                instructions, total = lines.get(line, (0, 0))
+                lines[line] = (instructions + self.instructions[address], total + cycles)
+        return sorted((Hotspot(line, instructions, cycles) for line, (instructions, cycles) in lines.items()),
+                      key=lambda hotspot: (-hotspot.cycles, hotspot.line))
+
+    def report(self, debug_info: dict, source_lines: list[str], limit: int = None) -> str:
+        """Format the hotspots as table with the source lines (numbered from 1), limited to limit lines."""
+        hotspots = self.hotspots(debug_info)
+        total = sum(hotspot.cycles for hotspot in hotspots) or 1
+        rows = [f'{"Line":>6} {"Cycles":>10} {"%":>6} {"Instr.":>10}  Source']
+        for hotspot in hotspots[:limit]:
+            if 0 < hotspot.line <= len(source_lines):
+                source = source_lines[hotspot.line - 1].rstrip()
+            else:
+                source = '(outside the program)'
+            rows.append(f'{hotspot.line:>6} {hotspot.cycles:>10} {100 * hotspot.cycles / total:>6.1f} '
+                        f'{hotspot.instructions:>10}  {source}')
+        return '\n'.join(rows)
+
+
+class Subroutine(NamedTuple):
+    calls: int
+    inclusive_cycles: int
+    exclusive_cycles: int
+
+
+def labels_by_address(label_dict: dict) -> dict[int, str]:
+    """Invert the label_dict of the assembler (label to hex string), the first label of an address wins."""
+    return {int(value, 16): label for label, value in reversed(label_dict.items())}
+
+
+class CallGraphProfiler:
+    """Cycles per call stack path of the subroutines and interrupt handlers called by processor."""
+
+    # Processor methods wrapped while enabled
+    METHODS = ('jump_to_subroutine', 'return_from_subroutine', 'brk', 'return_from_interrupt', 'interrupt',
+               'non_maskable_interrupt')
+
+    def __init__(self, processor: Processor, label_dict: dict = None) -> None:
+        self.processor = processor
+        self.labels = labels_by_address(label_dict or {})
+        # Frames as (name, stack pointer below the return address), the first one being the root
+        self.stack = []
+        self.path = ()
+        # Exclusive cycles by stack path, and number of calls by name
+        self.folded = {}
+        self.calls = {}
+        self.last_cycles = 0
+
+    def name(self, address: int) -> str:
+        return self.labels.get(address, f'${address:04X}')
+
+    def enable(self) -> None:
+        """Start profiling with the code at PC as root."""
+        processor = self.processor
+        self.stack = [(self.name(processor.PC), 0x100)]
+        self.path = (self.stack[0][0],)
+        self.last_cycles = processor.cycles
+        for method in self.METHODS:
+            wrap_method(processor, method, self, getattr(self, 'profiled_' + method))
+
+    def disable(self) -> None:
+        self.flush()
+        for method in self.METHODS:
+            unwrap_method(self.processor, method, self)
+
+    # Add the cycles since the last change of the stack to the current path
+    def flush(self) -> None:
+        cycles = self.processor.cycles
+        if cycles != self.last_cycles and self.path:
+            self.folded[self.path] = self.folded.get(self.path, 0) + cycles - self.last_cycles
+        self.last_cycles = cycles
+
+    def call(self, address: int, stack_pointer: int) -> None:
+        self.flush()
+        while len(self.stack) > 1 and self.stack[-1][1] <= stack_pointer:
+            self.stack.pop()
+        name = self.name(address)
+        self.stack.append((name, stack_pointer))
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.path = tuple(frame[0] for frame in self.stack)
+
+    def ret(self, stack_pointer: int) -> None:
+        self.flush()
+        if not any(frame[1] == stack_pointer for frame in self.stack[1:]):
+            return
+        while self.stack[-1][1] != stack_pointer:
+            self.stack.pop()
+        self.stack.pop()
+        self.path = tuple(frame[0] for frame in self.stack)
+
+    def profiled_jump_to_subroutine(self, jump_to_subroutine):
+        processor = self.processor
+
+        def profiled():
+            jump_to_subroutine()
+            self.call(processor.PC, processor.S)
+        return profiled
+
+    def profiled_return_from_subroutine(self, return_from_subroutine):
+        processor = self.processor
+
+        def profiled():
+            stack_pointer = processor.S
+            return_from_subroutine()
+            self.ret(stack_pointer)
+        return profiled
+
+    profiled_return_from_interrupt = profiled_return_from_subroutine
+
+    def profiled_brk(self, brk):
+        processor = self.processor
+
+        def profiled():
+            stack_pointer = processor.S
+            brk()
+            # The interrupt entries push nothing while interrupts are disabled
+            if processor.S != stack_pointer:
+                self.call(processor.PC, processor.S)
+        return profiled
+
+    profiled_interrupt = profiled_non_maskable_interrupt = profiled_brk
+
+    def subroutines(self) -> dict[str, Subroutine]:
+        """Return calls, inclusive and exclusive cycles by subroutine name, including the root."""
+        self.flush()
+        inclusive, exclusive = {}, {}
+        for path, cycles in self.folded.items():
+            exclusive[path[-1]] = exclusive.get(path[-1], 0) + cycles
+            # Recursive subroutines are counted once per path
+            for name in set(path):
+                inclusive[name] = inclusive.get(name, 0) + cycles
+        return {name: Subroutine(self.calls.get(name, 0), inclusive[name], exclusive.get(name, 0))
+                for name in sorted(inclusive, key=lambda name: -inclusive[name])}
+
+    def folded_stacks(self) -> str:
+        """Return the cycles per stack path in the folded format read by flamegraph tools."""
+        self.flush()
+        return ''.join(f'{";".join(path)} {cycles}\n' for path, cycles in sorted(self.folded.items()))
@@ -0,0 +1,197 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Ahead-of-time recompilation of assembled programs.
+#
+# recompile takes the code_dict (and optionally debug_info) returned by
+# asm.assembler.assemble_file and translates every basic block reachable from the entry points (by
+# default the reset, IRQ and NMI vectors of the image) with translate_block into the source of one
+# Python module, which is cached on disk under a hash of the image, the entry points and the
+# debug_info. Repeated runs of the same program thus skip both the translation and the compilation
+# of its blocks.
+#
+# RecompiledProcessor executes the blocks of such a module. A block is only used as long as the
+# memory under it still holds the bytes it was recompiled from; code at other addresses, as reached
+# by indirect jumps, RTS or RTI to unknown addresses, and code in pages modified since loading are
+# executed instruction by instruction. While devices are attached (see emulator.bus), blocks with
+# an instruction which may access a device are translated at run time as by TranslatingProcessor,
+# leaving those instructions to the handlers looking up the page table.
+
+import hashlib
+import importlib.util
+import os
+from pathlib import Path
+from emulator.opcodes import BCC, BCS, BEQ, BMI, BNE, BPL, BRK, BVC, BVS, JMP_ABSOLUTE, JMP_INDIRECT, JSR, RTI, RTS
+from emulator.fast import IRQ_VECTOR, NMI_VECTOR, RESET_VECTOR
+from emulator.translator import Block, TranslatingProcessor, interpret_instruction, may_access_devices, \
+    translate_block
+
+# Part of the cache key, to be increased whenever the generated code changes
+RECOMPILER_VERSION = 3
+
+DEFAULT_CACHE_DIRECTORY = Path.home() / '.cache' / '6502Simulator' / 'recompiled'
+
+BRANCHES = frozenset((BCC, BCS, BEQ, BMI, BNE, BPL, BVC, BVS))
+
+
+def build_image(code_dict: dict) -> dict[int, int]:
+    """Map each address of code_dict, with the code as hex string, to the bytes stored from there on."""
+    image = {}
+    for address, code in code_dict.items():
+        for offset, byte in enumerate(bytes.fromhex(code)):
+            image[(address + offset) & 0xffff] = byte
+    return image
+
+
+# debug_info selects the blocks translated and appears in the comments of the module
+def image_hash(image: dict[int, int], entry_points: tuple, debug_info: dict = None) -> str:
+    digest = hashlib.sha256(f'{RECOMPILER_VERSION} {entry_points}'.encode())
+    for address in sorted(image):
+        digest.update(bytes((address >> 8, address & 0xff, image[address])))
+    digest.update(f' {sorted(debug_info.items()) if debug_info else None}'.encode())
+    return digest.hexdigest()
+
+
+def vector(image: dict[int, int], address: int):
+    if address in image and address + 1 in image:
+        return image[address] | image[address + 1] << 8
+    return None
+
+
+def default_entry_points(image: dict[int, int]) -> tuple:
+    entry_points = [vector(image, address) for address in (RESET_VECTOR, IRQ_VECTOR, NMI_VECTOR)]
+    entry_points = [address for address in entry_points if address is not None]
+    return tuple(entry_points) if entry_points else (min(image),)
+
+
+# The addresses the program may continue at after block, as far as known statically
+def successors(mem, block: Block, image: dict[int, int]) -> list[int]:
+    last = max(block.interior, default=block.start)
+    opcode = mem[last]
+    if opcode in BRANCHES:
+        offset = mem[last + 1]
+        return [block.end, (block.end + offset - (0x100 if offset & 0x80 else 0)) & 0xffff]
+    if opcode == JMP_ABSOLUTE:
+        return [mem[last + 1] | mem[last + 2] << 8]
+    if opcode == JSR:
+        return [mem[last + 1] | mem[last + 2] << 8, block.end]
+    if opcode == BRK:
+        # RTI returns behind the padding byte of BRK
+        return [address for address in (vector(image, IRQ_VECTOR), block.end + 1) if address is not None]
+    if opcode in (JMP_INDIRECT, RTS, RTI):
+        # The target is only known at run time
+        return []
+    # The block was ended before a later instruction
+    return [block.end]
+
+
+def translate_program(image: dict[int, int], entry_points: tuple, instruction_starts=None) -> list[Block]:
+    """Translate the basic blocks reachable from entry_points, sorted by start address.
+
+    With instruction_starts, for instance the keys of debug_info, only blocks starting at one of
+    them are translated, so data is never mistaken for code.
+    """
+    mem = bytearray(0x10000)
+    for address, byte in image.items():
+        mem[address] = byte
+    blocks = {}
+    pending = list(entry_points)
+    while pending:
+        start = pending.pop() & 0xffff
+        if start in blocks or start not in image or (instruction_starts is not None
+                                                     and start not in instruction_starts):
+            continue
+        block = translate_block(mem, start)
+        if block.function is interpret_instruction:
+            continue
+        blocks[start] = block
+        pending += successors(mem, block, image)
+    return [blocks[start] for start in sorted(blocks)]
+
+
+def generate_module(image: dict[int, int], blocks: list[Block], debug_info: dict = None) -> str:
+    lines = ['# Generated by emulator.recompiler, do not edit', '',
+             'from emulator.alu_tables import ADC, SBC', '']
+    for block in blocks:
+        addresses = sorted({block.start} | block.interior)
+        source_lines = [debug_info[address] for address in addresses if debug_info and address in debug_info]
+        lines += ['', f'# ${block.start:04X}-${block.end - 1:04X}' +
+                  (f', line {", ".join(str(line) for line in source_lines)}' if source_lines else '')]
+        lines += block.source.splitlines()
+        lines.append('')
+    lines += ['', '# start: (function, end, instruction addresses, max_cycles, ends_with_brk, code)', 'BLOCKS = {']
+    for block in blocks:
+        addresses = tuple(sorted({block.start} | block.interior))
+        code = bytes(image[address & 0xffff] for address in range(block.start, block.end))
+        lines.append(f'    0x{block.start:04x}: (block_{block.start:04x}, 0x{block.end:x}, {addresses!r}, '
+                     f'{block.max_cycles}, {block.ends_with_brk}, {code!r}),')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def load_module(path: Path):
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def recompile(code_dict: dict, debug_info: dict = None, entry_points: tuple = None,
+              cache_directory: Path = DEFAULT_CACHE_DIRECTORY):
+    """Return the module with the recompiled blocks of an assembled program, generated on first use.
+
+    code_dict and debug_info are as returned by asm.assembler.assemble_file.
+    """
+    image = build_image(code_dict)
+    if entry_points is None:
+        entry_points = default_entry_points(image)
+    entry_points = tuple(entry_points)
+    cache_directory = Path(cache_directory)
+    path = cache_directory / f'program_{image_hash(image, entry_points, debug_info)[:32]}.py'
+    if not path.exists():
+        instruction_starts = set(debug_info) if debug_info else None
+        blocks = translate_program(image, entry_points, instruction_starts)
+        cache_directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so concurrent runs never import a partial module
+        temporary = path.with_suffix(f'.{os.getpid()}.tmp')
+        temporary.write_text(generate_module(image, blocks, debug_info))
+        temporary.replace(path)
+    return load_module(path)
+
+
+class RecompiledProcessor(TranslatingProcessor):
+    """TranslatingProcessor executing the blocks of a module returned by recompile.
+
+    Addresses without a recompiled block, and blocks whose code differs from the recompiled one,
+    are executed instruction by instruction rather than translated.
+    """
+    __slots__ = ('recompiled',)
+
+    def __init__(self, module, memory_size=2 ** 16) -> None:
+        super().__init__(memory_size)
+        self.recompiled = module.BLOCKS
+
+    def translate(self, address: int) -> Block:
+        entry = self.recompiled.get(address)
+        if entry is None or self.mem[address:entry[1]] != entry[5]:
+            return self.add_block(Block(interpret_instruction, address, address + 1))
+        function, end, addresses, max_cycles, ends_with_brk, _ = entry
+        devices = self.memory.devices
+        if self.memory.devices_attached and any(may_access_devices(self.mem, instruction, devices)
+                                                for instruction in addresses):
+            return super().translate(address)
+        return self.add_block(Block(function, address, end, addresses, max_cycles, ends_with_brk))
@@ -0,0 +1,188 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Instruction mix statistics of a run, cheap enough to be left on in batch runs.
+#
+# Only three things are counted while instructions execute: the instructions per opcode, the
+# cycles each opcode used beyond its base number of cycles, and the lowest stack pointer. The
+# address mode histogram and the zero page and absolute accesses are folded from the opcode counts
+# when the statistics are exported. The extra cycles of a branch are one when it is taken and two
+# when it is taken to another page, those of the other instructions are page crossing penalties.
+#
+# Statistics installs its counters through emulator.hooks. For a Processor, it wraps
+# run_instruction, and interrupt and non_maskable_interrupt to notice the interrupts entered by
+# run_instruction, including those requested by events due at its start; instructions during which
+# an interrupt is entered are counted, but their extra cycles are not. For a FastProcessor, it
+# wraps the handlers, which do not serve interrupts. A TranslatingProcessor runs whole blocks
+# without its handlers and is not supported.
+
+import json
+from array import array
+from emulator.disassembler import INSTRUCTIONS, BRANCH_MNEMONICS
+from emulator.fast import FastProcessor, Operands, generate_instruction, instruction_length
+from emulator.hooks import HANDLERS, is_wrapped, unwrap_handlers, unwrap_method, wrap_handlers, wrap_method
+from emulator.processor import Processor, REG_IR, REG_S
+from emulator.translator import TranslatingProcessor
+import emulator.opcodes
+
+# Names of the opcodes, as in emulator.opcodes
+OPCODE_NAMES = {opcode: name for name, opcode in vars(emulator.opcodes).items()
+                if name.isupper() and isinstance(opcode, int)}
+
+# Cycles of the instructions without penalty cycles
+BASE_CYCLES = tuple(generate_instruction(opcode, Operands(instruction_length(opcode)))[1] for opcode in range(0x100))
+
+BRANCHES = frozenset(opcode for opcode, (mnemonic, _) in INSTRUCTIONS.items() if mnemonic in BRANCH_MNEMONICS)
+
+ZERO_PAGE_MODES = frozenset(('ZERO_PAGE', 'ZERO_PAGE_X', 'ZERO_PAGE_Y'))
+ABSOLUTE_MODES = frozenset(('ABSOLUTE', 'ABSOLUTE_X', 'ABSOLUTE_Y'))
+
+
+def address_mode(opcode: int) -> str:
+    """Return the address mode of opcode, in lower case as in 'zero_page_x'."""
+    _, mode = INSTRUCTIONS.get(opcode, ('NOP', ''))
+    return mode.lower() or 'implied'
+
+
+class Statistics:
+    """Opcode counts, extra cycles and stack depth of the instructions executed by processor."""
+
+    def __init__(self, processor: Processor | FastProcessor) -> None:
+        if isinstance(processor, TranslatingProcessor):
+            raise TypeError('A TranslatingProcessor runs translated blocks, which are not counted')
+        self.processor = processor
+        self.instructions = array('L', bytes(0x100 * array('L').itemsize))
+        self.extra_cycles = array('L', bytes(0x100 * array('L').itemsize))
+        self.taken = array('L', bytes(0x100 * array('L').itemsize))
+        self.start_s = self.lowest_s = processor.S
+        # Whether the running instruction of a Processor entered an interrupt
+        self.interrupted = False
+
+    @property
+    def enabled(self) -> bool:
+        if isinstance(self.processor, FastProcessor):
+            return is_wrapped(self.processor, HANDLERS, self)
+        return is_wrapped(self.processor, 'run_instruction', self)
+
+    def enable(self) -> None:
+        self.start_s = self.lowest_s = self.processor.S
+        if isinstance(self.processor, FastProcessor):
+            wrap_handlers(self.processor, self, self.counting_handler)
+        else:
+            wrap_method(self.processor, 'run_instruction', self, self.counting_run_instruction)
+            wrap_method(self.processor, 'interrupt', self, self.noting_interrupt)
+            wrap_method(self.processor, 'non_maskable_interrupt', self, self.noting_interrupt)
+
+    def disable(self) -> None:
+        if isinstance(self.processor, FastProcessor):
+            unwrap_handlers(self.processor, self)
+        else:
+            for name in ('run_instruction', 'interrupt', 'non_maskable_interrupt'):
+                unwrap_method(self.processor, name, self)
+
+    def clear(self) -> None:
+        for table in (self.instructions, self.extra_cycles, self.taken):
+            table[:] = array('L', bytes(len(table) * table.itemsize))
+        self.start_s = self.lowest_s = self.processor.S
+
+    def counting_run_instruction(self, run_instruction):
+        processor = self.processor
+        registers = processor.registers
+        instructions, extra_cycles, taken = self.instructions, self.extra_cycles, self.taken
+        branches = bytes(opcode in BRANCHES for opcode in range(0x100))
+
+        def counted_run_instruction():
+            start = processor.cycles
+            self.interrupted = False
+            run_instruction()
+            opcode = registers[REG_IR]
+            instructions[opcode] += 1
+            extra = processor.cycles - start - BASE_CYCLES[opcode]
+            if extra and not self.interrupted:
+                extra_cycles[opcode] += extra
+                if branches[opcode]:
+                    taken[opcode] += 1
+            if registers[REG_S] < self.lowest_s:
+                self.lowest_s = registers[REG_S]
+        return counted_run_instruction
+
+    # Interrupt entry noting whether it pushed, the maskable one returning without while I is set
+    def noting_interrupt(self, interrupt):
+        processor = self.processor
+
+        def noted():
+            stack_pointer = processor.S
+            interrupt()
+            if processor.S != stack_pointer:
+                self.interrupted = True
+        return noted
+
+    def counting_handler(self, opcode: int, handler):
+        instructions, extra_cycles, taken = self.instructions, self.extra_cycles, self.taken
+        base = BASE_CYCLES[opcode]
+        branch = opcode in BRANCHES
+
+        def counted_handler(cpu, mem):
+            start = cpu.cycles
+            handler(cpu, mem)
+            instructions[opcode] += 1
+            extra = cpu.cycles - start - base
+            if extra:
+                extra_cycles[opcode] += extra
+                if branch:
+                    taken[opcode] += 1
+            if cpu.s < self.lowest_s:
+                self.lowest_s = cpu.s
+        return counted_handler
+
+    def as_dict(self) -> dict:
+        """Return the statistics as a dict of JSON types, see the module comment."""
+        opcodes, modes = {}, {}
+        branches = {'taken': 0, 'not_taken': 0}
+        page_crossing_cycles = zero_page = absolute = 0
+        for opcode, count in enumerate(self.instructions):
+            if not count:
+                continue
+            opcodes[OPCODE_NAMES.get(opcode, f'${opcode:02X}')] = count
+            mode = address_mode(opcode)
+            modes[mode] = modes.get(mode, 0) + count
+            mnemonic = INSTRUCTIONS.get(opcode, ('NOP', ''))[0]
+            if opcode in BRANCHES:
+                branches['taken'] += self.taken[opcode]
+                branches['not_taken'] += count - self.taken[opcode]
+                page_crossing_cycles += self.extra_cycles[opcode] - self.taken[opcode]
+            else:
+                page_crossing_cycles += self.extra_cycles[opcode]
+            if mode.upper() in ZERO_PAGE_MODES:
+                zero_page += count
+            elif mode.upper() in ABSOLUTE_MODES and mnemonic not in ('JMP', 'JSR'):
+                absolute += count
+        return {
+            'instructions': sum(self.instructions),
+            'opcodes': opcodes,
+            'address_modes': modes,
+            'branches': branches,
+            'page_crossing_cycles': page_crossing_cycles,
+            'stack_depth': self.start_s - self.lowest_s,
+            'lowest_stack_pointer': self.lowest_s,
+            'zero_page_accesses': zero_page,
+            'absolute_accesses': absolute,
+            'zero_page_ratio': zero_page / (zero_page + absolute) if zero_page + absolute else None,
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.as_dict(), **kwargs)
@@ -0,0 +1,237 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Binary instruction traces.
+#
+# While enabled, Tracer wraps run_instruction, fetch_byte and put_byte of its processor (see
+# emulator.hooks) to store one fixed-width record per instruction executed in a preallocated ring
+# buffer: the cycle count, PC, opcode and operand bytes and the registers before the instruction,
+# and the last memory access of the instruction (address, value and whether it was a read or a
+# write). Immediate operands count as reads, the fetches of opcodes and address operands do not.
+# Given a file, every full chunk of the ring is copied and written by a background thread, so the
+# file holds the complete trace while the ring holds the latest records. Instructions writing more
+# than once (JSR, BRK, the interrupt entries) keep only their last access in the record; with a
+# file, their other writes go with the chunks to the side file named by writes_path, as WRITE
+# entries of record position, address and value. decode and format_record turn traces back into
+# records and disassembled text:
+#
+#     python -m emulator.trace trace.bin
+
+import argparse
+import queue
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Iterator, NamedTuple
+from emulator.disassembler import disassemble, instruction_size
+from emulator.hooks import is_wrapped, unwrap_method, wrap_method
+from emulator.processor import REG_A, REG_S, REG_X, REG_Y, Processor
+
+RECORD = struct.Struct('<QHBBBBBBBBHBBxx')
+# The access fields at the end of a record, set after the instruction was executed
+ACCESS = struct.Struct('<HBB')
+ACCESS_OFFSET = RECORD.size - ACCESS.size - 2
+
+ACCESS_NONE = 0
+ACCESS_READ = 1
+ACCESS_WRITE = 2
+
+# Writes not held by the access fields of their record
+WRITE = struct.Struct('<QHBx')
+
+
+def writes_path(path) -> Path:
+    """Return the path of the side file with the writes of the trace file path missing in its records."""
+    path = Path(path)
+    return path.with_name(path.name + '.writes')
+
+
+class TraceRecord(NamedTuple):
+    cycles: int
+    pc: int
+    opcode: int
+    lo: int
+    hi: int
+    a: int
+    x: int
+    y: int
+    s: int
+    p: int
+    address: int
+    value: int
+    access: int
+
+
+class Tracer:
+    """Ring buffer with the trace records of the last capacity instructions executed by processor.
+
+    With file, chunks of chunk_records records are written to it by a background thread; capacity
+    must then be a multiple of chunk_records.
+    """
+
+    def __init__(self, processor: Processor, capacity: int = 0x10000, file=None, chunk_records: int = 0x1000) -> None:
+        assert file is None or capacity % chunk_records == 0
+        self.processor = processor
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.view = memoryview(self.buffer)
+        # Number of records written since the tracer was created
+        self.count = 0
+        self.chunk_records = chunk_records
+        self.file = None if file is None else open(file, 'wb')
+        self.writes_file = None if file is None else open(writes_path(file), 'wb')
+        # WRITE entries of the chunk being recorded
+        self.writes = bytearray()
+        self.chunks = queue.Queue()
+        self.writer = None
+        # Last memory access and last write of the running instruction
+        self.access = (0, 0, ACCESS_NONE)
+        self.write = None
+
+    @property
+    def enabled(self) -> bool:
+        return is_wrapped(self.processor, 'run_instruction', self)
+
+    def enable(self) -> None:
+        if self.file is not None and self.writer is None:
+            self.writer = threading.Thread(target=self.write_chunks, daemon=True)
+            self.writer.start()
+        for name in ('run_instruction', 'fetch_byte', 'put_byte'):
+            wrap_method(self.processor, name, self, getattr(self, 'traced_' + name))
+
+    def disable(self) -> None:
+        for name in ('run_instruction', 'fetch_byte', 'put_byte'):
+            unwrap_method(self.processor, name, self)
+
+    def close(self) -> None:
+        """Disable tracing, write the records not written yet and close the file."""
+        self.disable()
+        if self.file is None:
+            return
+        written = self.count - self.count % self.chunk_records
+        if written < self.count:
+            start = written % self.capacity * RECORD.size
+            self.put_chunk(bytes(self.view[start:start + (self.count - written) * RECORD.size]))
+        if self.writer is not None:
+            self.chunks.put(None)
+            self.writer.join()
+        self.file.close()
+        self.writes_file.close()
+        self.file = self.writes_file = None
+
+    def put_chunk(self, chunk: bytes) -> None:
+        self.chunks.put((chunk, bytes(self.writes)))
+        self.writes.clear()
+
+    def write_chunks(self) -> None:
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            self.file.write(chunk[0])
+            self.writes_file.write(chunk[1])
+
+    def traced_run_instruction(self, run_instruction):
+        processor = self.processor
+        registers = processor.registers
+        buffer = self.buffer
+        pack_record = RECORD.pack_into
+        pack_access = ACCESS.pack_into
+        record_size = RECORD.size
+        no_access = (0, 0, ACCESS_NONE)
+        pack_write = WRITE.pack
+        writes = self.writes
+
+        def traced():
+            mem = processor.memory.data
+            pc = processor.PC
+            offset = self.count % self.capacity * record_size
+            pack_record(buffer, offset, processor.cycles, pc, mem[pc], mem[(pc + 1) & 0xffff], mem[(pc + 2) & 0xffff],
+                        registers[REG_A], registers[REG_X], registers[REG_Y], registers[REG_S], processor.SR,
+                        0, 0, ACCESS_NONE)
+            self.access = no_access
+            self.write = None
+            run_instruction()
+            if self.access is not no_access:
+                pack_access(buffer, offset + ACCESS_OFFSET, *self.access)
+            if self.write is not None and self.write is not self.access and self.file is not None:
+                writes.extend(pack_write(self.count, *self.write[:2]))
+            self.count += 1
+            if self.file is not None and self.count % self.chunk_records == 0:
+                end = offset + record_size
+                self.put_chunk(bytes(self.view[end - self.chunk_records * record_size:end]))
+        return traced
+
+    def traced_fetch_byte(self, fetch_byte):
+        processor = self.processor
+
+        def traced():
+            value = fetch_byte()
+            self.access = (processor.AR, value, ACCESS_READ)
+            return value
+        return traced
+
+    def traced_put_byte(self, put_byte):
+        processor = self.processor
+
+        pack_write = WRITE.pack
+        writes = self.writes
+
+        def traced(byte):
+            if self.write is not None and self.file is not None:
+                writes.extend(pack_write(self.count, *self.write[:2]))
+            self.access = self.write = (processor.AR, byte, ACCESS_WRITE)
+            put_byte(byte)
+        return traced
+
+    def records(self) -> list[TraceRecord]:
+        """Return the records in the ring buffer, oldest first."""
+        if self.count <= self.capacity:
+            return list(decode(self.view[:self.count * RECORD.size]))
+        split = self.count % self.capacity * RECORD.size
+        return list(decode(bytes(self.view[split:]) + bytes(self.view[:split])))
+
+
+def decode(data) -> Iterator[TraceRecord]:
+    return (TraceRecord(*fields) for fields in RECORD.iter_unpack(data))
+
+
+def format_record(record: TraceRecord) -> str:
+    size = instruction_size(record.opcode)
+    code = ' '.join(f'{byte:02X}' for byte in (record.opcode, record.lo, record.hi)[:size])
+    flags = ''.join(flag if record.p & 0x80 >> bit else '-' for bit, flag in enumerate('NV-BDIZC'))
+    line = (f'{record.cycles:>10}  ${record.pc:04X}  {code:<8}  '
+            f'{disassemble(record.opcode, record.lo, record.hi, record.pc):<12}  '
+            f'A={record.a:02X} X={record.x:02X} Y={record.y:02X} S={record.s:02X} P={flags}')
+    if record.access == ACCESS_READ:
+        line += f'  ${record.address:04X} -> {record.value:02X}'
+    elif record.access == ACCESS_WRITE:
+        line += f'  ${record.address:04X} <- {record.value:02X}'
+    return line
+
+
+def main(arguments: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m emulator.trace', description='Print a binary trace as text.')
+    parser.add_argument('trace', help='trace file written by Tracer')
+    arguments = parser.parse_args(arguments)
+    for record in decode(Path(arguments.trace).read_bytes()):
+        print(format_record(record))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Queries on trace files written by emulator.trace.Tracer.
+#
+# TraceIndex memory-maps a trace file and views it as a NumPy record array without copying it.
+# On opening it builds, with vectorised sorts, the positions of the writes sorted by address and
+# the positions of the records sorted by PC; the writes are those of the access fields of the
+# records and those of the side file of the trace (see emulator.trace.writes_path), so the pushes
+# of JSR, BRK and the interrupt entries are found too. A trace without side file, as written before
+# it existed, has only the last write of every instruction; the cycle counts of the records ascend already. Every
+# point query is then a binary search: the last write to an address before a position, the visits
+# of a PC, the record executing at a cycle, the records of a cycle range.
+
+import mmap
+import numpy as np
+from emulator.trace import ACCESS_WRITE, RECORD, WRITE, TraceRecord, writes_path
+
+# Layout of emulator.trace.RECORD as NumPy dtype
+RECORD_DTYPE = np.dtype([
+    ('cycles', '<u8'), ('pc', '<u2'), ('opcode', 'u1'), ('lo', 'u1'), ('hi', 'u1'), ('a', 'u1'), ('x', 'u1'),
+    ('y', 'u1'), ('s', 'u1'), ('p', 'u1'), ('address', '<u2'), ('value', 'u1'), ('access', 'u1'), ('pad', 'V2'),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+# Layout of emulator.trace.WRITE
+WRITE_DTYPE = np.dtype([('position', '<u8'), ('address', '<u2'), ('value', 'u1'), ('pad', 'V1')])
+assert WRITE_DTYPE.itemsize == WRITE.size
+
+
+# Sort positions by key, return the sorted keys and positions. The keys are widened to int64, as
+# searchsorted would convert the whole array for every search with a key of another type.
+def sorted_positions(keys: np.ndarray, positions: np.ndarray) -> (np.ndarray, np.ndarray):
+    order = np.argsort(keys, kind='stable')
+    return keys[order].astype(np.int64), positions[order]
+
+
+# Search cycle in the cycle counts of records, which are unsigned
+def search_cycle(records: np.ndarray, cycle: int, side: str = 'left') -> int:
+    if cycle < 0:
+        return 0
+    return int(np.searchsorted(records['cycles'], np.uint64(cycle), side=side))
+
+
+class TraceIndex:
+    """Index over the trace file path; record positions count from 0."""
+
+    def __init__(self, path) -> None:
+        self.file = open(path, 'rb')
+        size = self.file.seek(0, 2)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.records = np.frombuffer(self.map if size else b'', dtype=RECORD_DTYPE)
+        writes = np.flatnonzero(self.records['access'] == ACCESS_WRITE)
+        path = writes_path(path)
+        side = np.fromfile(path, dtype=WRITE_DTYPE) if path.exists() else np.zeros(0, dtype=WRITE_DTYPE)
+        positions = np.concatenate((writes, side['position'].astype(np.int64)))
+        addresses = np.concatenate((self.records['address'][writes], side['address']))
+        values = np.concatenate((self.records['value'][writes], side['value']))
+        # By address, then by position, the write of the access fields being the last of its instruction
+        last = np.concatenate((np.ones(len(writes), dtype=bool), np.zeros(len(side), dtype=bool)))
+        order = np.lexsort((last, positions, addresses))
+        self.write_addresses = addresses[order].astype(np.int64)
+        self.write_positions = positions[order]
+        self.write_values = values[order]
+        self.visit_pcs, self.visit_positions = sorted_positions(self.records['pc'],
+                                                                np.arange(len(self.records)))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.records = None
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # Records returned by cycle_range still view the map, it is unmapped once they are gone
+                pass
+        self.file.close()
+
+    def record(self, position: int) -> TraceRecord:
+        return TraceRecord(*(int(field) for field in self.records[position].tolist()[:-1]))
+
+    def writes(self, address: int) -> np.ndarray:
+        """Return the positions of the records writing address, ascending."""
+        start, end = np.searchsorted(self.write_addresses, (address, address + 1))
+        return self.write_positions[start:end]
+
+    def last_write(self, address: int, before: int = None):
+        """Return the position of the last record before position before writing address, or None."""
+        writes = self.writes(address)
+        index = len(writes) if before is None else np.searchsorted(writes, before)
+        return int(writes[index - 1]) if index else None
+
+    def changes(self, address: int) -> np.ndarray:
+        """Return the positions of the writes to address storing another value than the write before."""
+        start, end = np.searchsorted(self.write_addresses, (address, address + 1))
+        writes = self.write_positions[start:end]
+        values = self.write_values[start:end]
+        changed = np.ones(len(writes), dtype=bool)
+        changed[1:] = values[1:] != values[:-1]
+        return writes[changed]
+
+    def visits(self, pc: int) -> np.ndarray:
+        """Return the positions of the records of instructions at pc, ascending."""
+        start, end = np.searchsorted(self.visit_pcs, (pc, pc + 1))
+        return self.visit_positions[start:end]
+
+    def position_at_cycle(self, cycle: int):
+        """Return the position of the instruction executing at cycle, or None before the first one."""
+        position = search_cycle(self.records, cycle, side='right') - 1
+        return position if position >= 0 else None
+
+    def cycle_range(self, start_cycle: int, end_cycle: int) -> np.ndarray:
+        """Return the records of the instructions starting in start_cycle to end_cycle (exclusive)."""
+        return self.records[search_cycle(self.records, start_cycle):search_cycle(self.records, end_cycle)]
@@ -0,0 +1,274 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Basic block translation.
+#
+# A basic block is a run of instructions ending with the first instruction that sets the program
+# counter (branch, jump, JSR, RTS, RTI, BRK) or the I flag (CLI, SEI, PLP), after which a pending
+# interrupt may be served. The statements generated by emulator.fast for each
+# instruction are concatenated into one Python function with the operands folded into constants,
+# compiled, and cached by start address. One call executes the whole block; the cycles are exact.
+#
+# Cached blocks are invalidated by the stores hitting them: every page holding translated code is
+# marked in the code page bitmap of Memory, and stores into marked pages evict the blocks covering
+# the address written. Stores to pages without translated code cost one bitmap lookup. A block
+# whose store may hit its own later instructions is left right after the storing instruction, so
+# the rest is translated afresh. Code in the stack page is never translated, since pushes write
+# there; it is executed instruction by instruction. Memory changed from outside the processor must
+# be reported with invalidate_code or invalidate_blocks.
+#
+# Blocks access memory directly. While devices are attached (see emulator.bus), the instructions
+# whose data accesses may reach a page holding a device end the block before them and are run by
+# the handlers looking up the page table, as the code in the stack page: absolute and absolute
+# indexed instructions if their page or the page after holds a device, indirect ones always.
+
+import re
+from emulator.opcodes import BRK
+from emulator.processor import INSTRUCTION_SET, STOP_BRK, STOP_MAX_CYCLES, STOP_MAX_INSTRUCTIONS, STOP_UNTIL_PC, \
+    RunResult
+from emulator.fast import FastProcessor, STATE, TABLES, WRITE_PATTERN, Operands, build_handlers, check_code_writes, \
+    constant, generate_instruction, instruction_length, state_names
+
+# Maximum number of instructions translated into one block
+MAX_BLOCK_LENGTH = 64
+
+PENALTY_PATTERN = re.compile(r'cycles \+= (\d+)')
+
+# Instruction handlers reporting stores into translated code
+CHECKED_HANDLERS = build_handlers(code_writes_checked=True)
+LAZY_CHECKED_HANDLERS = build_handlers(code_writes_checked=True, lazy_flags=True)
+
+
+class Block:
+    """A translated basic block.
+
+    interior holds the addresses of the instructions after the first one, max_cycles the number
+    of cycles the block uses at most, ends_with_brk tells whether a BRK follows other instructions.
+    """
+    __slots__ = ('function', 'start', 'end', 'length', 'interior', 'max_cycles', 'ends_with_brk', 'source')
+
+    def __init__(self, function, start: int, end: int, addresses: tuple = (), max_cycles: int = 0,
+                 ends_with_brk: bool = False, source: str = '') -> None:
+        self.function = function
+        self.start = start
+        self.end = end
+        self.length = max(len(addresses), 1)
+        self.interior = frozenset(addresses[1:])
+        self.max_cycles = max_cycles
+        self.ends_with_brk = ends_with_brk
+        self.source = source
+
+
+def interpret_instruction(cpu, mem) -> int:
+    cpu.handlers[mem[cpu.pc]](cpu, mem)
+    return 1
+
+
+def may_access_devices(mem, address: int, devices: list) -> bool:
+    """Return whether the data accesses of the instruction at address may reach a page of devices."""
+    length = instruction_length(mem[address])
+    body, _ = generate_instruction(mem[address], Operands(length, mem, address, devices=True))
+    if not any('dev[' in line for line in body):
+        return False
+    _, arguments = INSTRUCTION_SET[mem[address]]
+    page = mem[(address + 2) & 0xffff]
+    if 'absolute' in arguments:
+        pages = (page,)
+    elif 'absolute_indexed' in arguments:
+        pages = (page, (page + 1) & 0xff)
+    else:
+        return True
+    return any(devices[page] is not None for page in pages)
+
+
+def translate_block(mem, start: int, lazy_flags: bool = False, devices: list = None) -> Block:
+    """Translate the basic block at address start into a Python function.
+
+    The function takes the processor and its memory array and returns the number of instructions executed.
+    With lazy_flags it keeps Z and N in nz, as the handlers of a FastProcessor with lazy flags.
+    Given the page table devices, instructions which may access a device are left out of the block.
+    """
+    instructions = []
+    constant_writes = set()
+    address = start
+    while len(instructions) < MAX_BLOCK_LENGTH:
+        length = instruction_length(mem[address])
+        end = address + length
+        # Stop at the stack page, the end of memory and code overwritten by an earlier instruction of the block
+        if end > 0x10000 or (address < 0x200 and end > 0x100):
+            break
+        if any(address <= write < end for write in constant_writes):
+            break
+        if devices is not None and may_access_devices(mem, address, devices):
+            break
+        body, cycles = generate_instruction(mem[address], Operands(length, mem, address, lazy_flags))
+        read, assigned = state_names(body)
+        dynamic_write = False
+        for line in body:
+            match = WRITE_PATTERN.match(line)
+            if match:
+                location = constant(match.group(2))
+                if location is not None:
+                    constant_writes.add(location)
+                elif match.group(2) == 'addr':
+                    dynamic_write = True
+        body = check_code_writes(body)
+        instructions.append((address, end, body, cycles, dynamic_write, read | assigned, assigned))
+        address = end
+        if 'pc' in assigned or 'i' in assigned:
+            break
+    if not instructions:
+        return Block(interpret_instruction, start, start + 1)
+    end = instructions[-1][1]
+
+    names = set().union(*(instruction[5] for instruction in instructions)) - {'pc'}
+    stored = set().union(*(instruction[6] for instruction in instructions)) - {'pc', 'cycles'}
+
+    def exit_lines(indent: str, pc: str, cycles: int, count: int) -> list[str]:
+        lines = [f'{indent}cpu.{name} = {name}' for name in STATE[1:-1] if name in stored]
+        lines += [f'{indent}cpu.pc = {pc}', f'{indent}cpu.cycles = cycles + {cycles}', f'{indent}return {count}']
+        return lines
+
+    lines = [f'def block_{start:04x}(cpu, mem):']
+    if any('cpu.invalidate_code' in line for instruction in instructions for line in instruction[2]):
+        lines.append('    code = cpu.code_pages')
+    lines += [f'    {name} = cpu.{name}' for name in STATE[1:] if name in names | {'cycles'}]
+    total_cycles = 0
+    for count, (address, next_address, body, cycles, dynamic_write, _, assigned) in enumerate(instructions, 1):
+        lines += ['    ' + line for line in body]
+        total_cycles += cycles
+        if dynamic_write and count < len(instructions):
+            lines.append(f'    if {next_address} <= addr < {end}:')
+            lines += exit_lines(' ' * 8, f'0x{next_address:04x}', total_cycles, count)
+    last_assigned = instructions[-1][6]
+    lines += exit_lines('    ', 'pc' if 'pc' in last_assigned else f'0x{end & 0xffff:04x}', total_cycles,
+                        len(instructions))
+    source = '\n'.join(lines) + '\n'
+    namespace = dict(TABLES)
+    exec(compile(source, f'<6502 block ${start:04X}>', 'exec'), namespace)
+    addresses = tuple(instruction[0] for instruction in instructions)
+    max_cycles = total_cycles + sum(int(penalty) for instruction in instructions for line in instruction[2]
+                                    for penalty in PENALTY_PATTERN.findall(line))
+    ends_with_brk = len(addresses) > 1 and mem[addresses[-1]] == BRK
+    return Block(namespace[f'block_{start:04x}'], start, end, addresses, max_cycles, ends_with_brk, source)
+
+
+class TranslatingProcessor(FastProcessor):
+    """FastProcessor executing translated basic blocks.
+
+    run_block executes the whole block at PC, run_instruction still single steps.
+    """
+    __slots__ = ('blocks', 'page_blocks', 'code_pages')
+
+    def __init__(self, memory_size=2 ** 16, lazy_flags: bool = False) -> None:
+        super().__init__(memory_size, lazy_flags)
+        self.handlers = self.base_handlers = LAZY_CHECKED_HANDLERS if lazy_flags else CHECKED_HANDLERS
+        self.blocks = {}
+        self.page_blocks = {}
+        self.code_pages = self.memory.code_pages
+
+    def clear_memory(self) -> None:
+        super().clear_memory()
+        self.invalidate_blocks()
+
+    def invalidate_blocks(self) -> None:
+        self.blocks.clear()
+        self.page_blocks.clear()
+        self.code_pages = self.memory.code_pages
+        self.code_pages[:] = bytes(len(self.code_pages))
+
+    # Evict the blocks containing address, called for stores into pages marked in the code page bitmap
+    def invalidate_code(self, address: int) -> None:
+        page = address >> 8
+        blocks = self.page_blocks.get(page, [])
+        for block in [block for block in blocks if block.start <= address < block.end]:
+            for block_page in range(block.start >> 8, ((block.end - 1) >> 8) + 1):
+                self.page_blocks[block_page].remove(block)
+                if not self.page_blocks[block_page]:
+                    del self.page_blocks[block_page]
+                    self.code_pages[block_page] = 0
+            if self.blocks.get(block.start) is block:
+                del self.blocks[block.start]
+
+    def translate(self, address: int) -> Block:
+        devices = self.memory.devices if self.memory.devices_attached else None
+        return self.add_block(translate_block(self.mem, address, self.lazy_flags, devices))
+
+    # Cache block and mark its pages, so stores into it evict it
+    def add_block(self, block: Block) -> Block:
+        self.blocks[block.start] = block
+        if block.function is not interpret_instruction:
+            self.memory.mark_code(block.start, block.end)
+            for page in range(block.start >> 8, ((block.end - 1) >> 8) + 1):
+                self.page_blocks.setdefault(page, []).append(block)
+        return block
+
+    # Run the basic block at PC, return the number of instructions executed
+    def run_block(self) -> int:
+        self.serve_events()
+        block = self.blocks.get(self.pc)
+        if block is None:
+            block = self.translate(self.pc)
+        return block.function(self, self.mem)
+
+    def run(self, max_cycles: int = None, max_instructions: int = None, until_pc: int = None,
+            stop_on_brk: bool = True) -> RunResult:
+        """Run translated blocks until a stop condition holds, see Processor.run.
+
+        Blocks which could run past a stop condition or the next event are executed instruction by
+        instruction, so the processor stops in exactly the same state as Processor and FastProcessor.
+        """
+        start_cycles = self.cycles
+        cycle_limit = float('inf') if max_cycles is None else start_cycles + max_cycles
+        instruction_limit = float('inf') if max_instructions is None else max_instructions
+        until_pc = -1 if until_pc is None else until_pc
+        brk = BRK if stop_on_brk else -1
+        mem = self.mem
+        blocks = self.blocks
+        handlers = self.handlers
+        events = self.events
+        pending = self.interrupt_requested or self.non_maskable_interrupt_requested
+        executed = 0
+        while True:
+            pc = self.pc
+            if pc == until_pc:
+                reason = STOP_UNTIL_PC
+            elif mem[pc] == brk:
+                reason = STOP_BRK
+            elif executed >= instruction_limit:
+                reason = STOP_MAX_INSTRUCTIONS
+            elif self.cycles >= cycle_limit:
+                reason = STOP_MAX_CYCLES
+            else:
+                if pending or self.cycles >= events.next_cycle:
+                    pending = False
+                    self.serve_events()
+                    handlers[mem[self.pc]](self, mem)
+                    executed += 1
+                    continue
+                block = blocks.get(pc)
+                if block is None:
+                    block = self.translate(pc)
+                if executed + block.length <= instruction_limit and self.cycles + block.max_cycles <= cycle_limit \
+                        and self.cycles + block.max_cycles <= events.next_cycle \
+                        and until_pc not in block.interior and not (stop_on_brk and block.ends_with_brk):
+                    executed += block.function(self, mem)
+                else:
+                    handlers[mem[pc]](self, mem)
+                    executed += 1
+                continue
+            return RunResult(reason, self.cycles - start_cycles, executed)
@@ -0,0 +1,403 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Lockstep execution of many independent processors with NumPy.
+#
+# VectorProcessor holds the state of count processors ("lanes") as arrays: one element per lane
+# for PC, A, X, Y, S, each flag and the cycle counter, and a (count, 0x10000) matrix with the
+# memory of every lane. Each step fetches the opcode at PC of every lane, groups the lanes by
+# opcode and executes each group with one vectorised handler, so the Python overhead of a step
+# is paid per distinct opcode rather than per lane. When all lanes run the same program on
+# different data they mostly share their opcode and the cost of a step hardly grows with count.
+#
+# The handlers are built from generator functions named after the Processor methods in
+# INSTRUCTION_SET, like those of emulator.fast; they take the processor and the array of lanes
+# executing the instruction and return the cycles used. The results of every lane are identical
+# to those of Processor.
+
+import numpy as np
+from emulator.alu_tables import ADC, SBC
+from emulator.opcodes import BRK
+from emulator.processor import INSTRUCTION_SET, STOP_BRK, STOP_MAX_CYCLES, STOP_MAX_INSTRUCTIONS, STOP_UNTIL_PC, \
+    RunResult
+from emulator.fast import IRQ_VECTOR, REGISTERS, RESET_VECTOR, instruction_length
+
+ADC_TABLE = np.frombuffer(ADC, dtype=np.uint16).astype(np.int64)
+SBC_TABLE = np.frombuffer(SBC, dtype=np.uint16).astype(np.int64)
+
+# The generators setting PC themselves, for all others PC advances by the instruction length
+JUMPS = ('branch', 'jump', 'jump_to_subroutine', 'return_from_subroutine', 'brk', 'return_from_interrupt')
+
+
+# Building blocks, taking the lanes executing the instruction
+def byte_at(cpu, lanes, address):
+    return cpu.mem[lanes, address].astype(np.int64)
+
+
+def operand(cpu, lanes, offset: int):
+    return byte_at(cpu, lanes, (cpu.pc[lanes] + offset) & 0xffff)
+
+
+def set_zero_and_negative(cpu, lanes, value) -> None:
+    cpu.z[lanes] = value == 0
+    cpu.n[lanes] = value >> 7
+
+
+def push(cpu, lanes, value) -> None:
+    s = cpu.s[lanes]
+    cpu.mem[lanes, 0x100 + s] = value & 0xff
+    cpu.s[lanes] = (s - 1) & 0xff
+
+
+def pull(cpu, lanes):
+    s = cpu.s[lanes] = (cpu.s[lanes] + 1) & 0xff
+    return byte_at(cpu, lanes, 0x100 + s)
+
+
+def pack_status(cpu, lanes):
+    return cpu.c[lanes] | cpu.z[lanes] << 1 | cpu.i[lanes] << 2 | cpu.d[lanes] << 3 | cpu.b[lanes] << 4 | \
+        cpu.v[lanes] << 6 | cpu.n[lanes] << 7
+
+
+def unpack_status(cpu, lanes, p) -> None:
+    cpu.c[lanes] = p & 1
+    cpu.z[lanes] = p >> 1 & 1
+    cpu.i[lanes] = p >> 2 & 1
+    cpu.d[lanes] = p >> 3 & 1
+    cpu.b[lanes] = p >> 4 & 1
+    cpu.v[lanes] = p >> 6 & 1
+    cpu.n[lanes] = p >> 7
+
+
+# Address modes: return the effective addresses and the cycles used including the opcode fetch
+def address(cpu, lanes, mode: str, index_register: str = None, penalty_cycle=False):
+    lo = operand(cpu, lanes, 1)
+    if mode == 'zero_page':
+        return lo, 2
+    if mode == 'zero_page_indexed':
+        return (lo + getattr(cpu, REGISTERS[index_register])[lanes]) & 0xff, 3
+    hi = operand(cpu, lanes, 2)
+    if mode == 'absolute':
+        return lo | hi << 8, 3
+    if mode == 'absolute_indexed':
+        t = lo + getattr(cpu, REGISTERS[index_register])[lanes]
+        if penalty_cycle:
+            return ((hi << 8) + t) & 0xffff, 4
+        return ((hi << 8) + t) & 0xffff, 3 + (t > 0xff)
+    if mode == 'indexed_indirect_x':
+        p = (lo + cpu.x[lanes]) & 0xff
+        return byte_at(cpu, lanes, p) | byte_at(cpu, lanes, p + 1) << 8, 5
+    if mode == 'indirect_indexed_y':
+        t = byte_at(cpu, lanes, lo) + cpu.y[lanes]
+        return ((byte_at(cpu, lanes, lo + 1) << 8) + t) & 0xffff, 4 + (t > 0xff)
+    raise ValueError(f'Invalid address mode {mode}')
+
+
+# Read operand: return the operand values and the cycles used
+def read(cpu, lanes, mode: str, index_register: str = None):
+    if mode == 'immediate':
+        return operand(cpu, lanes, 1), 2
+    location, cycles = address(cpu, lanes, mode, index_register)
+    return byte_at(cpu, lanes, location), cycles + 1
+
+
+# Generators named after the Processor methods executing the instructions
+def load_register(cpu, lanes, register, mode, index_register=None):
+    value, cycles = read(cpu, lanes, mode, index_register)
+    getattr(cpu, REGISTERS[register])[lanes] = value
+    set_zero_and_negative(cpu, lanes, value)
+    return cycles
+
+
+def store_register(cpu, lanes, register, mode, index_register=None):
+    location, cycles = address(cpu, lanes, mode, index_register, penalty_cycle=True)
+    cpu.mem[lanes, location] = getattr(cpu, REGISTERS[register])[lanes]
+    return cycles + 1
+
+
+def transfer_register(cpu, lanes, source, destination):
+    value = getattr(cpu, REGISTERS[destination])[lanes] = getattr(cpu, REGISTERS[source])[lanes]
+    set_zero_and_negative(cpu, lanes, value)
+    return 2
+
+
+def arithmetic_operation(cpu, lanes, operator, mode, index_register=None):
+    value, cycles = read(cpu, lanes, mode, index_register)
+    a = cpu.a[lanes]
+    if operator in ('adc', 'sbc'):
+        # Carry holds the borrow of the subtraction, as in Processor.alu_operation
+        c = cpu.c[lanes] if operator == 'adc' else 1 - cpu.c[lanes]
+        t = (ADC_TABLE if operator == 'adc' else SBC_TABLE)[cpu.d[lanes] << 17 | c << 16 | a << 8 | value]
+        a = t & 0xff
+        cpu.c[lanes] = (t >> 8) & 1
+        cpu.v[lanes] = t >> 9
+    else:
+        a = {'and_': np.bitwise_and, 'or_': np.bitwise_or, 'xor': np.bitwise_xor}[operator](a, value)
+    cpu.a[lanes] = a
+    set_zero_and_negative(cpu, lanes, a)
+    return cycles
+
+
+def compare(cpu, lanes, register, mode, index_register=None):
+    value, cycles = read(cpu, lanes, mode, index_register)
+    t = getattr(cpu, REGISTERS[register])[lanes] - value
+    cpu.c[lanes] = t >= 0
+    cpu.z[lanes] = t == 0
+    cpu.n[lanes] = (t >> 7) & 1
+    return cycles
+
+
+def bit_test(cpu, lanes, mode, index_register=None):
+    m, cycles = read(cpu, lanes, mode, index_register)
+    cpu.v[lanes] = (m >> 6) & 1
+    cpu.z[lanes] = (cpu.a[lanes] & m) == 0
+    cpu.n[lanes] = m >> 7
+    return cycles
+
+
+# Shift or rotate the values m, return the results
+def shift(cpu, lanes, m, left: bool, rotate: bool):
+    bit_in = cpu.c[lanes] if rotate else 0
+    if left:
+        cpu.c[lanes] = m >> 7
+        return (m << 1 | bit_in) & 0xff
+    cpu.c[lanes] = m & 1
+    return m >> 1 | bit_in << 7
+
+
+def shift_accumulator(cpu, lanes, left=True):
+    a = cpu.a[lanes] = shift(cpu, lanes, cpu.a[lanes], left, rotate=False)
+    set_zero_and_negative(cpu, lanes, a)
+    return 2
+
+
+def shift_memory(cpu, lanes, mode, index_register=None, left=True):
+    location, cycles = address(cpu, lanes, mode, index_register, penalty_cycle=True)
+    r = shift(cpu, lanes, byte_at(cpu, lanes, location), left, rotate=False)
+    cpu.mem[lanes, location] = r
+    set_zero_and_negative(cpu, lanes, r)
+    return cycles + 3
+
+
+def rotate_accumulator(cpu, lanes, left=True):
+    a = cpu.a[lanes] = shift(cpu, lanes, cpu.a[lanes], left, rotate=True)
+    set_zero_and_negative(cpu, lanes, a)
+    return 2
+
+
+def rotate_memory(cpu, lanes, mode, index_register=None, left=True):
+    location, cycles = address(cpu, lanes, mode, index_register, penalty_cycle=True)
+    r = shift(cpu, lanes, byte_at(cpu, lanes, location), left, rotate=True)
+    cpu.mem[lanes, location] = r
+    set_zero_and_negative(cpu, lanes, r)
+    return cycles + 3
+
+
+def increment_register(cpu, lanes, increment, register):
+    registers = getattr(cpu, REGISTERS[register])
+    value = registers[lanes] = (registers[lanes] + increment) & 0xff
+    set_zero_and_negative(cpu, lanes, value)
+    return 2
+
+
+def increment(cpu, lanes, increment, mode, index_register=None):
+    location, cycles = address(cpu, lanes, mode, index_register, penalty_cycle=True)
+    r = (byte_at(cpu, lanes, location) + increment) & 0xff
+    cpu.mem[lanes, location] = r
+    set_zero_and_negative(cpu, lanes, r)
+    return cycles + 3
+
+
+def branch(cpu, lanes, flag, state):
+    taken = getattr(cpu, REGISTERS[flag])[lanes] == int(state)
+    next_pc = (cpu.pc[lanes] + 2) & 0xffff
+    target = (next_pc + (operand(cpu, lanes, 1) ^ 0x80) - 0x80) & 0xffff
+    cpu.pc[lanes] = np.where(taken, target, next_pc)
+    return 2 + np.where(taken, np.where((target ^ next_pc) & 0xff00, 2, 1), 0)
+
+
+def set_flag(cpu, lanes, flag, state):
+    getattr(cpu, REGISTERS[flag])[lanes] = int(state)
+    return 2
+
+
+def push_register_to_stack(cpu, lanes, register):
+    push(cpu, lanes, pack_status(cpu, lanes) if register == 'SR' else getattr(cpu, REGISTERS[register])[lanes])
+    return 3
+
+
+def pull_register_from_stack(cpu, lanes, register):
+    value = pull(cpu, lanes)
+    if register == 'SR':
+        unpack_status(cpu, lanes, value)
+    else:
+        getattr(cpu, REGISTERS[register])[lanes] = value
+    return 4
+
+
+def jump(cpu, lanes, mode):
+    word = operand(cpu, lanes, 1) | operand(cpu, lanes, 2) << 8
+    if mode == 'absolute':
+        cpu.pc[lanes] = word
+        return 3
+    cpu.pc[lanes] = byte_at(cpu, lanes, word) | byte_at(cpu, lanes, (word + 1) & 0xffff) << 8
+    return 5
+
+
+def jump_to_subroutine(cpu, lanes):
+    # The target address is read after pushing the return address, as Processor does
+    t = cpu.pc[lanes] + 2
+    push(cpu, lanes, t >> 8)
+    push(cpu, lanes, t)
+    cpu.pc[lanes] = operand(cpu, lanes, 1) | operand(cpu, lanes, 2) << 8
+    return 6
+
+
+def return_from_subroutine(cpu, lanes):
+    lo = pull(cpu, lanes)
+    cpu.pc[lanes] = ((pull(cpu, lanes) << 8 | lo) + 1) & 0xffff
+    return 6
+
+
+def brk(cpu, lanes):
+    t = cpu.pc[lanes] + 2
+    push(cpu, lanes, t >> 8)
+    push(cpu, lanes, t)
+    cpu.b[lanes] = 1
+    push(cpu, lanes, pack_status(cpu, lanes))
+    cpu.pc[lanes] = byte_at(cpu, lanes, IRQ_VECTOR) | byte_at(cpu, lanes, IRQ_VECTOR + 1) << 8
+    return 7
+
+
+def return_from_interrupt(cpu, lanes):
+    unpack_status(cpu, lanes, pull(cpu, lanes))
+    lo = pull(cpu, lanes)
+    cpu.pc[lanes] = pull(cpu, lanes) << 8 | lo
+    cpu.b[lanes] = 0
+    return 6
+
+
+def no_operation(cpu, lanes):
+    return 1
+
+
+GENERATORS = {
+    generator.__name__: generator for generator in (
+        load_register, store_register, transfer_register, arithmetic_operation, compare, bit_test,
+        shift_accumulator, shift_memory, rotate_accumulator, rotate_memory, increment_register, increment,
+        branch, set_flag, push_register_to_stack, pull_register_from_stack, jump, jump_to_subroutine,
+        return_from_subroutine, brk, return_from_interrupt, no_operation,
+    )
+}
+
+
+def build_handler(opcode: int):
+    method, arguments = INSTRUCTION_SET.get(opcode, ('no_operation', ()))
+    generator = GENERATORS[method]
+    length = instruction_length(opcode)
+
+    if method in JUMPS:
+        def handler(cpu, lanes):
+            cpu.cycles[lanes] += generator(cpu, lanes, *arguments)
+    else:
+        def handler(cpu, lanes):
+            cycles = generator(cpu, lanes, *arguments)
+            cpu.pc[lanes] = (cpu.pc[lanes] + length) & 0xffff
+            cpu.cycles[lanes] += cycles
+    return handler
+
+
+HANDLERS = tuple(build_handler(opcode) for opcode in range(0x100))
+
+
+class VectorProcessor:
+    """count independent processors executing in lockstep, each lane with its own memory.
+
+    Registers, flags and cycles are int64 arrays indexed by lane, each flag a separate 0/1 array;
+    P packs the flags of every lane into status bytes.
+    """
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self.mem = np.zeros((count, 0x10000), dtype=np.uint8)
+        self.pc, self.a, self.x, self.y, self.cycles = (np.zeros(count, dtype=np.int64) for _ in range(5))
+        self.s = np.full(count, 0xff, dtype=np.int64)
+        self.c, self.z, self.i, self.d, self.b, self.v, self.n = (np.zeros(count, dtype=np.int64) for _ in range(7))
+
+    @property
+    def P(self):  # noqa
+        return pack_status(self, slice(None))
+
+    @P.setter
+    def P(self, value):  # noqa
+        unpack_status(self, slice(None), np.asarray(value, dtype=np.int64))
+
+    def load(self, program, address: int = 0x200) -> None:
+        """Store program at address in the memory of every lane and point the reset vector to it."""
+        self.mem[:, address:address + len(program)] = np.frombuffer(bytes(program), dtype=np.uint8)
+        self.mem[:, RESET_VECTOR] = address & 0xff
+        self.mem[:, RESET_VECTOR + 1] = address >> 8
+
+    def reset(self) -> None:
+        self.pc[:] = byte_at(self, slice(None), RESET_VECTOR) | byte_at(self, slice(None), RESET_VECTOR + 1) << 8
+        self.s[:] = 0xff
+        for register in (self.a, self.x, self.y, self.c, self.z, self.i, self.d, self.b, self.v, self.n,
+                         self.cycles):
+            register[:] = 0
+
+    def step(self, lanes=None) -> None:
+        """Execute one instruction in each of the lanes given, by default in all of them."""
+        lanes = np.arange(self.count) if lanes is None else np.asarray(lanes)
+        opcodes = self.mem[lanes, self.pc[lanes]]
+        if (opcodes == opcodes[0]).all():
+            HANDLERS[opcodes[0]](self, lanes)
+            return
+        order = np.argsort(opcodes, kind='stable')
+        values, starts = np.unique(opcodes[order], return_index=True)
+        for opcode, group in zip(values, np.split(lanes[order], starts[1:])):
+            HANDLERS[opcode](self, group)
+
+    def run(self, max_cycles: int = None, max_instructions: int = None, until_pc: int = None,
+            stop_on_brk: bool = True) -> RunResult:
+        """Run every lane until a stop condition holds for it, see Processor.run.
+
+        The fields of the result are arrays by lane; lanes which stopped wait for the others.
+        """
+        start_cycles = self.cycles.copy()
+        executed = np.zeros(self.count, dtype=np.int64)
+        reasons = np.full(self.count, None, dtype=object)
+        active = np.arange(self.count)
+        while active.size:
+            pc = self.pc[active]
+            # Checked in reverse order of precedence, so the first condition holding is recorded
+            conditions = []
+            if max_cycles is not None:
+                conditions.append((STOP_MAX_CYCLES, self.cycles[active] - start_cycles[active] >= max_cycles))
+            if max_instructions is not None:
+                conditions.append((STOP_MAX_INSTRUCTIONS, executed[active] >= max_instructions))
+            if stop_on_brk:
+                conditions.append((STOP_BRK, self.mem[active, pc] == BRK))
+            if until_pc is not None:
+                conditions.append((STOP_UNTIL_PC, pc == until_pc))
+            stopped = np.zeros(active.size, dtype=bool)
+            for reason, condition in conditions:
+                reasons[active[condition]] = reason
+                stopped |= condition
+            active = active[~stopped]
+            if active.size:
+                self.step(active)
+                executed[active] += 1
+        return RunResult(reasons, self.cycles - start_cycles, executed)
@@ -0,0 +1,195 @@
+#     6502Simulator, a didactic visual simulator of the 6502 processor
+#     Copyright (C) 2024  Tobias Bäumlin
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Timers of a 6522 VIA, attached to the processor through emulator.bus:
+#
+#     via = VIA(processor)
+#     Bus(processor).attach(via, 0x6000)
+#
+# The 16 registers repeat through the pages the VIA is attached to. Timer 1 runs one-shot or, with
+# bit 6 of the ACR set, free-running from its latches; timer 2 runs one-shot. The counters are not
+# decremented: each timer keeps the cycle it underflows at, from which the counter values and the
+# flags of the IFR are derived when they are read. Loaded with N, a timer underflows N + 1 cycles
+# later, and free-running timer 1 every N + 2 cycles after that, as the 6522 does.
+#
+# Only a timer whose interrupt is enabled in the IER has an event scheduled, at its next underflow,
+# which sets the flag and asserts the IRQ line: a free-running timer costs one event per period.
+# The line is a level, as on the 6522, without being polled: whenever the IFR or IER change while
+# a flag is set with its interrupt enabled, an event requests an interrupt, which the processor
+# keeps pending while I is set and serves after CLI, PLP or RTI. Once the flags are cleared or
+# disabled, the request is withdrawn. A handler returning without clearing the flags is only
+# interrupted again when they change, as at the next underflow of a free-running timer.
+# The ports, the shift register and the PCR are plain registers without function.
+
+from emulator.bus import Device
+from emulator.processor import Processor
+
+# Register numbers
+ORB, ORA, DDRB, DDRA, T1C_L, T1C_H, T1L_L, T1L_H, T2C_L, T2C_H, SR, ACR, PCR, IFR, IER, ORA_NH = range(16)
+
+# Bits of IFR and IER
+IRQ_T1 = 0x40
+IRQ_T2 = 0x20
+IRQ_ANY = 0x80
+
+ACR_T1_FREE_RUNNING = 0x40
+
+
+class Timer:
+    """Counter of a timer, given by the cycle of its next (or last) underflow."""
+
+    def __init__(self) -> None:
+        self.latch = 0
+        self.underflow = 0
+        # Set while the flag is set at the next underflow
+        self.armed = False
+        self.event = None
+
+    def start(self, cycles: int, value: int) -> None:
+        self.underflow = cycles + value + 1
+        self.armed = True
+
+    def counter(self, cycles: int) -> int:
+        return (self.underflow - cycles - 1) & 0xffff
+
+
+class VIA(Device):
+    """Timers and interrupt registers of a 6522 VIA, counting the cycles of processor."""
+
+    def __init__(self, processor: Processor) -> None:
+        self.processor = processor
+        self.registers = bytearray(16)
+        self.acr = 0
+        self.ifr = 0
+        self.ier = 0
+        self.timer1 = Timer()
+        self.timer2 = Timer()
+        # Event requesting the interrupt of the IRQ line asserted, and whether it requested one
+        self.irq_event = None
+        self.asserted = False
+
+    def update(self) -> None:
+        """Set the flags of the timers which underflowed."""
+        cycles = self.processor.cycles
+        timer = self.timer1
+        if timer.armed and cycles >= timer.underflow:
+            self.ifr |= IRQ_T1
+            if self.acr & ACR_T1_FREE_RUNNING:
+                period = timer.latch + 2
+                timer.underflow += ((cycles - timer.underflow) // period + 1) * period
+            else:
+                timer.armed = False
+        timer = self.timer2
+        if timer.armed and cycles >= timer.underflow:
+            self.ifr |= IRQ_T2
+            timer.armed = False
+
+    def schedule(self) -> None:
+        """Schedule the next underflow of each timer with its interrupt enabled."""
+        events = self.processor.events
+        for timer, flag in ((self.timer1, IRQ_T1), (self.timer2, IRQ_T2)):
+            if timer.event is not None:
+                events.cancel(timer.event)
+                timer.event = None
+            if timer.armed and self.ier & flag:
+                timer.event = events.schedule(timer.underflow, self.underflow)
+
+    def underflow(self, _) -> None:
+        self.update()
+        self.update_interrupt()
+        self.schedule()
+
+    def update_interrupt(self) -> None:
+        """Request an interrupt if a flag is set with its interrupt enabled, else withdraw the request."""
+        events = self.processor.events
+        if self.ifr & self.ier & 0x7f:
+            if self.irq_event is None:
+                self.irq_event = events.schedule(self.processor.cycles, self.assert_interrupt)
+            return
+        if self.irq_event is not None:
+            events.cancel(self.irq_event)
+            self.irq_event = None
+        if self.asserted:
+            self.processor.interrupt_requested = False
+            self.asserted = False
+
+    def assert_interrupt(self, _) -> None:
+        self.irq_event = None
+        self.processor.interrupt_requested = self.asserted = True
+
+    def read(self, address: int) -> int:
+        register = address & 0x0f
+        self.update()
+        cycles = self.processor.cycles
+        if register == T1C_L:
+            self.ifr &= ~IRQ_T1
+            self.update_interrupt()
+            return self.timer1.counter(cycles) & 0xff
+        if register == T1C_H:
+            return self.timer1.counter(cycles) >> 8
+        if register == T1L_L:
+            return self.timer1.latch & 0xff
+        if register == T1L_H:
+            return self.timer1.latch >> 8
+        if register == T2C_L:
+            self.ifr &= ~IRQ_T2
+            self.update_interrupt()
+            return self.timer2.counter(cycles) & 0xff
+        if register == T2C_H:
+            return self.timer2.counter(cycles) >> 8
+        if register == ACR:
+            return self.acr
+        if register == IFR:
+            return self.ifr | (IRQ_ANY if self.ifr & self.ier & 0x7f else 0)
+        if register == IER:
+            return self.ier | IRQ_ANY
+        return self.registers[register]
+
+    def write(self, address: int, value: int) -> None:
+        register = address & 0x0f
+        flags = self.ifr, self.ier
+        self.update()
+        cycles = self.processor.cycles
+        if register in (T1C_L, T1L_L):
+            self.timer1.latch = self.timer1.latch & 0xff00 | value
+        elif register == T1C_H:
+            self.timer1.latch = self.timer1.latch & 0xff | value << 8
+            self.ifr &= ~IRQ_T1
+            self.timer1.start(cycles, self.timer1.latch)
+        elif register == T1L_H:
+            self.timer1.latch = self.timer1.latch & 0xff | value << 8
+            self.ifr &= ~IRQ_T1
+        elif register == T2C_L:
+            self.timer2.latch = value
+        elif register == T2C_H:
+            self.ifr &= ~IRQ_T2
+            self.timer2.start(cycles, value << 8 | self.timer2.latch)
+        elif register == ACR:
+            self.acr = value
+        elif register == IFR:
+            self.ifr &= ~value & 0x7f
+        elif register == IER:
+            if value & IRQ_ANY:
+                self.ier |= value & 0x7f
+            else:
+                self.ier &= ~value & 0x7f
+        else:
+            self.registers[register] = value
+        # A flag set before its interrupt was enabled interrupts right away
+        if (self.ifr, self.ier) != flags:
+            self.update_interrupt()
+        self.schedule()
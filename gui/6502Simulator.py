@@ -15,9 +15,12 @@
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import argparse
 import sys
 import signal
 from PySide6 import QtWidgets
+from emulator.acia import DEFAULT_ADDRESS
+from emulator.bus import parse_address
 from gui.simulator_gui import Simulator
 
 
@@ -26,9 +29,14 @@ def SIGSEGV_signal_arises(signalNum, stack): pass
 
 signal.signal(signal.SIGSEGV, SIGSEGV_signal_arises)
 
-app = QtWidgets.QApplication(sys.argv)
+parser = argparse.ArgumentParser(description='Didactic visual simulator of the 6502 processor.')
+parser.add_argument('--console', nargs='?', const=f'${DEFAULT_ADDRESS:04X}', type=parse_address, metavar='ADDRESS',
+                    help=f'attach an ACIA with a console window, at ${DEFAULT_ADDRESS:04X} unless given')
+arguments, qt_arguments = parser.parse_known_args()
 
-window = Simulator()
+app = QtWidgets.QApplication(sys.argv[:1] + qt_arguments)
+
+window = Simulator(console_address=arguments.console)
 
 window.show()
 app.exec()
@@ -17,7 +17,7 @@
 
 import time
 from PySide6.QtCore import QObject, Signal
-from emulator.processor import Processor
+from emulator.processor import Processor, REGISTER_ID_NAMES, REG_A, REG_RES, REG_SR
 from emulator.operators import set_bit
 from gui.bus_geometry import AnimationPaths
 
@@ -32,10 +32,10 @@ ADDRESS_MODES_SHORT = {
 }
 
 
-def build_address_mode_string(mode: str, index_register: str) -> str:
+def build_address_mode_string(mode: str, index_register: int) -> str:
     result = ADDRESS_MODES_SHORT[mode]
-    if index_register:
-        result += ',' + index_register
+    if index_register is not None:
+        result += ',' + REGISTER_ID_NAMES[index_register]
     return result
 
 
@@ -284,11 +284,11 @@ class ProcessorVisualization(QObject, Processor):
         self.window.show_page(self.memory.data[self.reset_vector_address])
         self.window.show_memory_address(self.PC)
 
-    def set_zero_and_negative_status_flags(self, register: str = 'RES') -> None:
+    def set_zero_and_negative_status_flags(self, register: int = REG_RES) -> None:
         super().set_zero_and_negative_status_flags(register)
         if self.window.animation_mode:
             data = f'N:{self.N} Z:{self.Z}'
-            path = AnimationPaths[register]['SR']
+            path = AnimationPaths[REGISTER_ID_NAMES[register]]['SR']
             self.animate_data_transfer({'path': path, 'data': data})
 
     def alu_operation(self, operator):
@@ -299,12 +299,17 @@ class ProcessorVisualization(QObject, Processor):
         super().cycle()
         self.update_label('cycle_counter', f'{self.cycles}')
 
-    def copy_byte(self, from_register: str, to_register: str) -> None:
+    # Registers are written through their properties, which update the labels
+    def copy_byte(self, source: int, destination: int) -> None:
+        from_register, to_register = REGISTER_ID_NAMES[source], REGISTER_ID_NAMES[destination]
+        data = self.__getattribute__(from_register)
         if self.window.animation_mode:
-            data = self.__getattribute__(from_register)
             self.animate_data_transfer({'path': AnimationPaths[from_register][to_register],
                                         'data': f'{data:{self.byte_format}}'})
-        super().copy_byte(from_register, to_register)
+        setattr(self, to_register, data)
+
+    def copy_constant(self, value: int, register: int):
+        setattr(self, REGISTER_ID_NAMES[register], value)
 
     def fetch_byte(self) -> int:
         if self.window.animation_mode:
@@ -320,17 +325,18 @@ class ProcessorVisualization(QObject, Processor):
         byte = super().fetch_byte()
         return byte
 
-    def fetch_byte_to_register(self, register: str) -> None:
+    def fetch_byte_to_register(self, register: int) -> None:
+        name = REGISTER_ID_NAMES[register]
         byte = self.fetch_byte()
         if self.window.animation_mode:
             if self.ARH == 0:
-                path = AnimationPaths['ZD'][register]
+                path = AnimationPaths['ZD'][name]
             elif self.ARH == 1:
-                path = AnimationPaths['SD'][register]
+                path = AnimationPaths['SD'][name]
             else:
-                path = AnimationPaths['MD'][register]
+                path = AnimationPaths['MD'][name]
             self.animate_data_transfer({'path': path, 'data': f'{byte:{self.byte_format}}'})
-        setattr(self, register, byte)
+        setattr(self, name, byte)
 
     def fetch_byte_at_pc(self) -> int:
         if self.window.animation_mode:
@@ -348,17 +354,18 @@ class ProcessorVisualization(QObject, Processor):
             self.update_label('program_counter_low_byte', self.PCL)
         return super().fetch_byte_at_pc()
 
-    def fetch_byte_at_pc_to_register(self, register: str) -> None:
+    def fetch_byte_at_pc_to_register(self, register: int) -> None:
+        name = REGISTER_ID_NAMES[register]
         byte = self.fetch_byte_at_pc()
         if self.window.animation_mode:
             if self.PCH == 0:
-                path = AnimationPaths['ZD'][register]
+                path = AnimationPaths['ZD'][name]
             elif self.PCH == 1:
-                path = AnimationPaths['SD'][register]
+                path = AnimationPaths['SD'][name]
             else:
-                path = AnimationPaths['MD'][register]
+                path = AnimationPaths['MD'][name]
             self.animate_data_transfer({'path': path, 'data': f'{byte:{self.byte_format}}'})
-        setattr(self, register, byte)
+        setattr(self, name, byte)
 
     def put_byte(self, byte: int) -> None:
         super().put_byte(byte)
@@ -369,20 +376,21 @@ class ProcessorVisualization(QObject, Processor):
         if self.AR in (self.nmi_vector_address, self.nmi_vector_address+1):
             self.update_label('nmi_vector', f'${self.word(self.nmi_vector_address):04X}')
 
-    def put_byte_from_register(self, register: str) -> None:
+    def put_byte_from_register(self, register: int) -> None:
+        name = REGISTER_ID_NAMES[register]
         if self.window.animation_mode:
-            data = f'{getattr(self, register):{self.byte_format}}'
+            data = f'{getattr(self, name):{self.byte_format}}'
         super().put_byte_from_register(register)
         if self.window.animation_mode:
             if self.ARH == 0:
-                path = AnimationPaths[register]['ZD']
+                path = AnimationPaths[name]['ZD']
             elif self.ARH == 1:
-                path = AnimationPaths[register]['SD']
+                path = AnimationPaths[name]['SD']
             else:
-                path = AnimationPaths[register]['MD']
+                path = AnimationPaths[name]['MD']
             self.animate_data_transfer({'path': path, 'data': data})
         self.cycle()
-        self.memory.data[self.AR] = getattr(self, register)
+        self.memory.data[self.AR] = getattr(self, name)
         self.show_address_signal.emit(self.AR)
 
     def set_address_register_from_stack_pointer(self) -> None:
@@ -401,43 +409,44 @@ class ProcessorVisualization(QObject, Processor):
         super().run_instruction()
 
     # Processor instructions
-    def load_register(self, register: str, mode: str, index_register=None) -> None:
-        self.CI = f'LD{register} {build_address_mode_string(mode, index_register)}'
+    def load_register(self, register: int, mode: str, index_register=None) -> None:
+        self.CI = f'LD{REGISTER_ID_NAMES[register]} {build_address_mode_string(mode, index_register)}'
         self.show_cycle_status('run')
         super().load_register(register, mode, index_register)
 
-    def store_register(self, register: str, mode: str, index_register: str = None) -> None:
-        self.CI = f'ST{register} {build_address_mode_string(mode, index_register)}'
+    def store_register(self, register: int, mode: str, index_register: int = None) -> None:
+        self.CI = f'ST{REGISTER_ID_NAMES[register]} {build_address_mode_string(mode, index_register)}'
         self.show_cycle_status('run')
         super().store_register(register, mode, index_register)
 
-    def transfer_register(self, source: str, destination: str) -> None:
-        self.CI = f'T{source}{destination}'
+    def transfer_register(self, source: int, destination: int) -> None:
+        from_register, to_register = REGISTER_ID_NAMES[source], REGISTER_ID_NAMES[destination]
+        self.CI = f'T{from_register}{to_register}'
         self.show_cycle_status('run')
         if self.window.animation_mode:
-            path = AnimationPaths[source][destination]
+            path = AnimationPaths[from_register][to_register]
             self.animate_data_transfer({'path': path,
-                                        'data': str(getattr(self, source))})
+                                        'data': str(getattr(self, from_register))})
         super().transfer_register(source, destination)
 
-    def arithmetic_operation(self, operator: str, mode: str, index_register: str = None) -> None:
+    def arithmetic_operation(self, operator: str, mode: str, index_register: int = None) -> None:
         self.CI = f'{operator[0:3].upper()} {build_address_mode_string(mode, index_register)}'
         self.show_cycle_status('run')
         super().arithmetic_operation(operator, mode, index_register)
         if mode == 'immediate':
             self.CI = self.CI[:3] + f' ${self.memory.data[self.AR]:02X}'
 
-    def compare(self, register: str, mode: str, index_register: str = None) -> None:
-        if register == 'A':
+    def compare(self, register: int, mode: str, index_register: int = None) -> None:
+        if register == REG_A:
             self.CI = f'CMP {build_address_mode_string(mode, index_register)}'
         else:
-            self.CI = f'CP{register} {build_address_mode_string(mode, index_register)}'
+            self.CI = f'CP{REGISTER_ID_NAMES[register]} {build_address_mode_string(mode, index_register)}'
         self.show_cycle_status('run')
         super().compare(register, mode, index_register)
         if mode == 'immediate':
             self.CI = self.CI[:3] + f' ${self.memory.data[self.AR]:02X}'
 
-    def bit_test(self, mode: str, index_register: str = None) -> None:
+    def bit_test(self, mode: str, index_register: int = None) -> None:
         self.CI = f'BIT {build_address_mode_string(mode, index_register)}'
         self.show_cycle_status('run')
         super().bit_test(mode, index_register)
@@ -474,15 +483,15 @@ class ProcessorVisualization(QObject, Processor):
         self.show_cycle_status('run')
         super().rotate_memory(mode, index_register, left)
 
-    def increment_register(self, increment: int, register: str) -> None:
+    def increment_register(self, increment: int, register: int) -> None:
         if increment == 1:
-            self.CI = f'IN{register}'
+            self.CI = f'IN{REGISTER_ID_NAMES[register]}'
         else:
-            self.CI = f'DE{register}'
+            self.CI = f'DE{REGISTER_ID_NAMES[register]}'
         self.show_cycle_status('run')
         super().increment_register(increment, register)
 
-    def increment(self, increment: int, mode: str, index_register: str = None) -> None:  # noqa 252
+    def increment(self, increment: int, mode: str, index_register: int = None) -> None:  # noqa 252
         if increment == 1:
             self.CI = f'INC {build_address_mode_string(mode, index_register)}'
         else:
@@ -521,19 +530,19 @@ class ProcessorVisualization(QObject, Processor):
             self.animate_data_transfer({'path': AnimationPaths['IR']['SR'], 'data': f'{flag}:{int(state)}'})
         super().set_flag(flag, state)
 
-    def push_register_to_stack(self, register: str) -> None:
-        if register == 'SR':
+    def push_register_to_stack(self, register: int) -> None:
+        if register == REG_SR:
             self.CI = 'PHP'
-        elif register == 'A':
+        elif register == REG_A:
             self.CI = 'PHA'
         self.show_cycle_status('run')
         super().push_register_to_stack(register)
         self.show_stack()
 
-    def pull_register_from_stack(self, register: str) -> None:
-        if register == 'SR':
+    def pull_register_from_stack(self, register: int) -> None:
+        if register == REG_SR:
             self.CI = 'PLP'
-        elif register == 'A':
+        elif register == REG_A:
             self.CI = 'PLA'
         self.show_cycle_status('run')
         super().pull_register_from_stack(register)
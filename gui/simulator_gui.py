@@ -18,14 +18,17 @@
 from pathlib import Path
 from functools import partial
 from PySide6.QtCore import Qt, QObject, QThread, Signal, Slot, QPoint
-from PySide6.QtWidgets import QLCDNumber, QInputDialog, QFileDialog, QMessageBox
+from PySide6.QtWidgets import QLCDNumber, QInputDialog, QFileDialog, QMessageBox, QDockWidget
 
 from asm.assembler_helpers import parse_num
+from emulator.acia import ACIA
+from emulator.bus import Bus
 from emulator.processor import UndefinedInstructionError
 from gui.bus_geometry import AnimationPaths
 from gui.animations import build_animation
 from gui.processor_visualization import ProcessorVisualization
 from gui.emulator_window import EmulatorWindow
+from gui.widgets import ConsoleWidget
 from asm.assembler import AssemblerError, assemble_file
 
 REGISTER_NAMES = {
@@ -96,8 +99,9 @@ class Simulator(EmulatorWindow):
     halt_signal = Signal()
     interrupt_signal = Signal()
     nminterrupt_signal = Signal()
+    console_output_signal = Signal(bytes)
 
-    def __init__(self):
+    def __init__(self, console_address: int = None):
         super().__init__()
 
         self.setup()
@@ -108,6 +112,20 @@ class Simulator(EmulatorWindow):
         self.interrupt_signal.connect(self.processor.request_interrupt)
         self.nminterrupt_signal.connect(self.processor.request_unmaskable_interrupt)
 
+        # Serial console, only with console_address, where an ACIA is attached: the processor runs
+        # in a worker thread, the signal hands the output to the GUI thread. It is slow enough for
+        # every byte to be shown when it is transmitted. The keys typed are queued by acia.receive,
+        # which is safe to call from the GUI thread.
+        self.acia = self.console = None
+        if console_address is not None:
+            self.acia = ACIA(output=self.console_output_signal.emit, chunk_size=1)
+            Bus(self.processor).attach(self.acia, console_address)
+            self.console = ConsoleWidget(self, self.acia)
+            self.console_output_signal.connect(self.console.append_output)
+            self.console_dock = QDockWidget('Console', self)
+            self.console_dock.setWidget(self.console)
+            self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.console_dock)
+
         self.shown_page = 2
         self.shown_page_col = 0
         self.shown_page_row = 0
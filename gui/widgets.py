@@ -15,8 +15,8 @@
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from PySide6.QtWidgets import QFrame, QLabel, QLCDNumber
-from PySide6.QtGui import QFont
+from PySide6.QtWidgets import QFrame, QLabel, QLCDNumber, QPlainTextEdit
+from PySide6.QtGui import QFont, QTextCursor
 from PySide6.QtCore import Qt
 
 
@@ -58,3 +58,28 @@ class RegisterWidget(QLabel):
             else:
                 arg = str(arg)
         super().setText(arg)
+
+
+class ConsoleWidget(QPlainTextEdit):
+    """Terminal of an ACIA: shows the bytes it transmits and hands the keys typed to it."""
+
+    def __init__(self, parent, acia):
+        super().__init__(parent)
+        self.acia = acia
+        self.setReadOnly(True)
+        font = QFont('Monospace')
+        font.setStyleHint(QFont.TypeWriter)
+        self.setFont(font)
+
+    def keyPressEvent(self, event):
+        text = event.text()
+        if text:
+            # Queued for the worker thread running the processor
+            self.acia.receive(text.encode('latin-1', 'replace'))
+        else:
+            super().keyPressEvent(event)
+
+    def append_output(self, data: bytes):
+        self.moveCursor(QTextCursor.End)
+        self.insertPlainText(data.decode('latin-1').replace('\r\n', '\n').replace('\r', '\n'))
+        self.ensureCursorVisible()
@@ -0,0 +1,84 @@
+import io
+import threading
+import unittest
+from emulator.acia import ACIA, STATUS, STATUS_RDRF, STATUS_TDRE
+from emulator.batch import Job, format_result, load_image, run_job
+from emulator.bus import Bus
+from emulator.fast import FastProcessor
+from emulator.opcodes import *
+from emulator.processor import Processor
+from test_batch import MULT_PROGRAM
+from test_fast_processor import load_program
+
+# Transmit the characters received in upper case until a '.'
+UPPER_CASE_PROGRAM = [
+    LDA_ABSOLUTE, 0x01, 0xf0, AND_IMMEDIATE, 0x08, BEQ, 0xf9,
+    LDA_ABSOLUTE, 0x00, 0xf0, CMP_IMMEDIATE, ord('.'), BEQ, 0x08,
+    AND_IMMEDIATE, 0xdf, STA_ABSOLUTE, 0x00, 0xf0, JMP_ABSOLUTE, 0x00, 0x02,
+    BRK,
+]
+
+
+def run_upper_case(processor, acia: ACIA, max_cycles: int = 100_000) -> str:
+    load_program(processor, UPPER_CASE_PROGRAM)
+    Bus(processor).attach(acia, 0xf000)
+    return processor.run(max_cycles=max_cycles).reason
+
+
+class BlockingInput:
+    """Stream whose reads block until released."""
+
+    def __init__(self) -> None:
+        self.released = threading.Event()
+
+    def read(self, size: int) -> bytes:
+        self.released.wait()
+        return b''
+
+
+class ACIATest(unittest.TestCase):
+    @staticmethod
+    def test_byte_queues():
+        for processor in (Processor(), FastProcessor()):
+            acia = ACIA()
+            acia.receive(b'hello')
+            acia.receive(b'6502.')
+            assert run_upper_case(processor, acia) == 'brk'
+            assert acia.transmitted == b'HELLO\x16\x15\x10\x12'
+            assert acia.read(0xf000 + STATUS) == STATUS_TDRE
+
+    @staticmethod
+    def test_streams_in_chunks():
+        chunks = []
+        acia = ACIA(io.BytesIO(b'abcdefghij.'), chunks.append, chunk_size=4)
+        # The program polls the status register until the reader thread has queued the input
+        assert run_upper_case(FastProcessor(), acia, max_cycles=None) == 'brk'
+        assert chunks == [b'ABCD', b'EFGH']
+        acia.flush()
+        assert chunks == [b'ABCD', b'EFGH', b'IJ']
+
+    @staticmethod
+    def test_waiting_for_input_neither_flushes_nor_blocks():
+        chunks = []
+        # A pipe without data: reading the status register must not wait for it
+        acia = ACIA(BlockingInput(), chunks.append)
+        acia.receive(b'ok')
+        # Without the '.' the program waits for more input until the cycle budget is used
+        assert run_upper_case(Processor(), acia) == 'max_cycles'
+        assert not chunks and acia.transmitted == b'OK'
+        acia.receive(b'!')
+        assert acia.read(0xf000 + STATUS) == STATUS_TDRE | STATUS_RDRF
+        acia.flush()
+        assert chunks == [b'OK'] and not acia.transmitted
+
+    @staticmethod
+    def test_batch_serial_output():
+        image = load_image(MULT_PROGRAM)
+        result = run_job(Job(MULT_PROGRAM, {0x10: b'\x02\x03'}, serial_address=0xf000, serial_input=b'x'), image)
+        assert result.registers[1] == 6 and result.serial_output == b''
+        assert format_result(result)['serial_output'] == ''
+        assert run_job(Job(MULT_PROGRAM), image).serial_output is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from emulator.alu_tables import *
+from emulator.operators import adc, sbb, cmp, shl, shr, inc, bcd_addition_with_carry, bcd_subtraction_with_borrow
+
+
+def unpack(entry: int) -> (int, int, int):
+    return entry & 0xff, (entry >> CARRY_SHIFT) & 1, entry >> OVERFLOW_SHIFT
+
+
+class AluTablesTest(unittest.TestCase):
+    @staticmethod
+    def test_binary_arithmetic():
+        for a in range(0x100):
+            for b in range(0x100):
+                for c in (0, 1):
+                    assert unpack(ADC[alu_index(a, b, c)]) == adc(a, b, c), (a, b, c)
+                    assert unpack(SBC[alu_index(a, b, c)]) == sbb(a, b, c), (a, b, c)
+
+    @staticmethod
+    def test_decimal_arithmetic():
+        for a in range(0x100):
+            for b in range(0x100):
+                for c in (0, 1):
+                    result, carry = bcd_addition_with_carry(a, b, c)
+                    assert unpack(ADC[alu_index(a, b, c, 1)]) == (result & 0xff, carry, adc(a, b, c)[2]), (a, b, c)
+                    result, borrow = bcd_subtraction_with_borrow(a, b, c)
+                    assert unpack(SBC[alu_index(a, b, c, 1)]) == (result & 0xff, borrow, sbb(a, b, c)[2]), (a, b, c)
+
+    @staticmethod
+    def test_decimal_addition():
+        assert unpack(ADC[alu_index(0x19, 0x28, 0, 1)]) == (0x47, 0, 0)
+        assert unpack(ADC[alu_index(0x99, 0x01, 0, 1)])[:2] == (0x00, 1)
+        assert unpack(SBC[alu_index(0x42, 0x13, 1, 1)])[:2] == (0x28, 0)
+        assert unpack(SBC[alu_index(0x00, 0x01, 0, 1)])[:2] == (0x99, 1)
+
+    @staticmethod
+    def test_compare():
+        for a in range(0x100):
+            for b in range(0x100):
+                flags = CMP[a << 8 | b]
+                assert (flags & 1, (flags >> 1) & 1, flags >> 2) == cmp(a, b), (a, b)
+
+    @staticmethod
+    def test_shift_and_increment():
+        for byte in range(0x100):
+            for bit_in in (0, 1):
+                entry = SHL[bit_in << 8 | byte]
+                assert (entry & 0xff, entry >> CARRY_SHIFT) == shl(byte, bit_in)
+                entry = SHR[bit_in << 8 | byte]
+                assert (entry & 0xff, entry >> CARRY_SHIFT) == shr(byte, bit_in)
+            assert INC[byte] == inc(byte, 1)
+            assert DEC[byte] == inc(byte, -1)
+            assert ZERO_NEGATIVE[byte] == int(byte == 0) | int(byte >= 0x80) << 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from emulator.batch import Job, load_image, main, run_batch, run_job
+from emulator.bus import Bus, Device
+from emulator.fast import FastProcessor
+
+MULT_PROGRAM = str(Path(__file__).parent.parent / 'examples' / 'mult1.asm')
+
+
+class BatchTest(unittest.TestCase):
+    @staticmethod
+    def test_run_job():
+        image = load_image(MULT_PROGRAM)
+        assert image[0x200] == 0x20 and image[0xfffc:0xfffe] == b'\x00\x02'
+        result = run_job(Job(MULT_PROGRAM, {0x10: b'\x03\x05'}, memory_ranges=((0x10, 0x12),)), image)
+        assert result.registers[1] == 15
+        assert result.memory == (b'\x03\x05',)
+        assert result.reason == 'brk'
+
+    @staticmethod
+    def test_run_batch():
+        jobs = [Job(MULT_PROGRAM, {0x10: bytes((x, y))}) for x in range(6) for y in range(6)]
+        results = list(run_batch(jobs, max_workers=2))
+        assert [result.registers[1] for result in results] == [x * y for x in range(6) for y in range(6)]
+
+    @staticmethod
+    def test_cycle_budget_and_registers():
+        # Registers are set after the reset, so the preset PC is where the second job starts
+        jobs = [Job(MULT_PROGRAM, {0x10: b'\xff\x01'}, max_cycles=100), Job(MULT_PROGRAM, registers={'PC': 0x209})]
+        budget, brk = run_batch(jobs, max_workers=1)
+        assert budget.reason == 'max_cycles' and budget.cycles >= 100
+        assert brk.registers[0] == 0x209 and brk.instructions == 0
+
+    @staticmethod
+    def test_reused_processor_starts_clean():
+        image = load_image(MULT_PROGRAM)
+        processor = FastProcessor()
+        serial = run_job(Job(MULT_PROGRAM, {0x10: b'\x02\x03'}, serial_address=0xf000, serial_input=b'x'), image,
+                         processor)
+        assert serial.registers[1] == 6
+        # Left over by a job which was interrupted or attached devices of its own
+        processor.events.schedule_interrupt(processor, 10)
+        processor.non_maskable_interrupt_requested = True
+        Bus(processor).attach(Device(), 0x1000)
+        plain = Job(MULT_PROGRAM, {0x10: b'\x04\x05'})
+        assert run_job(plain, image, processor) == run_job(plain, image)
+        assert not processor.memory.devices_attached and not processor.events
+
+    @staticmethod
+    def test_main():
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'jobs.json'
+            path.write_text(json.dumps([
+                {'program': MULT_PROGRAM, 'memory': {'$10': '0407'}, 'max_cycles': 1000,
+                 'memory_ranges': [['0x10', 18]]},
+            ]))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                main([str(path), '--workers', '1'])
+            result = json.loads(output.getvalue())
+            assert result['registers']['A'] == 28
+            assert result['memory'] == ['0407']
+            assert result['reason'] == 'brk'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from emulator.processor import Processor, STOP_BREAKPOINT, STOP_BRK, STOP_WATCHPOINT, BreakpointHit
+from emulator.breakpoints import Breakpoints, compile_condition
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+def sort_processor() -> (Processor, Breakpoints):
+    processor = Processor()
+    load_program(processor, SORT_PROGRAM)
+    return processor, Breakpoints(processor)
+
+
+class BreakpointsTest(unittest.TestCase):
+    @staticmethod
+    def test_breakpoint_and_continue():
+        processor, breakpoints = sort_processor()
+        breakpoints.add_breakpoint(0x204)
+        result = processor.run()
+        assert result.reason == STOP_BREAKPOINT and result.instructions == 2
+        assert processor.PC == 0x204
+        # Continuing skips the breakpoint stopped at once
+        result = processor.run()
+        assert result.reason == STOP_BREAKPOINT and result.instructions == 6
+        assert processor.X == 1
+
+    @staticmethod
+    def test_conditional_breakpoint():
+        processor, breakpoints = sort_processor()
+        breakpoints.add_breakpoint(0x204, 'X == $10 and mem[$1000] == 0x20')
+        processor.run()
+        assert processor.PC == 0x204 and processor.X == 0x10
+        assert compile_condition('A + C')(processor, processor.memory.data) == processor.A + processor.C
+
+    @staticmethod
+    def test_watchpoints():
+        processor, breakpoints = sort_processor()
+        breakpoints.add_watchpoint(0x1010, 0x1020)
+        result = processor.run()
+        # The STA $1000,X storing to $1010 completed
+        assert result.reason == STOP_WATCHPOINT and breakpoints.hit.address == 0x1010
+        assert processor.PC == 0x207 and processor.memory.data[0x1010] == 0x10
+        breakpoints.remove_watchpoint(0x1010, 0x1020)
+        breakpoints.add_watchpoint(0x20, read=True, write=False)
+        processor.run()
+        # CPX $20 read it
+        assert breakpoints.hit.address == 0x20 and processor.PC == 0x22a
+
+    @staticmethod
+    def test_no_checks_when_cleared():
+        processor, breakpoints = sort_processor()
+        reference = Processor()
+        load_program(reference, SORT_PROGRAM)
+        breakpoints.add_breakpoint(0x204, 'A == 0')
+        breakpoints.add_watchpoint(0x1000, 0x1020, read=True)
+        assert 'put_byte' in processor.__dict__
+        breakpoints.remove_watchpoint(0x1000, 0x1020, read=True)
+        breakpoints.remove_breakpoint(0x204, 'A == 0')
+        assert not {'fetch_instruction', 'fetch_byte', 'put_byte'} & set(processor.__dict__)
+        assert processor.run().reason == STOP_BRK
+        reference.run()
+        assert processor_state(processor) == processor_state(reference)
+
+    @staticmethod
+    def test_run_instruction_raises():
+        processor, breakpoints = sort_processor()
+        breakpoints.add_breakpoint(0x200)
+        try:
+            processor.run_instruction()
+        except BreakpointHit as hit:
+            assert hit.address == 0x200 and processor.cycles == 0
+        else:
+            assert False
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import tempfile
+import unittest
+from emulator.acia import ACIA
+from emulator.bus import Bus, Device
+from emulator.fast import HANDLERS, FastProcessor
+from emulator.microcode import MicrocodeProcessor
+from emulator.opcodes import *
+from emulator.processor import Processor
+from emulator.recompiler import RecompiledProcessor, recompile
+from emulator.translator import CHECKED_HANDLERS, TranslatingProcessor, interpret_instruction, \
+    may_access_devices
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+class Recorder(Device):
+    """Device with 16 registers, recording the accesses and the cycles of processor they happened at."""
+
+    def __init__(self, processor=None) -> None:
+        self.processor = processor
+        self.registers = bytearray(16)
+        self.accesses = []
+        self.cycles = []
+
+    def read(self, address: int) -> int:
+        self.accesses.append(('read', address))
+        if self.processor is not None:
+            self.cycles.append(self.processor.cycles)
+        return self.registers[address & 0x0f]
+
+    def write(self, address: int, value: int) -> None:
+        self.accesses.append(('write', address, value))
+        if self.processor is not None:
+            self.cycles.append(self.processor.cycles)
+        self.registers[address & 0x0f] = value
+
+
+# Copy $6001 to $6002 through A, increment $6012, a mirror of $6002, and store it in zero page and RAM
+DEVICE_PROGRAM = [
+    LDA_ABSOLUTE, 0x01, 0x60, STA_ABSOLUTE, 0x02, 0x60, LDX_IMMEDIATE, 0x10, INC_ABSOLUTE_X, 0x02, 0x60,
+    LDA_ABSOLUTE, 0x02, 0x60, STA_ZERO_PAGE, 0x20, STA_ABSOLUTE, 0x00, 0x30, BRK,
+]
+
+
+class BusTest(unittest.TestCase):
+    @staticmethod
+    def test_processors_access_devices():
+        states, accesses, cycles = [], [], []
+        processors = (Processor(), FastProcessor(), FastProcessor(lazy_flags=True), TranslatingProcessor(),
+                      TranslatingProcessor(lazy_flags=True), MicrocodeProcessor())
+        for processor in processors:
+            load_program(processor, DEVICE_PROGRAM)
+            device = Recorder(processor)
+            device.registers[1] = 0x41
+            Bus(processor).attach(device, 0x6000)
+            processor.run(max_instructions=100)
+            assert device.registers[2] == 0x42
+            assert processor.memory.data[0x20] == processor.memory.data[0x3000] == 0x42
+            assert processor.memory.data[0x6002] == 0
+            states.append(processor_state(processor))
+            accesses.append(device.accesses)
+            cycles.append(device.cycles)
+        assert all(state == states[0] for state in states)
+        # Accesses happen in the last cycle of their instruction, the write of INC in the last but one
+        assert all(cycle == [4, 8, 15, 16, 21] for cycle in cycles)
+        assert all(access == [('read', 0x6001), ('write', 0x6002, 0x41), ('read', 0x6012), ('write', 0x6012, 0x42),
+                              ('read', 0x6002)] for access in accesses)
+
+    @staticmethod
+    def test_translated_blocks_leave_out_device_accesses():
+        processor = TranslatingProcessor()
+        load_program(processor, SORT_PROGRAM)
+        processor.run(max_instructions=20)
+        assert processor.blocks
+        bus = Bus(processor)
+        device = Recorder(processor)
+        # The sort program fills and sorts $1000 to $101F
+        bus.attach(device, 0x1000)
+        assert not processor.blocks and processor.handlers is not CHECKED_HANDLERS
+        processor.run(max_instructions=20000)
+        assert all(address >> 8 == 0x10 for _, address, *_ in device.accesses) and device.accesses
+        # STA $1000,X at $0204 is interpreted, no translated instruction can access the device
+        assert processor.blocks[0x204].function is interpret_instruction
+        for block in processor.blocks.values():
+            if block.function is not interpret_instruction:
+                assert not any(may_access_devices(processor.mem, address, processor.memory.devices)
+                               for address in block.interior | {block.start})
+        bus.detach(device)
+        assert processor.handlers is CHECKED_HANDLERS
+
+    @staticmethod
+    def test_recompiled_blocks_leave_out_device_accesses():
+        # LDA #'A'; STA $F000; LDA #'B'; STA $F000; JMP next; BRK
+        program = [LDA_IMMEDIATE, ord('A'), STA_ABSOLUTE, 0x00, 0xf0, LDA_IMMEDIATE, ord('B'), STA_ABSOLUTE, 0x00, 0xf0,
+                   JMP_ABSOLUTE, 0x0d, 0x02, BRK]
+        code_dict = {0x200: bytes(program).hex().upper(), 0xfffc: '0002'}
+        with tempfile.TemporaryDirectory() as directory:
+            module = recompile(code_dict, cache_directory=directory)
+            for processor in (Processor(), FastProcessor(), TranslatingProcessor(), MicrocodeProcessor(),
+                              RecompiledProcessor(module)):
+                load_program(processor, program)
+                acia = ACIA()
+                Bus(processor).attach(acia, 0xf000)
+                processor.run(max_instructions=100)
+                assert acia.transmitted == b'AB' and processor.memory.data[0xf000] == 0
+
+    @staticmethod
+    def test_handlers_without_devices():
+        processor = FastProcessor()
+        bus = Bus(processor)
+        device = Recorder()
+        bus.attach(device, 0x6000, 0x6200)
+        assert processor.handlers is not HANDLERS
+        assert bus.devices == [device] and processor.memory.devices[0x61] is device
+        bus.detach(device)
+        assert processor.handlers is HANDLERS
+        load_program(processor, SORT_PROGRAM)
+        processor.run(max_instructions=20000)
+        assert list(processor.memory.data[0x1000:0x1020]) == list(range(1, 0x21))
+
+    def test_invalid_attachments(self):
+        bus = Bus(Processor())
+        bus.attach(Recorder(), 0x6000)
+        with self.assertRaises(ValueError):
+            bus.attach(Recorder(), 0x60f0)
+        with self.assertRaises(ValueError):
+            bus.attach(Recorder(), 0x0100)
+
+
+if __name__ == '__main__':
+    unittest.main()
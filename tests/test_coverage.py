@@ -0,0 +1,102 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from emulator.batch import Job, assemble, format_result, load_image, run_batch
+from emulator.coverage import Coverage, CoverageData, bitmap_ranges, line_coverage, listing, main, ranges_bitmap, \
+    summary
+from emulator.fast import FastProcessor
+from emulator.processor import Processor
+from test_batch import MULT_PROGRAM
+from test_fast_processor import SORT_PROGRAM, load_program
+
+
+def run_coverage(processor, program: list[int]) -> CoverageData:
+    load_program(processor, program)
+    coverage = Coverage(processor)
+    coverage.enable()
+    processor.run(max_instructions=10000)
+    coverage.disable()
+    return coverage.data()
+
+
+class CoverageTest(unittest.TestCase):
+    @staticmethod
+    def test_sort_program():
+        data = run_coverage(Processor(), SORT_PROGRAM)
+        # All instructions before the final BRK, which stops the run
+        assert [address for start, end in bitmap_ranges(data.executed) for address in range(start, end)] == [
+            0x200, 0x202, 0x204, 0x207, 0x208, 0x20a, 0x20b, 0x20d, 0x20f, 0x211, 0x213, 0x215, 0x218,
+            0x21b, 0x21d, 0x220, 0x223, 0x224, 0x227, 0x228, 0x22a, 0x22c, 0x22e]
+        # The BNEs go both ways, the BCC at $021B never branches as the values are in descending order
+        assert bitmap_ranges(data.taken) == [[0x20d, 0x20e], [0x22a, 0x22b], [0x22e, 0x22f]]
+        assert bitmap_ranges(data.not_taken) == [[0x20d, 0x20e], [0x21b, 0x21c], [0x22a, 0x22b], [0x22e, 0x22f]]
+
+    @staticmethod
+    def test_fast_processor_matches_processor():
+        assert run_coverage(FastProcessor(), SORT_PROGRAM) == run_coverage(Processor(), SORT_PROGRAM)
+
+    @staticmethod
+    def test_chains_with_statistics():
+        from emulator.statistics import Statistics
+        processor = FastProcessor()
+        handlers = processor.handlers
+        load_program(processor, SORT_PROGRAM)
+        coverage, statistics = Coverage(processor), Statistics(processor)
+        coverage.enable()
+        statistics.enable()
+        coverage.disable()
+        coverage.enable()
+        result = processor.run()
+        assert statistics.as_dict()['instructions'] == result.instructions
+        assert coverage.data() == run_coverage(Processor(), SORT_PROGRAM)
+        statistics.disable()
+        coverage.disable()
+        assert processor.handlers is handlers
+
+    @staticmethod
+    def test_merge_and_ranges():
+        first = CoverageData(ranges_bitmap([[0, 3], [0xfff0, 0x10000]]))
+        second = CoverageData(ranges_bitmap([[2, 9]]), ranges_bitmap([[5, 6]]))
+        merged = first.merge(second)
+        assert merged.as_dict() == {'executed': [[0, 9], [0xfff0, 0x10000]], 'taken': [[5, 6]], 'not_taken': []}
+        assert CoverageData.from_dict(json.loads(json.dumps(merged.as_dict()))) == merged
+        coverage = Coverage(Processor())
+        coverage.merge(merged)
+        assert coverage.data() == merged
+
+    @staticmethod
+    def test_line_coverage():
+        code_dict, debug_info = assemble(MULT_PROGRAM)
+        source_lines = Path(MULT_PROGRAM).read_text().splitlines()
+        results = run_batch([Job(MULT_PROGRAM, {0x10: bytes((x, 3))}, coverage=True) for x in (0, 2)], max_workers=1)
+        data = CoverageData()
+        for result in results:
+            data = data.merge(result.coverage)
+        coverage = line_coverage(data, code_dict, debug_info, source_lines)
+        # The BRK at line 19 stops the runs, the vector at line 22 is data
+        assert summary(coverage) == {'lines': 10, 'lines_executed': 9, 'branches': 1, 'branches_taken': 1,
+                                     'branches_not_taken': 1, 'missed_lines': [19], 'partial_branches': []}
+        rows = listing(coverage, source_lines).splitlines()
+        assert rows[8] == '     9 > TN  \tBEQ end'
+        assert rows[18].startswith('    19 !   ')
+        assert rows[21] == '    22       .db $00, $02'
+
+    @staticmethod
+    def test_main():
+        image = load_image(MULT_PROGRAM)
+        from emulator.batch import run_job
+        result = run_job(Job(MULT_PROGRAM, {0x10: b'\x01\x01'}, coverage=True), image)
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'results.jsonl'
+            path.write_text(json.dumps(format_result(result)) + '\n')
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                main([MULT_PROGRAM, str(path), '--json'])
+            assert json.loads(output.getvalue())['partial_branches'] == []
+
+
+if __name__ == '__main__':
+    unittest.main()
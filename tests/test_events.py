@@ -0,0 +1,83 @@
+import unittest
+from emulator.events import NEVER, EventQueue
+from emulator.fast import FastProcessor
+from emulator.opcodes import *
+from emulator.processor import Processor
+from emulator.translator import TranslatingProcessor
+from test_fast_processor import load_program, processor_state
+
+# Count in X until interrupted, count the interrupts in Y
+LOOP_PROGRAM = [CLI, INX, NOP, NOP, JMP_ABSOLUTE, 0x01, 0x02]
+HANDLER = [INY, RTI]
+
+
+def run_periodic_interrupts(processor, period: int, cycles: int) -> list[int]:
+    load_program(processor, LOOP_PROGRAM)
+    processor.memory.data[0x300:0x302] = bytes(HANDLER)
+    processor.memory.data[0xfffe:0x10000] = b'\x00\x03'
+    served = []
+
+    def interrupt(cycle):
+        served.append(cycle)
+        processor.interrupt_requested = True
+        processor.events.schedule(cycle + period, interrupt)
+    processor.events.schedule(period, interrupt)
+    processor.run(max_cycles=cycles)
+    return served
+
+
+class EventQueueTest(unittest.TestCase):
+    @staticmethod
+    def test_order_and_cancel():
+        events = EventQueue()
+        called = []
+        events.schedule(20, lambda cycle: called.append(('b', cycle)))
+        first = events.schedule(10, lambda cycle: called.append(('a', cycle)))
+        events.schedule(20, lambda cycle: called.append(('c', cycle)))
+        assert events.next_cycle == 10 and len(events) == 3
+        events.cancel(first)
+        assert events.next_cycle == 20 and len(events) == 2
+        events.run_due(19)
+        assert called == []
+        events.run_due(25)
+        assert called == [('b', 20), ('c', 20)]
+        assert events.next_cycle == NEVER
+
+    @staticmethod
+    def test_callbacks_schedule_events():
+        events = EventQueue()
+        called = []
+
+        def callback(cycle):
+            called.append(cycle)
+            if cycle < 30:
+                events.schedule(cycle + 10, callback)
+        events.schedule(10, callback)
+        events.run_due(100)
+        assert called == [10, 20, 30]
+
+    @staticmethod
+    def test_processors_serve_events_alike():
+        states = []
+        for processor in (Processor(), FastProcessor(), TranslatingProcessor()):
+            served = run_periodic_interrupts(processor, 100, 1000)
+            assert served == list(range(100, 1001, 100))[:len(served)] and len(served) >= 9
+            states.append(processor_state(processor))
+        assert states[0] == states[1] == states[2]
+        assert states[0][3] == 9
+
+    @staticmethod
+    def test_schedule_interrupt():
+        processor = FastProcessor()
+        load_program(processor, [NOP] * 16)
+        processor.memory.data[0xfffa:0xfffc] = b'\x00\x04'
+        processor.memory.data[0x400:0x402] = bytes((NOP, BRK))
+        processor.events.schedule_interrupt(processor, 5, non_maskable=True)
+        result = processor.run(max_instructions=100)
+        # NOP takes one cycle: five run before the interrupt is served at cycle 5, one in the handler
+        assert result.reason == 'brk' and processor.PC == 0x401 and result.instructions == 6
+        assert processor.memory.data[0x1ff] == 0x02 and processor.memory.data[0x1fe] == 0x05
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import random
+import unittest
+from emulator.processor import Processor
+from emulator.fast import FastProcessor
+from emulator.opcodes import *
+
+
+def processor_state(processor) -> tuple:
+    return (processor.PC, processor.A, processor.X, processor.Y, processor.S, processor.SR, processor.cycles,
+            bytes(processor.memory.data))
+
+
+def setup_random_processors(rnd: random.Random, instruction: list[int], lazy_flags: bool = False) -> list:
+    pc = rnd.randrange(0x200, 0xfe00)
+    registers = {'A': rnd.getrandbits(8), 'X': rnd.getrandbits(8), 'Y': rnd.getrandbits(8),
+                 'S': rnd.randrange(3, 0xfd)}
+    status = rnd.getrandbits(8) & 0b11011111
+    data = {address: rnd.getrandbits(8) for address in range(0x200)}
+    for _ in range(32):
+        data[rnd.randrange(0x200, 0xfff0)] = rnd.getrandbits(8)
+    processors = []
+    for processor in (Processor(), FastProcessor(lazy_flags=lazy_flags)):
+        for address, value in data.items():
+            processor.memory.data[address] = value
+        processor.PC = pc
+        for register, value in registers.items():
+            setattr(processor, register, value)
+        processor.SR = status
+        for offset, byte in enumerate(instruction):
+            processor.memory.data[pc + offset] = byte
+        processors.append(processor)
+    return processors
+
+
+def load_program(processor, program: list[int], address: int = 0x200) -> None:
+    for offset, byte in enumerate(program):
+        processor.memory.data[address + offset] = byte
+    processor.memory.data[0xfffc] = address & 0xff
+    processor.memory.data[0xfffd] = address >> 8
+    processor.reset()
+
+
+# Fill $1000-$101f with descending values and bubble sort them
+SORT_PROGRAM = [
+    LDX_IMMEDIATE, 0x00, LDA_IMMEDIATE, 0x20,
+    STA_ABSOLUTE_X, 0x00, 0x10, SEC, SBC_IMMEDIATE, 0x01, INX, CPX_IMMEDIATE, 0x20, BNE, 0xf5,
+    LDA_IMMEDIATE, 0x1f, STA_ZERO_PAGE, 0x20,
+    LDX_IMMEDIATE, 0x00,
+    LDA_ABSOLUTE_X, 0x00, 0x10, CMP_ABSOLUTE_X, 0x01, 0x10, BCC, 0x0a,
+    LDY_ABSOLUTE_X, 0x01, 0x10, STA_ABSOLUTE_X, 0x01, 0x10, TYA, STA_ABSOLUTE_X, 0x00, 0x10,
+    INX, CPX_ZERO_PAGE, 0x20, BNE, 0xe9, DEC_ZERO_PAGE, 0x20, BNE, 0xe3,
+    BRK,
+]
+
+
+class FastProcessorTest(unittest.TestCase):
+    @staticmethod
+    def test_all_opcodes_match_processor():
+        rnd = random.Random(6502)
+        for opcode in range(0x100):
+            for _ in range(12):
+                processor, fast_processor = setup_random_processors(
+                    rnd, [opcode, rnd.getrandbits(8), rnd.getrandbits(8)]
+                )
+                try:
+                    processor.run_instruction()
+                except (IndexError, AssertionError):
+                    # Processor does not wrap addresses beyond $FFFF
+                    continue
+                fast_processor.run_instruction()
+                assert processor_state(fast_processor) == processor_state(processor), f'${opcode:02X}'
+
+    @staticmethod
+    def test_lazy_flags_match_processor():
+        rnd = random.Random(6502)
+        for opcode in range(0x100):
+            for _ in range(12):
+                processor, fast_processor = setup_random_processors(
+                    rnd, [opcode, rnd.getrandbits(8), rnd.getrandbits(8)], lazy_flags=True
+                )
+                try:
+                    processor.run_instruction()
+                except (IndexError, AssertionError):
+                    continue
+                fast_processor.run_instruction()
+                assert processor_state(fast_processor) == processor_state(processor), f'${opcode:02X}'
+
+    @staticmethod
+    def test_program_matches_processor():
+        processor, fast_processor = Processor(), FastProcessor()
+        for p in (processor, fast_processor):
+            load_program(p, SORT_PROGRAM)
+        for _ in range(20000):
+            processor.run_instruction()
+            fast_processor.run_instruction()
+        assert processor_state(fast_processor) == processor_state(processor)
+        assert list(fast_processor.memory.data[0x1000:0x1020]) == list(range(1, 0x21))
+
+    @staticmethod
+    def test_interrupts_match_processor():
+        processor, fast_processor = Processor(), FastProcessor()
+        for p in (processor, fast_processor):
+            load_program(p, [NOP] * 8)
+            p.memory.data[0xfffe] = 0x00
+            p.memory.data[0xffff] = 0x03
+            p.memory.data[0xfffa] = 0x00
+            p.memory.data[0xfffb] = 0x04
+            p.memory.data[0x0300] = p.memory.data[0x0400] = NOP
+            p.run_instruction()
+            p.interrupt_requested = True
+            p.run_instruction()
+            p.non_maskable_interrupt_requested = True
+            p.run_instruction()
+        assert processor_state(fast_processor) == processor_state(processor)
+        assert fast_processor.PC == 0x0401
+
+    @staticmethod
+    def test_flags():
+        processor = FastProcessor()
+        processor.SR = 0b11011111
+        assert (processor.N, processor.V, processor.B, processor.D, processor.I, processor.Z, processor.C) == \
+               (1, 1, 1, 1, 1, 1, 1)
+        processor.Z = 0
+        assert processor.SR == 0b11011101
+
+    @staticmethod
+    def test_lazy_flags():
+        processor = FastProcessor(lazy_flags=True)
+        for status in range(0x100):
+            processor.SR = status
+            assert processor.SR == status & 0b11011111
+        processor.SR = 0
+        processor.N = 1
+        assert (processor.N, processor.Z) == (1, 0)
+        processor.Z = 1
+        assert (processor.N, processor.Z) == (1, 1)
+        processor.nz = 0x80
+        assert (processor.N, processor.Z) == (1, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from emulator.processor import Processor
+from emulator.microcode import MicrocodeProcessor
+from emulator.history import ExecutionHistory
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+class ExecutionHistoryTest(unittest.TestCase):
+    @staticmethod
+    def test_step_back():
+        for processor_class in (Processor, MicrocodeProcessor):
+            processor = processor_class()
+            load_program(processor, SORT_PROGRAM)
+            history = ExecutionHistory(processor, interval=50)
+            states = []
+            for _ in range(400):
+                states.append(processor_state(processor))
+                history.step()
+            for count in (1, 7, 50, 120, 1):
+                assert history.step_back(count) == count
+                assert processor_state(processor) == states[history.instruction]
+            # Recording continues from the state gone back to
+            history.step(30)
+            assert processor_state(processor) == states[history.instruction]
+            instruction = history.instruction
+            assert history.step_back(1000) == instruction
+            assert processor_state(processor) == states[0]
+
+    @staticmethod
+    def test_history_is_bounded():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        history = ExecutionHistory(processor, interval=100, max_snapshots=3)
+        states = {}
+        for instruction in range(2000):
+            states[instruction] = processor_state(processor)
+            history.step()
+        assert len(history.snapshots) == 3
+        # The snapshot at 2000 is taken before the next step
+        assert history.first_instruction == 1700
+        assert len(history.write_starts) == 300
+        assert history.step_back(500) == 300
+        assert processor_state(processor) == states[1700]
+
+    @staticmethod
+    def test_run_back_to_write():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        history = ExecutionHistory(processor, interval=64)
+        history.step(1000)
+        writer = history.instruction
+        while history.run_back_to_write(0x1001):
+            assert history.instruction < writer
+            assert processor.PC in (0x204, 0x220, 0x224)
+            writer = history.instruction
+        # The fill loop stores $1F to $1001 in its second iteration
+        assert writer == 8 and processor.PC == 0x204 and processor.X == 1 and processor.A == 0x1f
+        assert not history.run_back_to_write(0x3000)
+
+
+if __name__ == '__main__':
+    unittest.main()
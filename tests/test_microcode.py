@@ -0,0 +1,97 @@
+import random
+import unittest
+from emulator.breakpoints import Breakpoints
+from emulator.history import ExecutionHistory
+from emulator.processor import Processor
+from emulator.microcode import MICROCODE, MicrocodeProcessor, disassemble_microcode
+from emulator.opcodes import *
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+def full_state(processor) -> tuple:
+    return processor_state(processor) + (bytes(processor.registers),)
+
+
+class MicrocodeTest(unittest.TestCase):
+    @staticmethod
+    def test_all_opcodes_match_processor():
+        rnd = random.Random(6502)
+        for opcode in range(0x100):
+            for _ in range(12):
+                processors = Processor(), MicrocodeProcessor()
+                pc = rnd.randrange(0x200, 0xfe00)
+                data = {address: rnd.getrandbits(8) for address in range(0x200)}
+                for _ in range(32):
+                    data[rnd.randrange(0x200, 0xfff0)] = rnd.getrandbits(8)
+                registers = rnd.getrandbits(8), rnd.getrandbits(8), rnd.getrandbits(8), rnd.randrange(3, 0xfd)
+                status = rnd.getrandbits(8) & 0b11011111
+                instruction = [opcode, rnd.getrandbits(8), rnd.getrandbits(8)]
+                for processor in processors:
+                    for address, value in data.items():
+                        processor.memory.data[address] = value
+                    for offset, byte in enumerate(instruction):
+                        processor.memory.data[pc + offset] = byte
+                    processor.PC = pc
+                    processor.A, processor.X, processor.Y, processor.S = registers
+                    processor.SR = status
+                try:
+                    processors[0].run_instruction()
+                except (IndexError, AssertionError, ValueError):
+                    continue
+                processors[1].run_instruction()
+                assert full_state(processors[1]) == full_state(processors[0]), f'${opcode:02X}'
+
+    @staticmethod
+    def test_program_matches_processor():
+        processor, microcode_processor = Processor(), MicrocodeProcessor()
+        for p in (processor, microcode_processor):
+            load_program(p, SORT_PROGRAM)
+            p.run()
+        assert full_state(microcode_processor) == full_state(processor)
+        assert list(microcode_processor.memory.data[0x1000:0x1020]) == list(range(1, 0x21))
+
+    @staticmethod
+    def test_watchpoints_and_write_log():
+        results = []
+        for processor in (Processor(), MicrocodeProcessor()):
+            load_program(processor, SORT_PROGRAM)
+            history = ExecutionHistory(processor)
+            history.step(3000)
+            breakpoints = Breakpoints(processor)
+            breakpoints.add_watchpoint(0x1010, 0x1020, read=True)
+            result = processor.run()
+            results.append((result, full_state(processor), breakpoints.hit.address, list(history.writes)))
+        assert results[1] == results[0]
+        assert results[0][0].reason == 'watchpoint' and results[0][3]
+
+    @staticmethod
+    def test_overridden_memory_access_is_called():
+        accesses = []
+
+        class LoggingProcessor(MicrocodeProcessor):
+            def fetch_byte(self) -> int:
+                accesses.append(('read', self.AR))
+                return super().fetch_byte()
+
+            def put_byte(self, byte: int) -> None:
+                accesses.append(('write', self.AR))
+                super().put_byte(byte)
+
+        processor, logging_processor = Processor(), LoggingProcessor()
+        for p in (processor, logging_processor):
+            load_program(p, SORT_PROGRAM)
+            p.run()
+        assert full_state(logging_processor) == full_state(processor)
+        assert ('write', 0x1000) in accesses and ('read', 0x1000) in accesses
+
+    @staticmethod
+    def test_disassemble_microcode():
+        assert len(MICROCODE) == 0x100
+        assert MICROCODE[NOP] == ()
+        assert disassemble_microcode(ADC_ABSOLUTE) == [
+            'COPY A OP1', 'FETCH_PC ARL', 'FETCH_PC ARH', 'FETCH OP2', 'ALU adc', 'COPY RES A', 'NZ RES'
+        ]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from emulator.processor import Processor
+from emulator.processor import Processor, INSTRUCTION_SET, REGISTER_NAMES, REG_A, REG_X, REG_SR, dispatch_arguments
+from emulator.opcodes import LDA_ABSOLUTE_X, LDA_IMMEDIATE, PHP
 
 
 class ProcessorTest(unittest.TestCase):
@@ -40,6 +41,22 @@ class ProcessorTest(unittest.TestCase):
         processor.N = 0
         assert processor.status.value == 0         
 
+    @staticmethod
+    def test_register_file():
+        processor = Processor()
+        processor.PC = 0x1234
+        processor.A = 0x56
+        processor.SR = 0xff
+        snapshot = bytes(processor.registers)
+        assert snapshot[REGISTER_NAMES.index('PCH')] == 0x12
+        assert snapshot[REGISTER_NAMES.index('A')] == 0x56
+        assert snapshot[REGISTER_NAMES.index('SR')] == 0b11011111
+        processor.copy_byte(REG_A, REG_X)
+        assert processor.index_x.value == 0x56
+        processor.reset()
+        processor.registers[:] = snapshot
+        assert (processor.PC, processor.A, processor.X, processor.SR) == (0x1234, 0x56, 0, 0b11011111)
+
     @staticmethod
     def test_put():
         processor = Processor()
@@ -56,6 +73,36 @@ class ProcessorTest(unittest.TestCase):
         assert processor.fetch_byte() == 42
         assert processor.cycles == 1
 
- 
+    @staticmethod
+    def test_dispatch_table():
+        processor = Processor()
+        assert len(processor.dispatch_table) == 0x100
+        assert len(INSTRUCTION_SET) == 151
+        for opcode, (method, arguments) in INSTRUCTION_SET.items():
+            handler, handler_arguments = processor.dispatch_table[opcode]
+            assert handler.__name__ == method
+            assert handler_arguments == dispatch_arguments(method, arguments)
+        assert processor.dispatch_table[LDA_ABSOLUTE_X][1] == (REG_A, 'absolute_indexed', REG_X)
+        assert processor.dispatch_table[PHP][1] == (REG_SR,)
+
+    @staticmethod
+    def test_dispatch_table_uses_overridden_handlers():
+        class LoggingProcessor(Processor):
+            def __init__(self):
+                self.loaded = []
+                super().__init__()
+
+            def load_register(self, register, mode, index_register=None):
+                self.loaded.append((register, mode))
+                super().load_register(register, mode, index_register)
+
+        processor = LoggingProcessor()
+        processor.memory.data[0] = LDA_IMMEDIATE
+        processor.memory.data[1] = 0x42
+        processor.run_instruction()
+        assert processor.loaded == [(REG_A, 'immediate')]
+        assert processor.A == 0x42
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from pathlib import Path
+import asm.assembler_helpers  # noqa, imports asm.assembler, which cannot be imported first
+from asm.assembler import assemble_file
+from emulator.processor import Processor
+from emulator.profiler import CallGraphProfiler, Profiler, Subroutine
+from emulator.opcodes import *
+from emulator.recompiler import build_image
+from test_fast_processor import SORT_PROGRAM, load_program
+
+MULT_PROGRAM = Path(__file__).parent.parent / 'examples' / 'mult1.asm'
+
+
+class ProfilerTest(unittest.TestCase):
+    @staticmethod
+    def test_counts_per_address():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        profiler = Profiler(processor)
+        profiler.enable()
+        result = processor.run()
+        assert sum(profiler.instructions) == result.instructions
+        assert sum(profiler.cycles) == result.cycles
+        # The fill loop runs 32 times
+        assert profiler.instructions[0x204] == 32 and profiler.cycles[0x204] == 32 * 5
+        profiler.disable()
+        processor.reset()
+        processor.run()
+        assert sum(profiler.instructions) == result.instructions
+
+    @staticmethod
+    def test_profilers_share_run_instruction():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        first, second = Profiler(processor), Profiler(processor)
+        first.enable()
+        second.enable()
+        first.disable()
+        assert second.enabled and not first.enabled
+        result = processor.run()
+        assert sum(second.instructions) == result.instructions
+        assert sum(first.instructions) == 0
+        second.disable()
+        assert 'run_instruction' not in processor.__dict__ and not processor.hooks
+
+    @staticmethod
+    def test_hotspot_report():
+        code_dict, debug_info = assemble_file(str(MULT_PROGRAM))
+        processor = Processor()
+        for address, byte in build_image(code_dict).items():
+            processor.memory.data[address] = byte
+        processor.memory.data[0x10:0x12] = bytes((7, 3))
+        processor.reset()
+        profiler = Profiler(processor)
+        profiler.enable()
+        processor.run()
+        hotspots = profiler.hotspots(debug_info)
+        # The ADC, DEX and BEQ of the loop run 7, 8 and 8 times
+        assert hotspots[0].cycles == max(hotspot.cycles for hotspot in hotspots)
+        assert {hotspot.line: hotspot.instructions for hotspot in hotspots}[10] == 7
+        assert sum(hotspot.cycles for hotspot in hotspots) == processor.cycles
+        report = profiler.report(debug_info, MULT_PROGRAM.read_text().splitlines(), limit=3)
+        assert len(report.splitlines()) == 4
+        assert 'JMP loop' in report
+
+
+# MAIN: JSR OUTER; JSR INNER; JSR DISPATCH; BRK
+# OUTER: JSR INNER; JSR INNER; RTS
+# INNER: LDX #3; DEX; BNE *-1; RTS
+# DISPATCH: LDA #>INNER-1; PHA; LDA #<INNER-1; PHA; RTS
+CALL_PROGRAM = {
+    0x200: [JSR, 0x10, 0x02, JSR, 0x20, 0x02, JSR, 0x30, 0x02, BRK],
+    0x210: [JSR, 0x20, 0x02, JSR, 0x20, 0x02, RTS],
+    0x220: [LDX_IMMEDIATE, 0x03, DEX, BNE, 0xfd, RTS],
+    0x230: [LDA_IMMEDIATE, 0x02, PHA, LDA_IMMEDIATE, 0x1f, PHA, RTS],
+}
+CALL_LABELS = {'X': '10', 'MAIN': '0200', 'OUTER': '0210', 'INNER': '0220', 'DISPATCH': '0230'}
+
+
+class CallGraphProfilerTest(unittest.TestCase):
+    @staticmethod
+    def test_inclusive_and_exclusive_cycles():
+        processor = Processor()
+        for address, code in CALL_PROGRAM.items():
+            processor.memory.data[address:address + len(code)] = bytes(code)
+        load_program(processor, [], 0x200)
+        profiler = CallGraphProfiler(processor, CALL_LABELS)
+        profiler.enable()
+        processor.run()
+        subroutines = profiler.subroutines()
+        # INNER takes 2 + 3 * 2 + 2 * 3 + 2 + 6 cycles
+        assert subroutines['INNER'] == Subroutine(3, 3 * 22, 3 * 22)
+        assert subroutines['OUTER'] == Subroutine(1, 18 + 2 * 22, 18)
+        # INNER reached through the RTS of DISPATCH counts for DISPATCH
+        assert subroutines['DISPATCH'] == Subroutine(1, 2 + 3 + 2 + 3 + 6 + 22, 2 + 3 + 2 + 3 + 6 + 22)
+        assert subroutines['MAIN'].inclusive_cycles == processor.cycles
+        assert profiler.stack == [('MAIN', 0x100)]
+        assert profiler.folded_stacks().splitlines() == [
+            'MAIN 18', 'MAIN;DISPATCH 38', 'MAIN;INNER 22', 'MAIN;OUTER 18', 'MAIN;OUTER;INNER 44'
+        ]
+        profiler.disable()
+        assert 'jump_to_subroutine' not in processor.__dict__
+
+    @staticmethod
+    def test_stack_tricks_do_not_grow_the_stack():
+        # LOOP: JSR SUB; SUB: PLA; PLA; JMP LOOP, never returning
+        processor = Processor()
+        load_program(processor, [JSR, 0x03, 0x02, PLA, PLA, JMP_ABSOLUTE, 0x00, 0x02])
+        profiler = CallGraphProfiler(processor)
+        profiler.enable()
+        processor.run(max_instructions=1000)
+        assert len(profiler.stack) <= 2
+        # TXS to a fresh stack, then calls overwrite the return addresses of the frames left
+        processor.S = 0xff
+        processor.run(max_instructions=1000)
+        assert len(profiler.stack) <= 2
+
+
+if __name__ == '__main__':
+    unittest.main()
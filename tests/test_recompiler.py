@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from pathlib import Path
+from emulator.fast import FastProcessor
+from emulator.recompiler import RecompiledProcessor, build_image, recompile, translate_program
+from emulator.translator import interpret_instruction
+from emulator.opcodes import *
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+def code_dict(program: list[int], address: int = 0x200) -> dict:
+    return {address: bytes(program).hex().upper(), 0xfffc: f'{address & 0xff:02X}{address >> 8:02X}'}
+
+
+def run_both(module, program: list[int]) -> RecompiledProcessor:
+    recompiled_processor, fast_processor = RecompiledProcessor(module), FastProcessor()
+    load_program(recompiled_processor, program)
+    load_program(fast_processor, program)
+    recompiled_processor.run()
+    fast_processor.run()
+    assert processor_state(recompiled_processor) == processor_state(fast_processor)
+    return recompiled_processor
+
+
+class RecompilerTest(unittest.TestCase):
+    @staticmethod
+    def test_sort_program():
+        with tempfile.TemporaryDirectory() as directory:
+            module = recompile(code_dict(SORT_PROGRAM), cache_directory=directory)
+            assert sorted(module.BLOCKS) == [0x200, 0x204, 0x20f, 0x213, 0x215, 0x21d, 0x227, 0x22c, 0x230]
+            processor = run_both(module, SORT_PROGRAM)
+            assert list(processor.memory.data[0x1000:0x1020]) == list(range(1, 0x21))
+            assert all(block.function is not interpret_instruction for block in processor.blocks.values())
+
+    @staticmethod
+    def test_module_is_cached():
+        with tempfile.TemporaryDirectory() as directory:
+            recompile(code_dict(SORT_PROGRAM), cache_directory=directory)
+            files = list(Path(directory).iterdir())
+            assert len(files) == 1
+            recompile(code_dict(SORT_PROGRAM), cache_directory=directory)
+            assert list(Path(directory).iterdir()) == files
+            recompile(code_dict(SORT_PROGRAM[:-1] + [NOP, BRK]), cache_directory=directory)
+            assert len(list(Path(directory).iterdir())) == 2
+
+    @staticmethod
+    def test_debug_info_is_part_of_the_key():
+        # JSR $0208; BRK; .db $FF; LDA #$07; RTS
+        program = [JSR, 0x08, 0x02, BRK, 0xff, 0xff, 0xff, 0xff, LDA_IMMEDIATE, 0x07, RTS]
+        debug_info = {0x200: 1, 0x203: 2, 0x204: 3, 0x208: 4, 0x20a: 5}
+        with tempfile.TemporaryDirectory() as directory:
+            module = recompile(code_dict(program), cache_directory=directory)
+            assert sorted(module.BLOCKS) == [0x200, 0x203, 0x205, 0x208]
+            module = recompile(code_dict(program), debug_info, cache_directory=directory)
+            assert sorted(module.BLOCKS) == [0x200, 0x203, 0x208]
+            assert 'line 4, 5' in Path(module.__file__).read_text()
+            assert len(list(Path(directory).iterdir())) == 2
+
+    @staticmethod
+    def test_subroutines_and_data():
+        # JSR $0208; BRK; .db $FF; LDA #$07; RTS
+        program = [JSR, 0x08, 0x02, BRK, 0xff, 0xff, 0xff, 0xff, LDA_IMMEDIATE, 0x07, RTS]
+        image = build_image(code_dict(program))
+        debug_info = {0x200: 1, 0x203: 2, 0x204: 3, 0x208: 4, 0x20a: 5}
+        starts = [block.start for block in translate_program(image, (0x200,), set(debug_info))]
+        assert starts == [0x200, 0x203, 0x208]
+
+    @staticmethod
+    def test_indirect_jump_is_interpreted():
+        # JMP ($0300) to $0206, which is not reachable statically
+        program = [JMP_INDIRECT, 0x00, 0x03, BRK, BRK, BRK, LDA_IMMEDIATE, 0x09, BRK]
+        with tempfile.TemporaryDirectory() as directory:
+            module = recompile(code_dict(program), cache_directory=directory)
+            assert sorted(module.BLOCKS) == [0x200]
+            recompiled_processor, fast_processor = RecompiledProcessor(module), FastProcessor()
+            for processor in (recompiled_processor, fast_processor):
+                processor.memory.data[0x300:0x302] = bytes((0x06, 0x02))
+                load_program(processor, program)
+                processor.run()
+            assert processor_state(recompiled_processor) == processor_state(fast_processor)
+            assert recompiled_processor.A == 0x09
+            assert recompiled_processor.blocks[0x206].function is interpret_instruction
+
+    @staticmethod
+    def test_self_modified_code_is_interpreted():
+        # STA $020A overwrites the operand of LDX #$00 in the block after the branch
+        program = [LDA_IMMEDIATE, 0x42, STA_ABSOLUTE, 0x0a, 0x02, BNE, 0x00, LDY_IMMEDIATE, 0x05, LDX_IMMEDIATE,
+                   0x00, BRK]
+        with tempfile.TemporaryDirectory() as directory:
+            processor = run_both(recompile(code_dict(program), cache_directory=directory), program)
+            assert processor.X == 0x42
+            assert processor.blocks[0x207].function is interpret_instruction
+
+
+if __name__ == '__main__':
+    unittest.main()
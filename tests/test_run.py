@@ -0,0 +1,65 @@
+import unittest
+from emulator.processor import Processor, RunResult, STOP_BRK, STOP_MAX_CYCLES, STOP_MAX_INSTRUCTIONS, STOP_UNTIL_PC
+from emulator.fast import FastProcessor
+from emulator.translator import TranslatingProcessor
+from emulator.opcodes import BRK
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+def run_on_all_processors(**conditions) -> tuple:
+    results = []
+    for processor_class in (Processor, FastProcessor, TranslatingProcessor):
+        processor = processor_class()
+        load_program(processor, SORT_PROGRAM)
+        result = processor.run(**conditions)
+        results.append((result, processor_state(processor)))
+    assert results[1] == results[0]
+    assert results[2] == results[0]
+    return results[0]
+
+
+class ProcessorTest(unittest.TestCase):
+    @staticmethod
+    def test_run_until_brk():
+        result, state = run_on_all_processors()
+        assert result.reason == STOP_BRK
+        assert state[0] == 0x230
+        assert list(state[-1][0x1000:0x1020]) == list(range(1, 0x21))
+
+    @staticmethod
+    def test_run_max_instructions():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        for _ in range(1000):
+            processor.run_instruction()
+        result, state = run_on_all_processors(max_instructions=1000)
+        assert result == RunResult(STOP_MAX_INSTRUCTIONS, processor.cycles, 1000)
+        assert state == processor_state(processor)
+
+    @staticmethod
+    def test_run_max_cycles():
+        for max_cycles in (1, 10, 999, 5000):
+            result, _ = run_on_all_processors(max_cycles=max_cycles)
+            assert result.reason == STOP_MAX_CYCLES
+            assert max_cycles <= result.cycles < max_cycles + 7
+
+    @staticmethod
+    def test_run_until_pc():
+        # Stop after filling the array, in the middle of a translated block
+        result, state = run_on_all_processors(until_pc=0x211)
+        assert result.reason == STOP_UNTIL_PC
+        assert result.instructions == 2 + 32 * 6 + 1
+        assert list(state[-1][0x1000:0x1020]) == list(range(0x20, 0, -1))
+
+    @staticmethod
+    def test_run_through_brk():
+        processor = FastProcessor()
+        load_program(processor, [BRK])
+        processor.memory.data[0xfffe] = 0x00
+        processor.memory.data[0xffff] = 0x02
+        assert processor.run(max_instructions=3, stop_on_brk=False) == RunResult(STOP_MAX_INSTRUCTIONS, 21, 3)
+        assert processor.run(stop_on_brk=True) == RunResult(STOP_BRK, 0, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from emulator.processor import Processor
+from emulator.microcode import MicrocodeProcessor
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+def full_state(processor) -> tuple:
+    return processor_state(processor) + (bytes(processor.registers),)
+
+
+class SnapshotTest(unittest.TestCase):
+    @staticmethod
+    def test_restore_rewinds():
+        for processor_class in (Processor, MicrocodeProcessor):
+            processor = processor_class()
+            load_program(processor, SORT_PROGRAM)
+            snapshots, states = [], []
+            for _ in range(20):
+                snapshots.append(processor.snapshot())
+                states.append(full_state(processor))
+                processor.run(max_instructions=50)
+            for snapshot, state in reversed(list(zip(snapshots, states))):
+                processor.restore(snapshot)
+                assert full_state(processor) == state
+            # Forward again, restoring snapshots out of order
+            for index in (5, 17, 3, 3, 19, 0):
+                processor.run(max_instructions=7)
+                processor.restore(snapshots[index])
+                assert full_state(processor) == states[index]
+
+    @staticmethod
+    def test_unchanged_pages_are_shared():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        first = processor.snapshot()
+        assert processor.snapshot().pages is first.pages
+        processor.run(max_instructions=2)
+        assert processor.snapshot().pages is first.pages
+        # STA $1000,X writes page $10
+        processor.run(max_instructions=1)
+        second = processor.snapshot()
+        changed = [page for page, (a, b) in enumerate(zip(first.pages, second.pages)) if a is not b]
+        assert changed == [0x10]
+
+    @staticmethod
+    def test_writes_from_outside():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        snapshot = processor.snapshot()
+        processor.memory.data[0x3000] = 0x42
+        processor.memory.mark_written(0x3000, 0x3001)
+        assert processor.snapshot().pages[0x30][0] == 0x42
+        processor.restore(snapshot)
+        assert processor.memory.data[0x3000] == 0
+
+    @staticmethod
+    def test_only_first_write_to_a_page_is_watched():
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        processor.snapshot()
+        watched = []
+        put_watched_byte = processor.put_watched_byte
+        processor.put_watched_byte = lambda address, byte: (watched.append(address), put_watched_byte(address, byte))
+        # The fill loop writes $1000-$101F
+        processor.run(max_instructions=2 + 3 * 32)
+        assert watched == [0x1000]
+        processor.snapshot()
+        processor.memory.set_write_log([])
+        processor.run(max_instructions=3)
+        assert watched[1:] and processor.memory.write_log == watched[1:]
+        processor.memory.set_write_log(None)
+        # Pages written since the snapshot stay unwatched
+        assert [page for page, watched in enumerate(processor.memory.watched_pages) if not watched] == [0x10]
+
+
+if __name__ == '__main__':
+    unittest.main()
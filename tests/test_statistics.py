@@ -0,0 +1,103 @@
+import json
+import unittest
+from emulator.batch import Job, run_job
+from emulator.fast import FastProcessor
+from emulator.opcodes import *
+from emulator.processor import Processor
+from emulator.statistics import Statistics
+from test_batch import MULT_PROGRAM
+from test_fast_processor import SORT_PROGRAM, load_program
+
+# Reads across a page boundary, a branch taken to another page and a subroutine call
+PENALTY_PROGRAM = [
+    LDX_IMMEDIATE, 0x10, LDA_ABSOLUTE_X, 0xf8, 0x10, LDY_ZERO_PAGE, 0x00, JSR, 0xf0, 0x02, BRK,
+]
+SUBROUTINE = [CLC, BCC, 0x0e, BRK]
+
+
+def run_statistics(processor, program: list[int]) -> dict:
+    load_program(processor, program)
+    statistics = Statistics(processor)
+    statistics.enable()
+    processor.run(max_instructions=10000)
+    statistics.disable()
+    return statistics.as_dict()
+
+
+class StatisticsTest(unittest.TestCase):
+    @staticmethod
+    def test_sort_program():
+        statistics = run_statistics(Processor(), SORT_PROGRAM)
+        assert statistics['address_modes']['relative'] == statistics['opcodes']['BNE'] + statistics['opcodes']['BCC']
+        assert statistics['address_modes']['relative'] == sum(statistics['branches'].values())
+        assert statistics['opcodes']['DEC_ZERO_PAGE'] == 31
+        assert statistics['stack_depth'] == 0
+        assert statistics['zero_page_ratio'] == statistics['zero_page_accesses'] / (
+            statistics['zero_page_accesses'] + statistics['absolute_accesses'])
+        assert json.loads(json.dumps(statistics)) == statistics
+
+    @staticmethod
+    def test_fast_processor_matches_processor():
+        assert run_statistics(FastProcessor(), SORT_PROGRAM) == run_statistics(Processor(), SORT_PROGRAM)
+
+    @staticmethod
+    def test_penalties_and_stack():
+        for processor in (Processor(), FastProcessor()):
+            for offset, byte in enumerate(SUBROUTINE):
+                processor.memory.data[0x2f0 + offset] = byte
+            statistics = run_statistics(processor, PENALTY_PROGRAM)
+            # LDA $10F8,X crosses a page, BCC from $2F3 to $302 too
+            assert statistics['page_crossing_cycles'] == 2
+            assert statistics['branches'] == {'taken': 1, 'not_taken': 0}
+            assert statistics['stack_depth'] == 2
+            assert statistics['zero_page_accesses'] == 1 and statistics['absolute_accesses'] == 1
+            # The run stops at the BRK of the subroutine without executing it
+            assert statistics['address_modes']['implied'] == 1
+
+    @staticmethod
+    def test_interrupt_entry_is_no_penalty():
+        # CLI; LOOP: NOP; JMP LOOP, with an IRQ handler returning at once
+        for processor in (Processor(), FastProcessor()):
+            processor.memory.data[0x300] = RTI
+            processor.memory.data[0xfffe:0x10000] = bytes((0x00, 0x03))
+            processor.events.schedule_interrupt(processor, 20)
+            statistics = run_statistics(processor, [CLI, NOP, JMP_ABSOLUTE, 0x01, 0x02])
+            assert statistics['opcodes']['RTI'] == 1
+            assert statistics['page_crossing_cycles'] == 0
+
+    @staticmethod
+    def test_chains_with_other_tools():
+        from emulator.profiler import Profiler
+        processor = Processor()
+        load_program(processor, SORT_PROGRAM)
+        profiler = Profiler(processor)
+        profiler.enable()
+        statistics = Statistics(processor)
+        statistics.enable()
+        profiler.disable()
+        assert statistics.enabled
+        result = processor.run()
+        assert statistics.as_dict()['instructions'] == result.instructions
+        statistics.disable()
+        assert not statistics.enabled and not processor.hooks
+
+    @staticmethod
+    def test_disable_restores_processor():
+        processor = FastProcessor()
+        handlers = processor.handlers
+        statistics = Statistics(processor)
+        statistics.enable()
+        assert statistics.enabled and processor.handlers is not handlers
+        statistics.disable()
+        assert not statistics.enabled and processor.handlers is handlers
+
+    @staticmethod
+    def test_batch_job():
+        from emulator.batch import load_image
+        result = run_job(Job(MULT_PROGRAM, {0x10: b'\x03\x05'}, statistics=True), load_image(MULT_PROGRAM))
+        assert result.statistics['instructions'] == result.instructions
+        assert run_job(Job(MULT_PROGRAM), load_image(MULT_PROGRAM)).statistics is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from emulator.breakpoints import Breakpoints
+from emulator.processor import STOP_WATCHPOINT, Processor
+from emulator.trace import ACCESS_NONE, ACCESS_READ, ACCESS_WRITE, RECORD, Tracer, decode, format_record, main
+from test_fast_processor import SORT_PROGRAM, load_program
+
+
+def sort_processor() -> Processor:
+    processor = Processor()
+    load_program(processor, SORT_PROGRAM)
+    return processor
+
+
+class TraceTest(unittest.TestCase):
+    @staticmethod
+    def test_records():
+        processor = sort_processor()
+        tracer = Tracer(processor, capacity=100)
+        tracer.enable()
+        processor.run(max_instructions=10)
+        records = tracer.records()
+        assert [record.pc for record in records[:4]] == [0x200, 0x202, 0x204, 0x207]
+        # STA $1000,X with A = $20
+        assert records[2].a == 0x20 and (records[2].address, records[2].value, records[2].access) == \
+            (0x1000, 0x20, ACCESS_WRITE)
+        # LDA #$20 reads its operand, LDX #$00 at $0200 too
+        assert (records[1].address, records[1].value, records[1].access) == (0x203, 0x20, ACCESS_READ)
+        assert records[1].cycles == 2
+        assert format_record(records[2]) == \
+            '         4  $0204  9D 00 10  STA $1000,X   A=20 X=00 Y=00 S=FF P=--------  $1000 <- 20'
+        tracer.disable()
+        processor.run(max_instructions=10)
+        assert tracer.count == 10
+
+    @staticmethod
+    def test_tracer_and_watchpoints_chain():
+        processor = sort_processor()
+        tracer = Tracer(processor, capacity=100)
+        tracer.enable()
+        breakpoints = Breakpoints(processor)
+        breakpoints.add_watchpoint(0x2000)
+        processor.run(max_instructions=50)
+        records = tracer.records()
+        assert len(records) == 50
+        assert sum(record.access != ACCESS_NONE for record in records) >= 25
+        tracer.disable()
+        assert breakpoints.processor.hooks['put_byte'][0][0] is breakpoints
+        breakpoints.add_watchpoint(0x1010)
+        assert processor.run().reason == STOP_WATCHPOINT and breakpoints.hit.address == 0x1010
+        breakpoints.clear()
+        assert not processor.hooks
+
+    @staticmethod
+    def test_ring_keeps_latest_records():
+        processor = sort_processor()
+        tracer = Tracer(processor, capacity=64)
+        tracer.enable()
+        processor.run(max_instructions=1000)
+        records = tracer.records()
+        assert len(records) == 64
+        reference = sort_processor()
+        reference.run(max_instructions=1000 - 64)
+        assert records[0].pc == reference.PC and records[0].cycles == reference.cycles
+        assert any(record.access == ACCESS_READ for record in records)
+
+    @staticmethod
+    def test_file_holds_complete_trace():
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'trace.bin'
+            processor = sort_processor()
+            tracer = Tracer(processor, capacity=64, file=path, chunk_records=16)
+            tracer.enable()
+            result = processor.run()
+            tracer.close()
+            records = list(decode(path.read_bytes()))
+            assert len(records) == result.instructions
+            assert records[-64:] == tracer.records()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                main([str(path)])
+            lines = output.getvalue().splitlines()
+            assert len(lines) == result.instructions and 'LDX #$00' in lines[0]
+            assert path.stat().st_size == result.instructions * RECORD.size
+
+
+if __name__ == '__main__':
+    unittest.main()
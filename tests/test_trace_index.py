@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+from pathlib import Path
+from emulator.opcodes import BRK, JSR, NOP
+from emulator.processor import Processor
+from emulator.trace import ACCESS_WRITE, Tracer
+from emulator.trace_index import TraceIndex
+from test_fast_processor import SORT_PROGRAM, load_program
+
+
+class TraceIndexTest(unittest.TestCase):
+    @staticmethod
+    def test_queries_match_records():
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'trace.bin'
+            processor = Processor()
+            load_program(processor, SORT_PROGRAM)
+            tracer = Tracer(processor, capacity=0x100, file=path, chunk_records=0x80)
+            tracer.enable()
+            processor.run()
+            tracer.close()
+            with TraceIndex(path) as index:
+                records = [index.record(position) for position in range(len(index))]
+                assert len(records) == tracer.count
+                writes = [position for position, record in enumerate(records)
+                          if record.access == ACCESS_WRITE and record.address == 0x1001]
+                assert list(index.writes(0x1001)) == writes
+                assert index.last_write(0x1001) == writes[-1]
+                assert index.last_write(0x1001, before=writes[3]) == writes[2]
+                assert index.last_write(0x1001, before=writes[0]) is None
+                assert index.last_write(0x3000) is None
+                values = [records[position].value for position in writes]
+                assert [records[position].value for position in index.changes(0x1001)] == \
+                    [value for number, value in enumerate(values) if number == 0 or value != values[number - 1]]
+                assert list(index.visits(0x204)) == [position for position, record in enumerate(records)
+                                                     if record.pc == 0x204]
+                assert len(index.visits(0x204)) == 32
+                position = index.position_at_cycle(1000)
+                assert records[position].cycles <= 1000 < records[position + 1].cycles
+                assert index.position_at_cycle(-1) is None
+                selected = index.cycle_range(1000, 2000)
+                assert [int(cycles) for cycles in selected['cycles']] == \
+                    [record.cycles for record in records if 1000 <= record.cycles < 2000]
+
+    @staticmethod
+    def test_every_push_is_a_write():
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'trace.bin'
+            processor = Processor()
+            # JSR $0206 from S = $FF, BRK at $0206 with the vector at $0300
+            processor.memory.data[0x200:0x207] = bytes((JSR, 0x06, 0x02, NOP, NOP, NOP, BRK))
+            processor.memory.data[0xfffe:0x10000] = bytes((0x00, 0x03))
+            processor.memory.data[0x300] = NOP
+            processor.PC = 0x200
+            tracer = Tracer(processor, capacity=0x10, file=path, chunk_records=2)
+            tracer.enable()
+            processor.run(max_instructions=3, stop_on_brk=False)
+            tracer.close()
+            with TraceIndex(path) as index:
+                assert len(index) == 3
+                assert list(index.writes(0x1ff)) == list(index.writes(0x1fe)) == [0]
+                assert [list(index.writes(address)) for address in (0x1fd, 0x1fc, 0x1fb)] == [[1], [1], [1]]
+                assert list(index.changes(0x1fc)) == [1] and index.last_write(0x1fc, before=1) is None
+
+    @staticmethod
+    def test_empty_trace():
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'trace.bin'
+            path.write_bytes(b'')
+            with TraceIndex(path) as index:
+                assert len(index) == 0 and index.last_write(0x10) is None and len(index.visits(0x200)) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
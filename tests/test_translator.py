@@ -0,0 +1,103 @@
+import unittest
+from emulator.fast import FastProcessor
+from emulator.translator import TranslatingProcessor
+from emulator.opcodes import *
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state
+
+
+def run_blocks_against_fast(program: list[int], num_instructions: int,
+                            lazy_flags: bool = False) -> TranslatingProcessor:
+    translating_processor, fast_processor = TranslatingProcessor(lazy_flags=lazy_flags), FastProcessor()
+    load_program(translating_processor, program)
+    load_program(fast_processor, program)
+    executed = 0
+    while executed < num_instructions:
+        count = translating_processor.run_block()
+        for _ in range(count):
+            fast_processor.run_instruction()
+        executed += count
+        assert processor_state(translating_processor) == processor_state(fast_processor)
+    return translating_processor
+
+
+class TranslatorTest(unittest.TestCase):
+    @staticmethod
+    def test_sort_program():
+        processor = run_blocks_against_fast(SORT_PROGRAM, 20000)
+        assert list(processor.memory.data[0x1000:0x1020]) == list(range(1, 0x21))
+
+    @staticmethod
+    def test_sort_program_with_lazy_flags():
+        processor = run_blocks_against_fast(SORT_PROGRAM, 20000, lazy_flags=True)
+        assert list(processor.memory.data[0x1000:0x1020]) == list(range(1, 0x21))
+
+    @staticmethod
+    def test_self_modifying_store_into_same_block():
+        # STA $0200,X overwrites the NOP at $020A of the running block with INX
+        processor = run_blocks_against_fast(
+            [LDX_IMMEDIATE, 0x0a, LDA_IMMEDIATE, INX, STA_ABSOLUTE_X, 0x00, 0x02, LDY_IMMEDIATE, 0x05, NOP, NOP, BRK],
+            6
+        )
+        assert processor.X == 0x0b
+
+    @staticmethod
+    def test_self_modifying_constant_store():
+        # STA $0208 overwrites the operand of the following LDX
+        processor = run_blocks_against_fast(
+            [LDA_IMMEDIATE, 0x42, STA_ABSOLUTE, 0x08, 0x02, LDY_IMMEDIATE, 0x05, LDX_IMMEDIATE, 0x00, BRK],
+            4
+        )
+        assert processor.X == 0x42
+
+    @staticmethod
+    def test_changed_code_is_translated_again():
+        processor = TranslatingProcessor()
+        load_program(processor, [LDA_IMMEDIATE, 0x01, JMP_ABSOLUTE, 0x00, 0x02])
+        assert processor.run_block() == 2
+        assert processor.A == 0x01
+        processor.memory.data[0x201] = 0x02
+        processor.invalidate_code(0x201)
+        processor.run_block()
+        assert processor.A == 0x02
+        assert processor.cycles == 10
+
+    @staticmethod
+    def test_store_into_other_block_invalidates_it():
+        # The subroutine at $0210 increments the operand of its own LDA on every call
+        processor = run_blocks_against_fast(
+            [JSR, 0x10, 0x02, JSR, 0x10, 0x02, JSR, 0x10, 0x02, BRK] + [NOP] * 6 +
+            [LDA_IMMEDIATE, 0x00, INC_ABSOLUTE, 0x11, 0x02, RTS],
+            12
+        )
+        assert processor.A == 0x02
+        assert processor.memory.data[0x211] == 0x03
+
+    @staticmethod
+    def test_code_pages():
+        processor = TranslatingProcessor()
+        load_program(processor, [LDA_IMMEDIATE, 0x01, STA_ABSOLUTE, 0x00, 0x03, JMP_ABSOLUTE, 0xfe, 0x02])
+        processor.memory.data[0x2fe] = JMP_ABSOLUTE
+        processor.memory.data[0x300] = 0x02
+        processor.run_block()
+        processor.run_block()
+        assert processor.memory.code_pages[0x02] == processor.memory.code_pages[0x03] == 1
+        assert set(processor.blocks) == {0x200, 0x2fe}
+        # The store into $0300 evicts the block at $02FE only
+        processor.PC = 0x200
+        processor.run_block()
+        assert set(processor.blocks) == {0x200}
+        assert processor.memory.code_pages[0x03] == 0
+        processor.clear_memory()
+        assert not any(processor.memory.code_pages)
+
+    @staticmethod
+    def test_stack_page_is_interpreted():
+        processor = TranslatingProcessor()
+        load_program(processor, [LDA_IMMEDIATE, 0x07, PHA, BRK], address=0x1f0)
+        assert processor.run_block() == 1
+        assert processor.run_block() == 1
+        assert processor.memory.data[0x1ff] == 0x07
+
+
+if __name__ == '__main__':
+    unittest.main()
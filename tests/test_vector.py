@@ -0,0 +1,83 @@
+import random
+import unittest
+import numpy as np
+from emulator.processor import Processor
+from emulator.vector import VectorProcessor
+from emulator.opcodes import *
+from test_fast_processor import SORT_PROGRAM, load_program, processor_state, setup_random_processors
+
+
+def lane_state(vector_processor: VectorProcessor, lane: int) -> tuple:
+    return (int(vector_processor.pc[lane]), int(vector_processor.a[lane]), int(vector_processor.x[lane]),
+            int(vector_processor.y[lane]), int(vector_processor.s[lane]), int(vector_processor.P[lane]),
+            int(vector_processor.cycles[lane]), vector_processor.mem[lane].tobytes())
+
+
+def load_lane(vector_processor: VectorProcessor, lane: int, processor) -> None:
+    vector_processor.mem[lane] = np.frombuffer(bytes(processor.memory.data), dtype=np.uint8)
+    for name, register in (('pc', 'PC'), ('a', 'A'), ('x', 'X'), ('y', 'Y'), ('s', 'S'), ('cycles', 'cycles')):
+        getattr(vector_processor, name)[lane] = getattr(processor, register)
+    status = vector_processor.P
+    status[lane] = processor.SR
+    vector_processor.P = status
+
+
+class VectorProcessorTest(unittest.TestCase):
+    @staticmethod
+    def test_all_opcodes_match_processor():
+        # Every lane executes another instruction, so each step runs many opcode groups
+        rnd = random.Random(6502)
+        for _ in range(4):
+            processors, initial_states = [], []
+            while len(processors) < 0x100:
+                opcode = len(processors)
+                processor, fast_processor = setup_random_processors(
+                    rnd, [opcode, rnd.getrandbits(8), rnd.getrandbits(8)]
+                )
+                try:
+                    processor.run_instruction()
+                except (IndexError, AssertionError):
+                    # Processor does not wrap addresses beyond $FFFF
+                    continue
+                processors.append(processor)
+                initial_states.append(fast_processor)
+            vector_processor = VectorProcessor(len(processors))
+            for lane, fast_processor in enumerate(initial_states):
+                load_lane(vector_processor, lane, fast_processor)
+            vector_processor.step()
+            for lane, processor in enumerate(processors):
+                assert lane_state(vector_processor, lane) == processor_state(processor), f'${lane:02X}'
+
+    @staticmethod
+    def test_sort_program_with_different_data():
+        vector_processor = VectorProcessor(4)
+        vector_processor.load(SORT_PROGRAM)
+        vector_processor.reset()
+        # Start with different values in A for the fill loop
+        vector_processor.a[:] = [0, 1, 2, 3]
+        vector_processor.mem[:, 0x203] = [0x20, 0x30, 0x40, 0x50]
+        result = vector_processor.run()
+        assert list(result.reason) == ['brk'] * 4
+        for lane in range(4):
+            processor = Processor()
+            load_program(processor, SORT_PROGRAM)
+            processor.memory.data[0x203] = 0x20 + 0x10 * lane
+            assert processor.run().instructions == result.instructions[lane]
+            assert lane_state(vector_processor, lane) == processor_state(processor)
+        assert list(vector_processor.mem[0, 0x1000:0x1020]) == list(range(1, 0x21))
+
+    @staticmethod
+    def test_run_stops_lanes_separately():
+        # DEX; BNE $0200; BRK with X = 1, 2, 3
+        vector_processor = VectorProcessor(3)
+        vector_processor.load([DEX, BNE, 0xfd, BRK])
+        vector_processor.reset()
+        vector_processor.x[:] = [1, 2, 3]
+        result = vector_processor.run(max_instructions=5)
+        assert list(result.reason) == ['brk', 'brk', 'max_instructions']
+        assert list(result.instructions) == [2, 4, 5]
+        assert list(vector_processor.pc) == [0x203, 0x203, 0x201]
+
+
+if __name__ == '__main__':
+    unittest.main()
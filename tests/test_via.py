@@ -0,0 +1,124 @@
+import unittest
+from emulator.bus import Bus
+from emulator.fast import FastProcessor
+from emulator.opcodes import *
+from emulator.processor import Processor
+from emulator.translator import TranslatingProcessor
+from emulator.via import ACR, IER, IFR, T1C_H, T1C_L, T1L_L, T2C_H, T2C_L, VIA
+from test_fast_processor import load_program, processor_state
+
+# Interrupt every 1000 cycles from timer 1 of a VIA at $6000, count the interrupts at $10
+TIMER_PROGRAM = [
+    LDA_IMMEDIATE, 0x40, STA_ABSOLUTE, ACR, 0x60,
+    LDA_IMMEDIATE, 0xe6, STA_ABSOLUTE, T1L_L, 0x60, LDA_IMMEDIATE, 0x03, STA_ABSOLUTE, T1C_H, 0x60,
+    LDA_IMMEDIATE, 0xc0, STA_ABSOLUTE, IER, 0x60,
+    CLI, INX, JMP_ABSOLUTE, 0x15, 0x02,
+]
+HANDLER = [INC_ZERO_PAGE, 0x10, LDA_ABSOLUTE, T1C_L, 0x60, RTI]
+
+
+def setup_via(processor, program: list[int]) -> VIA:
+    load_program(processor, program)
+    processor.memory.data[0x300:0x300 + len(HANDLER)] = bytes(HANDLER)
+    processor.memory.data[0xfffe:0x10000] = b'\x00\x03'
+    via = VIA(processor)
+    Bus(processor).attach(via, 0x6000)
+    return via
+
+
+class VIATest(unittest.TestCase):
+    @staticmethod
+    def test_free_running_interrupts():
+        states = []
+        for processor in (Processor(), FastProcessor()):
+            setup_via(processor, TIMER_PROGRAM)
+            processor.run(max_cycles=10_500)
+            # Timer 1 is started in cycle 18 with 998 and underflows every 1000 cycles from cycle 1017
+            assert processor.memory.data[0x10] == 10
+            assert len(processor.events) == 1 and processor.events.next_cycle == 11017
+            states.append(processor_state(processor))
+        assert states[0] == states[1]
+
+    @staticmethod
+    def test_one_shot_timer_without_interrupts():
+        processor = FastProcessor()
+        via = setup_via(processor, [
+            LDA_IMMEDIATE, 100, STA_ABSOLUTE, T2C_L, 0x60, LDA_IMMEDIATE, 0, STA_ABSOLUTE, T2C_H, 0x60,
+            LDA_ABSOLUTE, T2C_L, 0x60, BRK])
+        processor.run()
+        # Started in cycle 12, underflowing in cycle 113, read in cycle 16
+        assert processor.A == 96
+        assert via.read(0x6000 + IFR) == 0 and len(processor.events) == 0
+        processor.cycles += 200
+        assert via.read(0x6000 + IFR) == 0x20
+        assert via.read(0x6000 + T2C_L) == (113 - processor.cycles - 1) & 0xff
+        assert via.read(0x6000 + IFR) == 0
+        processor.cycles += 0x10000
+        # One-shot: the flag is not set again when the counter wraps
+        assert via.read(0x6000 + IFR) == 0
+
+    @staticmethod
+    def test_enabling_pending_flag_interrupts():
+        processor = Processor()
+        via = setup_via(processor, [NOP] * 4)
+        via.write(0x6000 + T2C_H, 0)
+        processor.cycles = 10
+        assert via.read(0x6000 + IFR) == 0x20 and not processor.interrupt_requested
+        via.write(0x6000 + IER, 0xa0)
+        assert via.read(0x6000 + IFR) == 0xa0 and via.read(0x6000 + IER) == 0xa0
+        # The interrupt is served, then INC $10 of the handler runs
+        processor.run_instruction()
+        assert processor.PC == 0x302
+        via.write(0x6000 + IFR, 0x20)
+        assert via.read(0x6000 + IFR) == 0
+        assert via.read(0x6000 + T1C_H) == 0xff
+
+    @staticmethod
+    def test_masked_interrupt_is_taken_after_cli():
+        # SEI; start timer 2 with 20 cycles and enable its interrupt; loop 40 times; CLI; loop
+        program = [
+            SEI, LDA_IMMEDIATE, 20, STA_ABSOLUTE, T2C_L, 0x60, LDA_IMMEDIATE, 0, STA_ABSOLUTE, T2C_H, 0x60,
+            LDA_IMMEDIATE, 0xa0, STA_ABSOLUTE, IER, 0x60, LDX_IMMEDIATE, 40, DEX, BNE, 0xfd, CLI, NOP,
+            JMP_ABSOLUTE, 0x17, 0x02,
+        ]
+        # The handler clears the flag of timer 2
+        handler = [INC_ZERO_PAGE, 0x10, LDA_ABSOLUTE, T2C_L, 0x60, RTI]
+        states = []
+        for processor in (Processor(), FastProcessor(), TranslatingProcessor()):
+            via = setup_via(processor, program)
+            processor.memory.data[0x300:0x300 + len(handler)] = bytes(handler)
+            processor.run(max_instructions=200)
+            assert processor.memory.data[0x10] == 1 and via.irq_event is None
+            states.append(processor_state(processor))
+        assert states[0] == states[1] == states[2]
+
+    @staticmethod
+    def test_flag_left_set_interrupts_at_next_change():
+        # The handler of TIMER_PROGRAM without reading T1C_L, returning while the flag is set
+        processor = FastProcessor()
+        via = setup_via(processor, TIMER_PROGRAM)
+        processor.memory.data[0x300:0x303] = bytes((INC_ZERO_PAGE, 0x10, RTI))
+        processor.run(max_cycles=10_500)
+        # The line is not polled: only the timer event is pending, the next underflow requests again
+        assert processor.memory.data[0x10] == 10 and via.read(0x6000 + IFR) == 0xc0
+        assert len(processor.events) == 1 and via.irq_event is None
+
+    @staticmethod
+    def test_held_line_is_not_polled():
+        processor = FastProcessor()
+        via = setup_via(processor, [SEI, NOP, NOP, NOP, NOP, CLI, NOP, BRK])
+        processor.I = 1
+        via.write(0x6000 + T2C_H, 0)
+        via.write(0x6000 + IER, 0xa0)
+        processor.cycles = 10
+        processor.run(max_instructions=3)
+        # Requested once and kept pending while I is set
+        assert processor.interrupt_requested and len(processor.events) == 0 and processor.PC == 0x203
+        processor.run(max_instructions=4)
+        # Served after CLI, INC $10 of the handler done
+        assert processor.PC == 0x302 and not processor.interrupt_requested
+        via.write(0x6000 + IFR, 0x20)
+        assert not processor.interrupt_requested
+
+if __name__ == '__main__':
+    unittest.main()